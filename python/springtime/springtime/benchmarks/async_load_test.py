@@ -0,0 +1,110 @@
+"""Compare thread pool and asyncio throughput of the scan service.
+
+Starts a fake OpenAI server that answers every chat completion after a fixed
+latency, then fires the same number of scans through the sync service on a
+thread pool and through the async service with asyncio.gather.
+
+Run with `python -m springtime.benchmarks.async_load_test`.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+import uvicorn
+from fastapi import FastAPI
+
+from springtime.services.scan_service import OpenAIScanService
+
+HOST = "127.0.0.1"
+PORT = 8765
+LATENCY_SECONDS = 0.5
+NUMBER_OF_REQUESTS = 200
+# mirrors the default size of the threadpool FastAPI runs sync routes on
+THREAD_POOL_SIZE = 40
+
+COMPLETION = """Description: A sample document.
+Tags: finance, sample
+Is financial document: Green
+Is confidential information memorandum: Red"""
+
+
+def fake_openai_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions():
+        await asyncio.sleep(LATENCY_SECONDS)
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "gpt-3.5-turbo",
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": COMPLETION},
+                    "finish_reason": "stop",
+                },
+            ],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    return app
+
+
+def start_server() -> uvicorn.Server:
+    server = uvicorn.Server(
+        uvicorn.Config(fake_openai_app(), host=HOST, port=PORT, log_level="warning"),
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def run_sync(service: OpenAIScanService) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREAD_POOL_SIZE) as executor:
+        list(
+            executor.map(
+                lambda idx: service.scan(file_name=f"{idx}.pdf", text="text"),
+                range(NUMBER_OF_REQUESTS),
+            ),
+        )
+    return time.perf_counter() - start
+
+
+async def run_async(service: OpenAIScanService) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(
+            service.scan_async(file_name=f"{idx}.pdf", text="text")
+            for idx in range(NUMBER_OF_REQUESTS)
+        ),
+    )
+    return time.perf_counter() - start
+
+
+def main():
+    server = start_server()
+    openai.api_base = f"http://{HOST}:{PORT}/v1"
+    openai.api_key = "fake"
+    service = OpenAIScanService("gpt-3.5-turbo")
+
+    try:
+        for label, elapsed in [
+            (f"threads ({THREAD_POOL_SIZE})", run_sync(service)),
+            ("asyncio", asyncio.run(run_async(service))),
+        ]:
+            print(
+                f"{label:<16} {elapsed:8.3f}s"
+                f" {NUMBER_OF_REQUESTS / elapsed:8.1f} req/s",
+            )
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Measure building a chat prompt from a large context.
+
+500 chunks of about 2KB across 10 files, with runs of newlines to
+collapse, go through the section by section implementation create_prompt
+replaced and through the single pass one, with the normalized chunk cache
+cold and warm. Every version has to produce the same prompt.
+
+Run with `python -m springtime.benchmarks.prompt_assembly`.
+"""
+import random
+import re
+import time
+from collections.abc import Callable
+
+from springtime.models.chat import (
+    ChatChunkContext,
+    ChatFileContext,
+    ChatHistory,
+    SingleLocation,
+)
+from springtime.services.prompt import (
+    CONTEXT_PROMPT,
+    create_prompt,
+    create_prompt_for_histories,
+    format_chunk_location,
+    normalized_content,
+)
+
+NUMBER_OF_FILES = 10
+CHUNKS_PER_FILE = 50
+CHUNK_SIZE = 2048
+REPEATS = 50
+
+
+def make_context(seed: int = 0) -> list[ChatFileContext]:
+    rng = random.Random(seed)
+    words = ["revenue", "margin", "EBITDA", "2023", "$1.2m", "growth", "\n", "\n\n"]
+
+    def content() -> str:
+        text = ""
+        while len(text) < CHUNK_SIZE:
+            text += rng.choice(words) + " "
+        return text
+
+    return [
+        ChatFileContext(
+            file_name=f"file{file_idx}.pdf",
+            chunks=[
+                ChatChunkContext(
+                    order=file_idx * CHUNKS_PER_FILE + idx,
+                    content=content(),
+                    location=SingleLocation(type="single", page=idx),
+                )
+                for idx in range(CHUNKS_PER_FILE)
+            ],
+        )
+        for file_idx in range(NUMBER_OF_FILES)
+    ]
+
+
+def sectioned_create_prompt(
+    context: list[ChatFileContext],
+    question: str,
+    history: list[ChatHistory],
+) -> str:
+    """create_prompt as it was before the single pass builder."""
+
+    def for_chunk(chunk: ChatChunkContext) -> str:
+        stripped = re.sub(r"\n+", "\n", chunk.content).strip()
+        return f"""{format_chunk_location(chunk.location)}content: {stripped}
+"""
+
+    def for_file(file: ChatFileContext) -> str:
+        for_chunks = "\n".join([for_chunk(chunk) for chunk in file.chunks])
+        return f"""
+file name: {file.file_name}{for_chunks}
+
+""".strip()
+
+    context_prompt = ""
+    if context:
+        prompts = "\n\n".join([for_file(file) for file in context])
+        context_prompt = f"{CONTEXT_PROMPT}\n---\n{prompts}\n---\n"
+    non_empty_prompts = [
+        prompt
+        for prompt in [
+            context_prompt,
+            create_prompt_for_histories(history),
+            f"Human: {question}",
+            "AI:",
+        ]
+        if len(prompt.strip()) > 0
+    ]
+    return "\n".join(non_empty_prompts)
+
+
+def timed(label: str, fn: Callable[[], str], setup: Callable[[], None]) -> str:
+    timings = []
+    for _ in range(REPEATS):
+        setup()
+        start = time.perf_counter()
+        prompt = fn()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(
+        f"{label:<24} p50 {timings[len(timings) // 2] * 1000:7.2f}ms"
+        f"  min {timings[0] * 1000:7.2f}ms",
+    )
+    return prompt
+
+
+def main():
+    context = make_context()
+    history = [
+        ChatHistory(question=f"question {idx}", answer=f"answer {idx}")
+        for idx in range(6)
+    ]
+    question = "What was the revenue growth in 2023?"
+    size = sum(len(chunk.content) for file in context for chunk in file.chunks)
+    print(f"{NUMBER_OF_FILES * CHUNKS_PER_FILE} chunks, {size / 1024:.0f}KB")
+
+    def nothing():
+        pass
+
+    expected = timed(
+        "sectioned",
+        lambda: sectioned_create_prompt(context, question, history),
+        nothing,
+    )
+    cold = timed(
+        "single pass, cold cache",
+        lambda: create_prompt(context, question, history),
+        normalized_content.cache_clear,
+    )
+    warm = timed(
+        "single pass, warm cache",
+        lambda: create_prompt(context, question, history),
+        nothing,
+    )
+    assert cold == expected
+    assert warm == expected
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Compare serial and process pool sheet preprocessing on a synthetic workbook.
+
+Run with `python -m springtime.benchmarks.sheet_preprocessing`.
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from springtime.services.sheet_processor import ClaudeSheetProcessor
+
+NUMBER_OF_SHEETS = 50
+ROWS_PER_SHEET = 1_000
+
+
+def write_workbook(file_name: str):
+    rng = np.random.default_rng(0)
+    with pd.ExcelWriter(file_name, engine="xlsxwriter") as writer:
+        for index in range(NUMBER_OF_SHEETS):
+            pd.DataFrame(
+                rng.normal(size=(ROWS_PER_SHEET, 8)),
+                columns=[f"Column {idx}" for idx in range(8)],
+            ).to_excel(writer, sheet_name=f"Sheet {index}", index=False)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, "workbook.xlsx")
+        write_workbook(file_name)
+
+        for max_workers in (1, 2, 4, 8):
+            processor = ClaudeSheetProcessor(max_workers=max_workers)
+            start = time.perf_counter()
+            sheets = processor.preprocess(xl=pd.ExcelFile(file_name))
+            elapsed = time.perf_counter() - start
+            print(f"workers={max_workers:<3} sheets={len(sheets):<4} {elapsed:8.3f}s")
+            if processor.executor:
+                processor.executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Measure extracting tables from a long PDF.
+
+A synthetic PDF with a ruled table of financial figures on every page is
+extracted the way the endpoint used to, one tabula.read_pdf call over all
+pages with every table held until the workbook is written, and with
+TabulaTableExtractor across different numbers of worker processes. The
+first request of an extractor pays for starting its JVMs, so it is timed
+apart from the requests after it.
+
+Needs Java for tabula. Run with
+`python -m springtime.benchmarks.table_extraction`.
+"""
+import os
+import tempfile
+import time
+from unittest.mock import MagicMock
+
+import fitz  # PyMuPDF
+import pandas as pd
+import tabula
+
+from springtime.excel.table_extractor import (
+    ExtractionArguments,
+    TabulaTableExtractor,
+)
+
+NUMBER_OF_PAGES = 200
+ROWS = 25
+COLUMNS = 6
+
+
+def cell_text(page_number: int, row: int, column: int) -> str:
+    if column == 0:
+        return f"Item {row}"
+    if row == 0:
+        return f"FY{2018 + column}"
+    return f"{(page_number + 1) * row * column * 37 % 100_000:,}"
+
+
+def make_table_pdf(
+    path: str,
+    number_of_pages: int,
+    *,
+    rows: int = ROWS,
+    columns: int = COLUMNS,
+    ruled: bool = True,
+) -> None:
+    """Writes a PDF with a table of numbers under a title on every page.
+
+    The cells hold cell_text, and without `ruled` the table has no lines.
+    """
+    pdf = fitz.open()
+    for page_number in range(number_of_pages):
+        page = pdf.new_page()
+        page.insert_text((50, 50), f"Schedule {page_number + 1}", fontsize=14)
+        left, top, width, height = 50, 80, 80, 20
+        for row in range(rows + 1 if ruled else 0):
+            y = top + row * height
+            page.draw_line((left, y), (left + columns * width, y))
+        for column in range(columns + 1 if ruled else 0):
+            x = left + column * width
+            page.draw_line((x, top), (x, top + rows * height))
+        for row in range(rows):
+            for column in range(columns):
+                page.insert_text(
+                    (left + column * width + 4, top + row * height + 14),
+                    cell_text(page_number, row, column),
+                    fontsize=9,
+                )
+    pdf.save(path)
+
+
+def read_all_pages(file_name: str, output: str) -> int:
+    dfs = tabula.read_pdf(file_name, pages="all")
+    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+        for index, df in enumerate(dfs):
+            df.to_excel(writer, sheet_name=f"Sheet {index}")
+    return len(dfs)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, "synthetic.pdf")
+        make_table_pdf(file_name, NUMBER_OF_PAGES)
+        args = ExtractionArguments(
+            file_name=file_name,
+            title="synthetic",
+            bucket="bucket",
+            output_prefix="output_prefix",
+        )
+
+        start = time.perf_counter()
+        tables = read_all_pages(file_name, os.path.join(tmp_dir, "all.xlsx"))
+        print(
+            f"{'read_pdf, all pages':<24} {time.perf_counter() - start:7.2f}s"
+            f"  {tables} tables",
+        )
+
+        for max_workers in [1, 2, 4]:
+            extractor = TabulaTableExtractor(MagicMock(), max_workers=max_workers)
+            timings = []
+            for _ in range(3):
+                start = time.perf_counter()
+                res = extractor.extract(args)
+                timings.append(time.perf_counter() - start)
+            if extractor.executor is not None:
+                extractor.executor.shutdown()
+            print(
+                f"{f'{max_workers} workers':<24} first {timings[0]:7.2f}s"
+                f"  then {min(timings[1:]):7.2f}s  {res.number_of_sheets} tables",
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Compare the speed and fidelity of the table extractors.
+
+The corpus is synthetic born-digital PDFs: ruled tables, tables without
+lines, and a long ruled document. Fidelity is the share of the known
+cells, header included, found at their row and column in the table
+extracted from their page. Tabula is skipped when Java is missing.
+
+Run with `python -m springtime.benchmarks.table_extractors`.
+"""
+import os
+import resource
+import tempfile
+import time
+from collections.abc import Callable, Iterator
+
+import pandas as pd
+
+from springtime.benchmarks.table_extraction import (
+    COLUMNS,
+    ROWS,
+    cell_text,
+    make_table_pdf,
+)
+from springtime.excel.table_extractor import (
+    FitzTableExtractor,
+    read_tables,
+)
+
+CORPUS = [
+    ("ruled, 10 pages", 10, True),
+    ("unruled, 10 pages", 10, False),
+    ("ruled, 100 pages", 100, True),
+]
+
+ExtractTables = Callable[[str], Iterator[pd.DataFrame]]
+
+
+def grid(df: pd.DataFrame) -> list[list[str]]:
+    rows = [[str(column) for column in df.columns]]
+    rows.extend([str(value) for value in row] for row in df.itertuples(index=False))
+    return rows
+
+
+def fidelity(tables: list[pd.DataFrame], number_of_pages: int) -> float:
+    # every page holds one table, extra tables on a page count as misses
+    found = 0
+    for page_number, df in enumerate(tables[:number_of_pages]):
+        cells = grid(df)
+        found += sum(
+            row < len(cells)
+            and column < len(cells[row])
+            and cells[row][column].replace(",", "")
+            == cell_text(page_number, row, column).replace(",", "")
+            for row in range(ROWS)
+            for column in range(COLUMNS)
+        )
+    return found / (number_of_pages * ROWS * COLUMNS)
+
+
+def tabula_tables(file_name: str) -> Iterator[pd.DataFrame]:
+    yield from read_tables(file_name, "all")
+
+
+def fitz_tables(strategy: str) -> ExtractTables:
+    return FitzTableExtractor(None, strategy=strategy).tables  # type: ignore[arg-type]
+
+
+def java_available() -> bool:
+    return any(
+        os.access(os.path.join(directory, "java"), os.X_OK)
+        for directory in os.environ.get("PATH", "").split(os.pathsep)
+    )
+
+
+def main():
+    extractors: list[tuple[str, ExtractTables]] = [
+        ("fitz lines", fitz_tables("lines")),
+        ("fitz text", fitz_tables("text")),
+    ]
+    if java_available():
+        extractors.append(("tabula", tabula_tables))
+    else:
+        print("java not found, skipping tabula")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for label, number_of_pages, ruled in CORPUS:
+            file_name = os.path.join(tmp_dir, "corpus.pdf")
+            make_table_pdf(file_name, number_of_pages, ruled=ruled)
+            print(label)
+            for name, extract in extractors:
+                start = time.perf_counter()
+                tables = list(extract(file_name))
+                elapsed = time.perf_counter() - start
+                print(
+                    f"  {name:<12} {elapsed:7.2f}s  {len(tables):4} tables"
+                    f"  fidelity {fidelity(tables, number_of_pages):6.1%}",
+                )
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"peak rss {peak:.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
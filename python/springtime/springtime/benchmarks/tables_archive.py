@@ -0,0 +1,59 @@
+"""Compare loading extracted tables from their workbook and their tables archive.
+
+Tables shaped like tabula's, strings and numbers mixed, are written once to
+both, then every sheet is read back the way the analyzer reads it.
+
+Run with `python -m springtime.benchmarks.tables_archive`.
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from springtime.excel.table_extractor import write_tables
+from springtime.excel.tables_archive import TablesArchive, Workbook
+
+NUMBER_OF_TABLES = 200
+ROWS_PER_TABLE = 200
+
+
+def tables() -> list[pd.DataFrame]:
+    rng = np.random.default_rng(0)
+    acc = []
+    for _ in range(NUMBER_OF_TABLES):
+        df = pd.DataFrame(
+            rng.normal(size=(ROWS_PER_TABLE, 6)).round(2),
+            columns=[f"FY{year}" for year in range(2018, 2024)],
+        )
+        df.insert(0, "Item", [f"Line item {idx}" for idx in range(ROWS_PER_TABLE)])
+        acc.append(df)
+    return acc
+
+
+def read_all(workbook: Workbook) -> int:
+    return sum(len(workbook.parse(name)) for name in workbook.sheet_names)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, "tables.xlsx")
+        archive_name = os.path.join(tmp_dir, "tables.tables.zip")
+        start = time.perf_counter()
+        write_tables(file_name, iter(tables()), archive_name=archive_name)
+        print(f"write both       {time.perf_counter() - start:8.3f}s")
+
+        for label, path, open_workbook in (
+            ("xlsx", file_name, pd.ExcelFile),
+            ("tables archive", archive_name, TablesArchive),
+        ):
+            start = time.perf_counter()
+            rows = read_all(open_workbook(path))
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(path) / 1e6
+            print(f"{label:<16} {elapsed:8.3f}s rows={rows} {size:.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
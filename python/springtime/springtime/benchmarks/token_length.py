@@ -0,0 +1,53 @@
+"""Compare per-string Claude token counting with the cached batch counter.
+
+Run with `python -m springtime.benchmarks.token_length`.
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from springtime.routers.token_length_service import (
+    CLAUDE_COUNTER,
+    anthropic_client,
+)
+
+NUMBER_OF_SHEETS = 40
+ROWS_PER_SHEET = 500
+
+
+def make_sheets() -> list[str]:
+    rng = np.random.default_rng(0)
+    return [
+        pd.DataFrame(
+            rng.normal(size=(ROWS_PER_SHEET, 8)),
+            columns=[f"Column {idx}" for idx in range(8)],
+        ).to_csv(index=False)
+        for _ in range(NUMBER_OF_SHEETS)
+    ]
+
+
+def timed(label: str, fn) -> list[int]:
+    start = time.perf_counter()
+    result = fn()
+    print(f"{label:<28} {time.perf_counter() - start:8.3f}s")
+    return result
+
+
+def main():
+    texts = make_sheets()
+    # load the tokenizer up front so neither path pays for it
+    anthropic_client.count_tokens("warm up")
+
+    expected = timed(
+        "count_tokens per string",
+        lambda: [anthropic_client.count_tokens(text) for text in texts],
+    )
+    CLAUDE_COUNTER.clear()
+    cold = timed("count_many (cold cache)", lambda: CLAUDE_COUNTER.count_many(texts))
+    warm = timed("count_many (warm cache)", lambda: CLAUDE_COUNTER.count_many(texts))
+    assert expected == cold == warm
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Measure recall@10 and query latency of the in-process vector indexes.
+
+Synthetic 1536 dimensional vectors, the size text-embedding-ada-002
+produces, are clustered the way embeddings of related chunks are. Every
+index is compared against a float64 brute force reference.
+
+Run with `python -m springtime.benchmarks.vector_search`.
+"""
+import time
+from collections.abc import Callable
+from functools import partial
+
+import numpy as np
+
+from springtime.services.ivf_vector_service import IVFVectorService
+from springtime.services.local_vector_service import (
+    DIMENSION,
+    LocalVectorService,
+    normalize,
+)
+from springtime.services.vector_service import TOP_K, UpsertVector, VectorResult
+
+NUMBER_OF_VECTORS = 50_000
+NUMBER_OF_QUERIES = 200
+NUMBER_OF_CLUSTERS = 500
+NUMBER_OF_PROJECTS = 20
+
+
+def make_dataset(seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(NUMBER_OF_CLUSTERS, DIMENSION)).astype(np.float32)
+    assignments = rng.integers(NUMBER_OF_CLUSTERS, size=NUMBER_OF_VECTORS)
+    vectors = centers[assignments] + 0.5 * rng.normal(
+        size=(NUMBER_OF_VECTORS, DIMENSION),
+    ).astype(np.float32)
+    queries = centers[rng.integers(NUMBER_OF_CLUSTERS, size=NUMBER_OF_QUERIES)]
+    queries += 0.5 * rng.normal(size=queries.shape).astype(np.float32)
+    return vectors, queries
+
+
+def upsert_vectors(vectors: np.ndarray) -> list[UpsertVector]:
+    return [
+        UpsertVector(
+            id=str(idx),
+            vector=vector.tolist(),
+            metadata={"projectId": f"p{idx % NUMBER_OF_PROJECTS}"},
+        )
+        for idx, vector in enumerate(vectors)
+    ]
+
+
+def brute_force(
+    vectors: np.ndarray,
+    queries: np.ndarray,
+    rows: np.ndarray | None = None,
+) -> list[set[str]]:
+    ids = np.arange(len(vectors)) if rows is None else rows
+    matrix = normalize(vectors[ids].astype(np.float64))
+    scores = normalize(queries.astype(np.float64)) @ matrix.T
+    return [{str(ids[idx]) for idx in np.argsort(-row)[:TOP_K]} for row in scores]
+
+
+def evaluate(
+    label: str,
+    search: Callable[[list[float]], list[VectorResult]],
+    queries: np.ndarray,
+    reference: list[set[str]],
+) -> None:
+    latencies = []
+    recalls = []
+    for query, expected in zip(queries, reference, strict=True):
+        vector = query.tolist()
+        start = time.perf_counter()
+        results = search(vector)
+        latencies.append(time.perf_counter() - start)
+        recalls.append(len({result.id for result in results} & expected) / TOP_K)
+
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print(
+        f"{label:<32} recall@{TOP_K} {np.mean(recalls):6.3f}"
+        f"  p50 {p50:8.2f}ms  p99 {p99:8.2f}ms",
+    )
+
+
+def main():
+    vectors, queries = make_dataset()
+    to_upsert = upsert_vectors(vectors)
+    reference = brute_force(vectors, queries)
+    project_rows = np.arange(1, NUMBER_OF_VECTORS, NUMBER_OF_PROJECTS)
+    filtered_reference = brute_force(vectors, queries, project_rows)
+
+    local = LocalVectorService()
+    ivf = IVFVectorService()
+    for label, service in [("local exact", local), ("ivf", ivf)]:
+        start = time.perf_counter()
+        for offset in range(0, len(to_upsert), 1000):
+            service.upsert(to_upsert[offset : offset + 1000])
+        print(
+            f"{label}: {NUMBER_OF_VECTORS} vectors indexed"
+            f" in {time.perf_counter() - start:.2f}s",
+        )
+
+    evaluate(
+        "local exact",
+        partial(local.get_similar, metadata={}),
+        queries,
+        reference,
+    )
+    evaluate(
+        "local exact, projectId filter",
+        partial(local.get_similar, metadata={"projectId": "p1"}),
+        queries,
+        filtered_reference,
+    )
+    for n_probe in [1, 4, 16, 64]:
+        evaluate(
+            f"ivf n_probe={n_probe}",
+            partial(ivf.get_similar, metadata={}, n_probe=n_probe),
+            queries,
+            reference,
+        )
+    evaluate(
+        "ivf, projectId filter",
+        partial(ivf.get_similar, metadata={"projectId": "p1"}),
+        queries,
+        filtered_reference,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Compare the payload size and encode/decode time of the vector transports.
+
+An upsert of 1000 text-embedding-ada-002 sized vectors is serialized as
+JSON floats, the way UpsertVectorRequest carries them, and as the base64
+float32, float16 and int8 buffers of EncodedUpsertVectorRequest. The
+decode column includes validating the request model, and the error column
+is the largest absolute difference from the original float32 vectors.
+
+Run with `python -m springtime.benchmarks.vector_transport`.
+"""
+import json
+import time
+from collections.abc import Callable
+from typing import Any
+
+import numpy as np
+
+from springtime.routers.vector_router import (
+    EncodedUpsertVectorRequest,
+    UpsertVectorRequest,
+)
+from springtime.services.local_vector_service import DIMENSION, normalize
+from springtime.services.vector_codec import VectorDtype, decode_vectors, encode_vectors
+
+NUMBER_OF_VECTORS = 1000
+REPEATS = 5
+
+
+def timed(fn: Callable[[], Any]) -> tuple[float, Any]:
+    """Best of REPEATS, in milliseconds, and the last result."""
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def report(label: str, encode_ms: float, decode_ms: float, size: int, error: float):
+    print(
+        f"{label:<16} {size / 1024 / 1024:8.2f}MB  encode {encode_ms:8.1f}ms"
+        f"  decode {decode_ms:8.1f}ms  max error {error:.2e}",
+    )
+
+
+def main():
+    rng = np.random.default_rng(0)
+    matrix = normalize(rng.normal(size=(NUMBER_OF_VECTORS, DIMENSION))).astype(
+        np.float32,
+    )
+    ids = [str(idx) for idx in range(NUMBER_OF_VECTORS)]
+    metadata = [{"projectId": "p1"} for _ in ids]
+
+    def encode_json() -> str:
+        return json.dumps(
+            {
+                "vectors": [
+                    {"id": id, "vector": vector, "metadata": row_metadata}
+                    for id, vector, row_metadata in zip(
+                        ids,
+                        matrix.tolist(),
+                        metadata,
+                        strict=True,
+                    )
+                ],
+            },
+        )
+
+    encode_ms, body = timed(encode_json)
+    decode_ms, req = timed(lambda: UpsertVectorRequest.parse_raw(body))
+    decoded = np.asarray([vector.vector for vector in req.vectors], np.float32)
+    report(
+        "json floats", encode_ms, decode_ms, len(body), np.abs(decoded - matrix).max()
+    )
+
+    for dtype in VectorDtype:
+
+        def encode(dtype: VectorDtype = dtype) -> str:
+            return EncodedUpsertVectorRequest(
+                ids=ids,
+                vectors=encode_vectors(matrix, dtype),
+                metadata=metadata,
+            ).json()
+
+        def decode(body: str) -> np.ndarray:
+            return decode_vectors(EncodedUpsertVectorRequest.parse_raw(body).vectors)
+
+        encode_ms, body = timed(encode)
+        decode_ms, decoded = timed(lambda body=body: decode(body))
+        report(
+            f"base64 {dtype.value}",
+            encode_ms,
+            decode_ms,
+            len(body),
+            np.abs(decoded - matrix).max(),
+        )
+
+
+if __name__ == "__main__":
+    main()
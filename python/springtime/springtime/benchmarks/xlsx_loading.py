@@ -0,0 +1,99 @@
+"""Compare preprocessing a large workbook through pd.ExcelFile and XlsxWorkbook.
+
+A workbook of about SIZE_MB is written with tables shaped like extracted
+ones, then every sheet is preprocessed to the Claude budget in a fresh
+process, which reports the time taken and its peak RSS. Lengths are
+estimated from characters so no tokenizer is needed.
+
+Run with `python -m springtime.benchmarks.xlsx_loading [size in MB]`.
+"""
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from springtime.excel.tables_archive import Workbook
+from springtime.excel.xlsx_workbook import XlsxWorkbook
+from springtime.services.sheet_processor import CLAUDE_TOKEN_LIMIT, preprocess
+
+SIZE_MB = 100
+NUMBER_OF_SHEETS = 20
+SAMPLE_ROWS = 10_000
+COLUMNS = [f"FY{year}" for year in range(2014, 2024)]
+
+
+def approximate_lengths(texts: list[str]) -> list[int]:
+    return [len(text) // 4 for text in texts]
+
+
+def write_workbook(file_name: str, rows_per_sheet: int) -> None:
+    rng = np.random.default_rng(0)
+    values = rng.normal(scale=1000, size=(SAMPLE_ROWS, len(COLUMNS))).round(2)
+    with xlsxwriter.Workbook(file_name, {"constant_memory": True}) as workbook:
+        for index in range(NUMBER_OF_SHEETS):
+            sheet = workbook.add_worksheet(f"Sheet {index}")
+            sheet.write_row(0, 0, ["Item", *COLUMNS])
+            for row in range(rows_per_sheet):
+                sheet.write_string(row + 1, 0, f"Line item {row}")
+                sheet.write_row(row + 1, 1, values[row % SAMPLE_ROWS])
+
+
+def rows_for_size(tmp_dir: str, size_mb: int) -> int:
+    """The rows per sheet that make a workbook of about size_mb."""
+    sample = os.path.join(tmp_dir, "sample.xlsx")
+    write_workbook(sample, SAMPLE_ROWS // NUMBER_OF_SHEETS)
+    bytes_per_row = os.path.getsize(sample) / SAMPLE_ROWS
+    return int(size_mb * 1e6 / bytes_per_row / NUMBER_OF_SHEETS)
+
+
+def run(loader: str, file_name: str) -> tuple[float, float, int]:
+    """Time taken, peak RSS in MB and truncated sheets, in a fresh process."""
+    start = time.perf_counter()
+    xl: Workbook = (
+        pd.ExcelFile(file_name) if loader == "ExcelFile" else XlsxWorkbook(file_name)
+    )
+    sheets = preprocess(
+        max_length=CLAUDE_TOKEN_LIMIT,
+        get_lengths=approximate_lengths,
+        xl=xl,
+    )
+    elapsed = time.perf_counter() - start
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    truncated = sum(sheet.stringified_sheet.was_truncated for sheet in sheets)
+    return elapsed, peak_rss, truncated
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else SIZE_MB
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, "workbook.xlsx")
+        rows_per_sheet = rows_for_size(tmp_dir, size_mb)
+        write_workbook(file_name, rows_per_sheet)
+        size = os.path.getsize(file_name) / 1e6
+        print(f"{NUMBER_OF_SHEETS} sheets of {rows_per_sheet} rows, {size:.1f}MB")
+
+        for loader in ("XlsxWorkbook", "ExcelFile"):
+            with ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as executor:
+                elapsed, peak_rss, truncated = executor.submit(
+                    run,
+                    loader,
+                    file_name,
+                ).result()
+            print(
+                f"{loader:<13} {elapsed:8.2f}s peak rss={peak_rss:7.0f}MB "
+                f"truncated={truncated}",
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,24 @@ import abc
 import os
 import tempfile
 import uuid
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import Executor, Future
 from typing import NamedTuple
 
+import fitz  # PyMuPDF
 import pandas as pd
 import tabula
+from loguru import logger
 from pydantic import BaseModel, NonNegativeInt
 
+from springtime.excel.tables_archive import (
+    TABLES_ARCHIVE_MIME_TYPE,
+    TablesArchiveWriter,
+    tables_archive_path,
+)
 from springtime.object_store.object_store import ObjectStore
+from springtime.utils.process_pool import process_pool
 
 
 class ExtractionArguments(BaseModel):
@@ -20,8 +31,9 @@ class ExtractionArguments(BaseModel):
 
 class ExtractionResponse(NamedTuple):
     number_of_sheets: NonNegativeInt
-    xl: pd.ExcelFile | None
     path: str | None
+    # the tables as a TablesArchive next to the workbook at path
+    tables_path: str | None
 
 
 class TableExtractor(abc.ABC):
@@ -33,29 +45,170 @@ class TableExtractor(abc.ABC):
 XLSX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 
 
+def upload_tables(
+    object_store: ObjectStore,
+    args: ExtractionArguments,
+    tables: Iterator[pd.DataFrame],
+) -> ExtractionResponse:
+    """Writes the tables to a workbook and an archive as they come, uploads both."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, f"{args.title}.xlsx")
+        archive_name = tables_archive_path(file_name)
+        number_of_sheets = write_tables(file_name, tables, archive_name=archive_name)
+        if number_of_sheets == 0:
+            return ExtractionResponse(number_of_sheets=0, path=None, tables_path=None)
+
+        path = f"{args.output_prefix}/{uuid.uuid4()}.xlsx"
+        object_store.upload_from_filename(
+            args.bucket,
+            path,
+            file_name,
+            content_type=XLSX_MIME_TYPE,
+        )
+        tables_path = tables_archive_path(path)
+        object_store.upload_from_filename(
+            args.bucket,
+            tables_path,
+            archive_name,
+            content_type=TABLES_ARCHIVE_MIME_TYPE,
+        )
+
+    logger.info(f"Extracted {number_of_sheets} tables from {args.file_name}")
+    return ExtractionResponse(
+        number_of_sheets=number_of_sheets,
+        path=path,
+        tables_path=tables_path,
+    )
+
+
+ReadTables = Callable[[str, str], list[pd.DataFrame]]
+
+
+def read_tables(file_name: str, pages: str) -> list[pd.DataFrame]:
+    # tabula runs in a JVM started once per process through jpype, so a
+    # worker pays the JVM startup on its first batch only
+    return tabula.read_pdf(file_name, pages=pages, force_subprocess=False)
+
+
+def page_batches(number_of_pages: int, pages_per_batch: int) -> list[str]:
+    """Page ranges in tabula's 1-based "first-last" form."""
+    return [
+        f"{first}-{min(first + pages_per_batch - 1, number_of_pages)}"
+        for first in range(1, number_of_pages + 1, pages_per_batch)
+    ]
+
+
 class TabulaTableExtractor(TableExtractor):
-    def __init__(self, object_store: ObjectStore) -> None:
+    """Extracts tables with tabula, batches of pages at a time.
+
+    Batches are read by a pool of worker processes, each keeping its JVM
+    between requests, and their tables are written to the workbook in page
+    order as soon as the batches before them are done. A single worker
+    reads the batches in process.
+    """
+
+    def __init__(  # noqa: PLR0913 keyword-only tuning knobs and test seams
+        self,
+        object_store: ObjectStore,
+        *,
+        max_workers: int = 1,
+        pages_per_batch: int = 10,
+        executor: Executor | None = None,
+        read_tables: ReadTables = read_tables,
+    ) -> None:
+        self.object_store = object_store
+        self.max_workers = max_workers
+        self.pages_per_batch = pages_per_batch
+        self.executor = executor or process_pool(max_workers)
+        self.read_tables = read_tables
+
+    def extract(self, args: ExtractionArguments) -> ExtractionResponse:
+        with fitz.open(args.file_name) as pdf:
+            number_of_pages = pdf.page_count
+        return upload_tables(
+            self.object_store,
+            args,
+            self.tables(args.file_name, number_of_pages),
+        )
+
+    def tables(self, file_name: str, number_of_pages: int) -> Iterator[pd.DataFrame]:
+        """The tables of every page in order, read ahead by the workers."""
+        batches = page_batches(number_of_pages, self.pages_per_batch)
+        if self.executor is None:
+            for pages in batches:
+                yield from self.read_tables(file_name, pages)
+            return
+
+        # at most two batches per worker are held, done or in flight
+        pending: deque[Future[list[pd.DataFrame]]] = deque()
+        remaining = iter(batches)
+        try:
+            while True:
+                while len(pending) < 2 * self.max_workers and (
+                    pages := next(remaining, None)
+                ):
+                    pending.append(
+                        self.executor.submit(self.read_tables, file_name, pages),
+                    )
+                if not pending:
+                    return
+                yield from pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def write_tables(
+    file_name: str,
+    tables: Iterator[pd.DataFrame],
+    *,
+    archive_name: str | None = None,
+) -> int:
+    """Writes every table to its own sheet, returns the number of sheets.
+
+    With an archive name the tables are also written to a TablesArchive.
+    Neither file is created until there is a table to write.
+    """
+    writer: pd.ExcelWriter | None = None
+    archive: TablesArchiveWriter | None = None
+    index = 0
+    try:
+        for index, df in enumerate(tables, start=1):
+            if writer is None:
+                writer = pd.ExcelWriter(file_name, engine="xlsxwriter")
+                if archive_name is not None:
+                    archive = TablesArchiveWriter(archive_name)
+            sheet_name = f"Sheet {index - 1}"
+            df.to_excel(writer, sheet_name=sheet_name)
+            if archive is not None:
+                archive.add(sheet_name, df)
+    finally:
+        if writer is not None:
+            writer.close()
+        if archive is not None:
+            archive.close()
+    return index
+
+
+class FitzTableExtractor(TableExtractor):
+    """Extracts tables with PyMuPDF, in process and without a JVM.
+
+    Tables are found from the ruling lines and text positions of every
+    page, which works on born-digital PDFs but not on scans. `strategy` is
+    passed to `Page.find_tables`, "lines" finds ruled tables and "text"
+    also finds tables aligned by whitespace alone, with more false
+    positives.
+    """
+
+    def __init__(self, object_store: ObjectStore, *, strategy: str = "lines") -> None:
         self.object_store = object_store
+        self.strategy = strategy
 
     def extract(self, args: ExtractionArguments) -> ExtractionResponse:
-        dfs = tabula.read_pdf(args.file_name, pages="all")
-        if len(dfs) == 0:
-            return ExtractionResponse(number_of_sheets=0, xl=None, path=None)
-
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            file_name = os.path.join(tmp_dir, f"{args.title}.xlsx")
-
-            with pd.ExcelWriter(file_name, engine="xlsxwriter") as writer:
-                for index, df in enumerate(dfs):
-                    df.to_excel(writer, sheet_name=f"Sheet {index}")
-            xl = pd.ExcelFile(file_name)
-
-            path = f"{args.output_prefix}/{uuid.uuid4()}.xlsx"
-            self.object_store.upload_from_filename(
-                args.bucket,
-                path,
-                file_name,
-                content_type=XLSX_MIME_TYPE,
-            )
-
-        return ExtractionResponse(number_of_sheets=len(dfs), xl=xl, path=path)
+        return upload_tables(self.object_store, args, self.tables(args.file_name))
+
+    def tables(self, file_name: str) -> Iterator[pd.DataFrame]:
+        with fitz.open(file_name) as pdf:
+            for page in pdf:
+                for table in page.find_tables(strategy=self.strategy).tables:
+                    yield table.to_pandas()
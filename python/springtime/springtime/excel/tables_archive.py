@@ -0,0 +1,132 @@
+"""Extracted tables stored as Parquet, one member per sheet of a zip.
+
+The archive is written next to the workbook of the extracted tables so
+they can be analyzed without parsing the XLSX back. Every table is stored
+the way reading its sheet of the workbook returns it, so a `TablesArchive`
+stands in for the `pd.ExcelFile` of the workbook.
+"""
+import io
+import json
+import os
+import zipfile
+from pathlib import Path
+from types import TracebackType
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from springtime.excel.xlsx_workbook import XlsxWorkbook, sheet_columns
+
+TABLES_ARCHIVE_SUFFIX = ".tables.zip"
+TABLES_ARCHIVE_MIME_TYPE = "application/zip"
+MANIFEST = "manifest.json"
+
+
+def tables_archive_path(path: str) -> str:
+    """The path of the archive written next to the workbook at path."""
+    return str(Path(path).with_suffix(TABLES_ARCHIVE_SUFFIX))
+
+
+def as_sheet(df: pd.DataFrame) -> pd.DataFrame:
+    """The table as reading it back from a workbook sheet returns it.
+
+    The index becomes the first column, headers become unique strings and
+    columns mixing types hold their values as strings.
+    """
+    if len(df.columns) == 0:
+        # an empty sheet reads back without even the index column
+        return pd.DataFrame()
+    sheet = df.reset_index(drop=True)
+    sheet.insert(0, "index", df.index)
+    # the written index has no header
+    sheet.columns = sheet_columns([None, *df.columns])
+
+    for column in sheet.columns:
+        if sheet[column].dtype == object:
+            values = sheet[column].dropna()
+            if values.map(type).nunique() > 1:
+                sheet[column] = sheet[column].map(
+                    lambda value: value if pd.isna(value) else str(value),
+                )
+    return sheet
+
+
+class TablesArchiveWriter:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.sheet_names: list[str] = []
+        self._zip = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED)
+
+    def add(self, sheet_name: str, df: pd.DataFrame) -> None:
+        buffer = io.BytesIO()
+        table = pa.Table.from_pandas(as_sheet(df), preserve_index=False)
+        pq.write_table(table, buffer)
+        self._zip.writestr(f"{len(self.sheet_names)}.parquet", buffer.getvalue())
+        self.sheet_names.append(sheet_name)
+
+    def close(self) -> None:
+        self._zip.writestr(MANIFEST, json.dumps({"sheet_names": self.sheet_names}))
+        self._zip.close()
+
+    def __enter__(self) -> "TablesArchiveWriter":
+        """The writer, closed with the block."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Writes the manifest and closes the archive."""
+        self.close()
+
+
+class TablesArchive:
+    """Reads the sheets of an archive, like `pd.ExcelFile` reads a workbook."""
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        self.io = path
+        self._zip = zipfile.ZipFile(path)
+        self.sheet_names: list[str] = json.loads(self._zip.read(MANIFEST))[
+            "sheet_names"
+        ]
+
+    def parse(self, sheet_name: str) -> pd.DataFrame:
+        member = f"{self.sheet_names.index(sheet_name)}.parquet"
+        table = pq.read_table(pa.BufferReader(self._zip.read(member)))
+        return table.to_pandas()
+
+    def close(self) -> None:
+        self._zip.close()
+
+    def __enter__(self) -> "TablesArchive":
+        """The archive, closed with the block."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Closes the archive."""
+        self.close()
+
+
+Workbook = pd.ExcelFile | XlsxWorkbook | TablesArchive
+XLSX_SUFFIXES = (".xlsx", ".xlsm")
+
+
+def open_workbook(path: str | os.PathLike) -> Workbook:
+    """An archive or a workbook, by the suffix of path.
+
+    XLSX workbooks are read lazily, other formats by pandas.
+    """
+    name = os.fspath(path)
+    if name.endswith(TABLES_ARCHIVE_SUFFIX):
+        return TablesArchive(path)
+    if name.endswith(XLSX_SUFFIXES):
+        return XlsxWorkbook(path)
+    return pd.ExcelFile(path)
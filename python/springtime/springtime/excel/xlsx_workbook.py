@@ -0,0 +1,138 @@
+"""Reads XLSX sheets lazily, row by row.
+
+`pd.ExcelFile` parses a whole sheet into a DataFrame even when only its
+first rows are used. `XlsxWorkbook` streams the rows of a sheet from the
+read-only openpyxl workbook so a caller can stop reading when it has
+enough, and only the rows read are ever held in memory.
+"""
+import datetime
+import itertools
+import os
+from collections.abc import Iterable, Iterator
+from types import TracebackType
+from typing import Any
+
+import openpyxl
+import pandas as pd
+from openpyxl.cell.cell import ERROR_CODES
+from pandas._libs.parsers import STR_NA_VALUES
+
+# the header pandas gives blank columns
+UNNAMED = "Unnamed: {}"
+# text pandas reads as a missing value, along with error cells
+MISSING_TEXT = frozenset(ERROR_CODES) | STR_NA_VALUES
+
+# what openpyxl reads from a cell
+CellValue = (
+    str
+    | int
+    | float
+    | bool
+    | datetime.datetime
+    | datetime.date
+    | datetime.time
+    | datetime.timedelta
+    | None
+)
+Row = tuple[CellValue, ...]
+
+
+def sheet_columns(names: Iterable[Any]) -> list[str]:
+    """Unique column names for a header row, mangled the way pandas does."""
+    columns: list[str] = []
+    seen: set[str] = set()
+    for position, name in enumerate(names):
+        header = "" if pd.isna(name) else str(name)
+        header = header or UNNAMED.format(position)
+        candidate, copy = header, 0
+        while candidate in seen:
+            copy += 1
+            candidate = f"{header}.{copy}"
+        seen.add(candidate)
+        columns.append(candidate)
+    return columns
+
+
+def convert_cell(value: CellValue) -> CellValue:
+    """The value pandas reads for a cell, None when it is empty."""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value in MISSING_TEXT:
+        return None
+    return value
+
+
+def trimmed(row: Row) -> Row:
+    """The row without its trailing empty cells."""
+    end = len(row)
+    while end and row[end - 1] in (None, ""):
+        end -= 1
+    return row[:end]
+
+
+def as_frame(rows: list[Row]) -> pd.DataFrame:
+    """A sheet from its header and rows, padded to the widest of them."""
+    if not rows:
+        return pd.DataFrame()
+    header, *data = rows
+    width = max(len(row) for row in rows)
+    columns = sheet_columns(header + (None,) * (width - len(header)))
+    return pd.DataFrame(
+        [row + (None,) * (width - len(row)) for row in data],
+        columns=columns,
+    )
+
+
+class XlsxWorkbook:
+    """A read-only XLSX workbook whose sheets are read when asked for."""
+
+    def __init__(self, path: str | os.PathLike) -> None:
+        self.io = path
+        self._book = openpyxl.load_workbook(
+            path,
+            read_only=True,
+            data_only=True,
+            keep_links=False,
+        )
+        self.sheet_names: list[str] = self._book.sheetnames
+
+    def rows(self, sheet_name: str) -> Iterator[Row]:
+        """The header and the rows of the sheet, without trailing blank rows.
+
+        Trailing empty cells are dropped, so rows differ in length.
+        """
+        sheet = self._book[sheet_name]
+        # the dimensions a file declares can be wrong, read every row
+        sheet.reset_dimensions()
+        blank_rows = 0
+        for cells in sheet.iter_rows(values_only=True):
+            # cells reading as missing still count towards the width
+            row = tuple(map(convert_cell, trimmed(cells)))
+            if not row:
+                blank_rows += 1
+                continue
+            yield from itertools.repeat((), blank_rows)
+            blank_rows = 0
+            yield row
+
+    def parse(self, sheet_name: str, nrows: int | None = None) -> pd.DataFrame:
+        """The sheet as a DataFrame, of its first nrows rows when given."""
+        rows = self.rows(sheet_name)
+        stop = None if nrows is None else nrows + 1
+        return as_frame(list(itertools.islice(rows, stop)))
+
+    def close(self) -> None:
+        self._book.close()
+
+    def __enter__(self) -> "XlsxWorkbook":
+        """The workbook, closed with the block."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        """Closes the workbook."""
+        self.close()
@@ -1,10 +1,15 @@
 import uvicorn
-from anthropic import Anthropic
+from anthropic import Anthropic, AsyncAnthropic
 from fastapi import FastAPI
 from loguru import logger
 
-from springtime.excel.table_extractor import TabulaTableExtractor
+from springtime.excel.table_extractor import (
+    FitzTableExtractor,
+    TableExtractor,
+    TabulaTableExtractor,
+)
 from springtime.models.open_ai import OpenAIModel
+from springtime.models.table_extractor import TableExtractorBackend
 from springtime.object_store.object_store import GCSObjectStore
 from springtime.routers.chat_router import ChatRouter
 from springtime.routers.embeddings_router import EmbeddingsRouter
@@ -14,20 +19,25 @@ from springtime.routers.report_router import ReportRouter
 from springtime.routers.table_router import TableRouter
 from springtime.routers.text_router import TextRouter
 from springtime.routers.vector_router import VectorRouter
+from springtime.services.chat_context_store import ChatContextStore
 from springtime.services.chat_service import OpenAIChatService
+from springtime.services.completion_cache import CompletionCache
+from springtime.services.embedding_cache import EmbeddingCache
 from springtime.services.embeddings_service import OpenAIEmbeddingsService
 from springtime.services.excel_analyzer import ClaudeExcelAnalyzer
+from springtime.services.ivf_vector_service import IVFVectorService
+from springtime.services.local_vector_service import LocalVectorService
 from springtime.services.prompt_service import PromptServiceImpl
 from springtime.services.report_service import OpenAIReportService
 from springtime.services.scan_service import OpenAIScanService
-from springtime.services.sheet_processor import (
-    CLAUDE_SHEET_PROCESSOR,
-)
+from springtime.services.sheet_processor import ClaudeSheetProcessor
+from springtime.services.streaming import StreamMetrics
 from springtime.services.table_analyzer import TableAnalyzerImpl
 from springtime.services.thumbnail_service import FitzThumbnailService
-from springtime.services.vector_service import PineconeVectorService
+from springtime.services.vector_cache import CachedVectorService
+from springtime.services.vector_service import PineconeVectorService, VectorService
 
-from .settings import SETTINGS
+from .settings import SETTINGS, VectorBackend
 
 app = FastAPI()
 
@@ -43,31 +53,103 @@ if SETTINGS.tracing_enabled:
 
 
 OBJECT_STORE = GCSObjectStore()
-TABLE_EXTRACTOR = TabulaTableExtractor(OBJECT_STORE)
+TABLE_EXTRACTORS: dict[TableExtractorBackend, TableExtractor] = {
+    TableExtractorBackend.tabula: TabulaTableExtractor(
+        OBJECT_STORE,
+        max_workers=SETTINGS.table_extraction_workers,
+        pages_per_batch=SETTINGS.table_extraction_pages_per_batch,
+    ),
+    TableExtractorBackend.fitz: FitzTableExtractor(OBJECT_STORE),
+}
+TABLE_EXTRACTOR = TABLE_EXTRACTORS[SETTINGS.table_extractor]
 
 THUMBNAIL_SERVICE = FitzThumbnailService()
 ANTHROPIC_CLIENT = Anthropic()
+ASYNC_ANTHROPIC_CLIENT = AsyncAnthropic()
 
-SCAN_SERVICE = OpenAIScanService(OpenAIModel.gpt3_16k)
-CLAUDE_EXCEL_ANALYZER = ClaudeExcelAnalyzer(ANTHROPIC_CLIENT)
+COMPLETION_CACHE = CompletionCache(
+    maxsize=SETTINGS.completion_cache_size,
+    ttl=SETTINGS.completion_cache_ttl,
+    path=SETTINGS.completion_cache_path,
+)
+
+SCAN_SERVICE = OpenAIScanService(OpenAIModel.gpt3_16k, COMPLETION_CACHE)
+CLAUDE_EXCEL_ANALYZER = ClaudeExcelAnalyzer(
+    ANTHROPIC_CLIENT,
+    COMPLETION_CACHE,
+    temperature=SETTINGS.claude_temperature,
+)
 
-CLAUDE_TABLE_ANALYZER = TableAnalyzerImpl(CLAUDE_EXCEL_ANALYZER, CLAUDE_SHEET_PROCESSOR)
+CLAUDE_SHEET_PROCESSOR = ClaudeSheetProcessor(
+    max_workers=SETTINGS.sheet_preprocess_workers,
+)
+CLAUDE_TABLE_ANALYZER = TableAnalyzerImpl(
+    CLAUDE_EXCEL_ANALYZER,
+    CLAUDE_SHEET_PROCESSOR,
+    max_concurrency=SETTINGS.table_analyzer_concurrency,
+    chunk_timeout=SETTINGS.table_analyzer_chunk_timeout,
+)
 
 
-EMBEDDING_SERVICE = OpenAIEmbeddingsService()
-VECTOR_SERVICE = PineconeVectorService(
-    api_key=SETTINGS.pinecone_api_key,
-    environment=SETTINGS.pinecone_env,
-    index_name=SETTINGS.pinecone_index,
-    namespace=SETTINGS.pinecone_namespace,
+EMBEDDING_CACHE = EmbeddingCache(
+    maxsize=SETTINGS.embedding_cache_size,
+    path=SETTINGS.embedding_cache_path,
+)
+EMBEDDING_SERVICE = OpenAIEmbeddingsService(
+    EMBEDDING_CACHE,
+    max_concurrency=SETTINGS.embedding_concurrency,
+)
+UNCACHED_VECTOR_SERVICE: VectorService
+if SETTINGS.vector_backend == VectorBackend.local:
+    UNCACHED_VECTOR_SERVICE = LocalVectorService(path=SETTINGS.local_vector_path)
+elif SETTINGS.vector_backend == VectorBackend.ivf:
+    UNCACHED_VECTOR_SERVICE = IVFVectorService(
+        path=SETTINGS.local_vector_path,
+        n_lists=SETTINGS.ivf_n_lists,
+        n_probe=SETTINGS.ivf_n_probe,
+    )
+else:
+    UNCACHED_VECTOR_SERVICE = PineconeVectorService(
+        api_key=SETTINGS.pinecone_api_key,
+        environment=SETTINGS.pinecone_env,
+        index_name=SETTINGS.pinecone_index,
+        namespace=SETTINGS.pinecone_namespace,
+        max_concurrency=SETTINGS.pinecone_upsert_concurrency,
+    )
+VECTOR_SERVICE = CachedVectorService(
+    UNCACHED_VECTOR_SERVICE,
+    maxsize=SETTINGS.vector_cache_size,
+    ttl=SETTINGS.vector_cache_ttl,
+)
+OPENAI_REPORT_SERVICE = OpenAIReportService(
+    COMPLETION_CACHE,
+    max_concurrency=SETTINGS.report_concurrency,
+    terms_window=SETTINGS.report_terms_window,
 )
-OPENAI_REPORT_SERVICE = OpenAIReportService()
 CHAT_SERVICE = OpenAIChatService(OpenAIModel.gpt3_16k)
+CHAT_CONTEXT_STORE = ChatContextStore(
+    max_bytes=SETTINGS.chat_context_max_bytes,
+    path=SETTINGS.chat_context_path,
+)
+CHAT_STREAM_METRICS = StreamMetrics()
 
-PROMPT_SERVICE = PromptServiceImpl(ANTHROPIC_CLIENT)
+PROMPT_SERVICE = PromptServiceImpl(
+    ANTHROPIC_CLIENT,
+    COMPLETION_CACHE,
+    ASYNC_ANTHROPIC_CLIENT,
+    temperature=SETTINGS.claude_temperature,
+)
 
 
-app.include_router(ChatRouter(CHAT_SERVICE).get_router())
+app.include_router(
+    ChatRouter(
+        CHAT_SERVICE,
+        CHAT_CONTEXT_STORE,
+        CHAT_STREAM_METRICS,
+        flush_interval=SETTINGS.chat_stream_flush_interval,
+        flush_chars=SETTINGS.chat_stream_flush_chars,
+    ).get_router(),
+)
 app.include_router(
     ReportRouter(
         OPENAI_REPORT_SERVICE,
@@ -75,7 +157,12 @@ app.include_router(
     ).get_router(),
 )
 app.include_router(
-    PdfRouter(TABLE_EXTRACTOR, OBJECT_STORE, THUMBNAIL_SERVICE).get_router(),
+    PdfRouter(
+        TABLE_EXTRACTOR,
+        OBJECT_STORE,
+        THUMBNAIL_SERVICE,
+        TABLE_EXTRACTORS,
+    ).get_router(),
 )
 app.include_router(
     TableRouter(
@@ -101,6 +188,31 @@ def healthz():
     return "OK"
 
 
+@app.get("/metrics/completion-cache")
+def completion_cache_metrics():
+    return COMPLETION_CACHE.stats()
+
+
+@app.get("/metrics/embedding-cache")
+def embedding_cache_metrics():
+    return EMBEDDING_CACHE.stats()
+
+
+@app.get("/metrics/vector-cache")
+def vector_cache_metrics():
+    return VECTOR_SERVICE.stats()
+
+
+@app.get("/metrics/chat-context")
+def chat_context_metrics():
+    return CHAT_CONTEXT_STORE.stats()
+
+
+@app.get("/metrics/chat-stream")
+def chat_stream_metrics():
+    return CHAT_STREAM_METRICS.stats()
+
+
 def start():
     uvicorn.run(
         "springtime.main:app",
@@ -29,3 +29,10 @@ class CompletionResponse(BaseModel):
 class OpenAIModel(StrEnum):
     gpt3_16k = "gpt-3.5-turbo-16k"
     gpt4 = "gpt-4-0613"
+
+
+# tokens of prompt and completion together
+CONTEXT_WINDOW = {
+    OpenAIModel.gpt3_16k: 16_384,
+    OpenAIModel.gpt4: 8_192,
+}
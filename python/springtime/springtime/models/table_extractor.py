@@ -0,0 +1,6 @@
+from enum import StrEnum
+
+
+class TableExtractorBackend(StrEnum):
+    tabula = "tabula"
+    fitz = "fitz"
@@ -12,6 +12,10 @@ class ObjectStore(abc.ABC):
     def download_to_filename(self, bucket_name: str, path: str, filename: str) -> None:
         pass
 
+    @abc.abstractmethod
+    def exists(self, bucket_name: str, path: str) -> bool:
+        pass
+
 
 class GCSObjectStore(ObjectStore):
     def __init__(self) -> None:
@@ -35,3 +39,7 @@ class GCSObjectStore(ObjectStore):
         bucket = self.client.bucket(bucket_name)
         blob = bucket.blob(path)
         blob.download_to_filename(filename)
+
+    def exists(self, bucket_name: str, path: str) -> bool:
+        bucket = self.client.bucket(bucket_name)
+        return bucket.blob(path).exists()
@@ -1,11 +1,24 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Request
 from loguru import logger
-from pydantic import BaseModel
+from pydantic import BaseModel, validator
 from starlette.responses import StreamingResponse
 
 from springtime.models.chat import ChatFileContext, ChatHistory
+from springtime.services.chat_context_store import ChatContextStore
 from springtime.services.chat_service import ChatService
 from springtime.services.html import html_from_text, parse_citations
+from springtime.services.prompt import DroppedChunk
+from springtime.services.streaming import (
+    StreamMetrics,
+    coalesced,
+    measured,
+    sse_events,
+)
+
+# deltas are held for at most this long, or until this many characters
+# have gathered, before they are written to the client
+FLUSH_INTERVAL = 0.05
+FLUSH_CHARS = 256
 
 
 class AskQuestionResponse(BaseModel):
@@ -24,11 +37,45 @@ class GetTitleResponse(BaseModel):
 class AskQuestionRequest(BaseModel):
     question: str
     history: list[ChatHistory]
-    for_files: list[ChatFileContext]
+    for_files: list[ChatFileContext] = []
+    # a context registered with /chat/context, and the ids of the chunks to
+    # use from it, all of them when None
+    context_id: str | None = None
+    chunk_ids: list[str] | None = None
+
+
+class RegisterContextRequest(BaseModel):
+    files: list[ChatFileContext]
+
+    @validator("files")
+    @classmethod
+    def check_file_names(
+        cls: type["RegisterContextRequest"],
+        files: list[ChatFileContext],
+    ) -> list[ChatFileContext]:
+        # chunk ids are returned, and resolved, per file name
+        names = [file.file_name for file in files]
+        if len(set(names)) != len(names):
+            msg = "file names must be unique"
+            raise ValueError(msg)
+        return files
+
+
+class RegisteredFile(BaseModel):
+    file_name: str
+    chunk_ids: list[str]
+
+
+class RegisterContextResponse(BaseModel):
+    context_id: str
+    files: list[RegisteredFile]
 
 
 class GetPromptResponse(BaseModel):
     prompt: str
+    tokens: int
+    dropped_chunks: list[DroppedChunk]
+    dropped_history: int
 
 
 class HtmlFromTextRequest(BaseModel):
@@ -42,34 +89,98 @@ class HtmlFromTextResponse(BaseModel):
 
 
 class ChatRouter:
-    def __init__(self, chat_service: ChatService) -> None:
+    def __init__(
+        self,
+        chat_service: ChatService,
+        context_store: ChatContextStore | None = None,
+        stream_metrics: StreamMetrics | None = None,
+        *,
+        flush_interval: float = FLUSH_INTERVAL,
+        flush_chars: int = FLUSH_CHARS,
+    ) -> None:
         self.chat_service = chat_service
+        self.context_store = context_store or ChatContextStore()
+        self.stream_metrics = stream_metrics or StreamMetrics()
+        self.flush_interval = flush_interval
+        self.flush_chars = flush_chars
+
+    def files_for_request(self, req: AskQuestionRequest) -> list[ChatFileContext]:
+        if req.context_id is None:
+            return req.for_files
+        try:
+            files = self.context_store.resolve(req.context_id, req.chunk_ids)
+        except KeyError as e:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Unknown chunk id {e.args[0]}",
+            ) from e
+        if files is None:
+            # evicted or never registered, the client registers it again
+            raise HTTPException(
+                status_code=404,
+                detail=f"Unknown context {req.context_id}",
+            )
+        return [*files, *req.for_files]
 
     def get_router(self):
         router = APIRouter(prefix="/chat")
 
+        @router.post("/context")
+        def register_context_route(
+            req: RegisterContextRequest,
+        ) -> RegisterContextResponse:
+            context_id, stored = self.context_store.register(req.files)
+            chunk_ids: dict[str, list[str]] = {file.file_name: [] for file in req.files}
+            for chunk_id_, (file_name, _) in stored.chunks.items():
+                chunk_ids[file_name].append(chunk_id_)
+            return RegisterContextResponse(
+                context_id=context_id,
+                files=[
+                    RegisteredFile(file_name=file_name, chunk_ids=ids)
+                    for file_name, ids in chunk_ids.items()
+                ],
+            )
+
         @router.post("/ask-question-streaming")
-        def ask_question_streaming_route(req: AskQuestionRequest):
-            stream = self.chat_service.ask_streaming(
-                req.for_files,
-                req.question,
-                req.history,
+        async def ask_question_streaming_route(
+            req: AskQuestionRequest,
+            request: Request,
+        ):
+            """Streams the answer as it is generated.
+
+            Deltas are coalesced into larger writes. Clients accepting
+            text/event-stream get every write as an SSE message event and a
+            final done or error event, others get the plain text.
+            """
+            stream = coalesced(
+                measured(
+                    self.chat_service.ask_streaming_async(
+                        self.files_for_request(req),
+                        req.question,
+                        req.history,
+                    ),
+                    self.stream_metrics,
+                ),
+                max_delay=self.flush_interval,
+                max_chars=self.flush_chars,
             )
+            if "text/event-stream" in request.headers.get("accept", ""):
+                stream = sse_events(stream)
             return StreamingResponse(content=stream, media_type="text/event-stream")
 
         @router.post("/prompt")
         def prompt_route(req: AskQuestionRequest):
             prompt = self.chat_service.get_prompt(
-                req.for_files,
+                self.files_for_request(req),
                 req.question,
                 req.history,
             )
 
-            return GetPromptResponse(prompt=prompt)
+            return GetPromptResponse(**prompt.dict())
 
         @router.post("/get-title")
-        def get_title_route(req: GetTitleRequest) -> GetTitleResponse:
-            title = self.chat_service.get_title(req.question, req.answer)
+        async def get_title_route(req: GetTitleRequest) -> GetTitleResponse:
+            title = await self.chat_service.get_title_async(req.question, req.answer)
             return GetTitleResponse(title=title)
 
         @router.post("/sanitize")
@@ -1,7 +1,19 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
 from pydantic import BaseModel
 
 from springtime.services.embeddings_service import EmbeddingsService
+from springtime.services.vector_codec import (
+    DTYPE_HEADER,
+    SHAPE_HEADER,
+    VECTORS_BINARY_MEDIA_TYPE,
+    VECTORS_JSON_MEDIA_TYPE,
+    EncodedVectors,
+    accepted_vectors_media_type,
+    as_matrix,
+    encode_vectors,
+    to_bytes,
+)
 
 
 class EmbeddingForDocumentRequest(BaseModel):
@@ -12,6 +24,10 @@ class EmbeddingForDocumentResponse(BaseModel):
     response: list[list[float]]
 
 
+class EncodedEmbeddingForDocumentResponse(BaseModel):
+    response: EncodedVectors
+
+
 class EmbeddingsRouter:
     def __init__(self, embeddings_service: EmbeddingsService) -> None:
         self.embeddings_service = embeddings_service
@@ -19,9 +35,58 @@ class EmbeddingsRouter:
     def get_router(self):
         router = APIRouter(prefix="/embeddings")
 
-        @router.post("/embedding-for-documents")
-        def embeddings_for_documents_route(req: EmbeddingForDocumentRequest):
+        @router.post(
+            "/embedding-for-documents",
+            response_model=EmbeddingForDocumentResponse,
+            responses={
+                200: {
+                    "content": {
+                        VECTORS_JSON_MEDIA_TYPE: {
+                            "schema": EncodedEmbeddingForDocumentResponse.schema(),
+                        },
+                        VECTORS_BINARY_MEDIA_TYPE: {},
+                    },
+                },
+            },
+        )
+        def embeddings_for_documents_route(
+            req: EmbeddingForDocumentRequest,
+            request: Request,
+        ):
+            """Embeddings as JSON floats by default.
+
+            Accepting `application/vnd.springtime.vectors+json` returns them as
+            one base64 buffer, `application/octet-stream` as the raw buffer with
+            its dtype and shape in headers. Both take a `dtype` parameter of
+            float32, the default, float16 or int8.
+            """
+            try:
+                accepted = accepted_vectors_media_type(
+                    request.headers.get("accept", ""),
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=406, detail=str(e)) from e
+
             response = self.embeddings_service.embed_documents(req.documents)
-            return EmbeddingForDocumentResponse(response=response)
+            if accepted is None:
+                return EmbeddingForDocumentResponse(response=response)
+            media_type, dtype = accepted
+            if media_type == VECTORS_JSON_MEDIA_TYPE:
+                encoded = encode_vectors(response, dtype)
+                return Response(
+                    content=EncodedEmbeddingForDocumentResponse(
+                        response=encoded,
+                    ).json(),
+                    media_type=VECTORS_JSON_MEDIA_TYPE,
+                )
+            matrix = as_matrix(response)
+            return Response(
+                content=to_bytes(matrix, dtype),
+                media_type=VECTORS_BINARY_MEDIA_TYPE,
+                headers={
+                    DTYPE_HEADER: dtype.value,
+                    SHAPE_HEADER: ",".join(map(str, matrix.shape)),
+                },
+            )
 
         return router
@@ -1,11 +1,13 @@
 import os
 import tempfile
 import uuid
+from collections.abc import Mapping
 
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel, NonNegativeInt
 
 from springtime.excel.table_extractor import ExtractionArguments, TableExtractor
+from springtime.models.table_extractor import TableExtractorBackend
 from springtime.object_store.object_store import ObjectStore
 from springtime.services.thumbnail_service import ThumbnailService
 
@@ -15,6 +17,8 @@ class ExtractTablesRequest(BaseModel):
     object_path: str
     output_prefix: str
     title: str
+    # the configured extractor when None
+    extractor: TableExtractorBackend | None = None
 
 
 class GetThumbnailRequest(BaseModel):
@@ -30,6 +34,8 @@ class GetThumbailResponse(BaseModel):
 class ExtractTableResponse(BaseModel):
     number_of_sheets: NonNegativeInt
     object_path: str | None
+    # the tables as Parquet, see TablesArchive
+    tables_object_path: str | None
 
 
 XLSX_MIME_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
@@ -41,16 +47,27 @@ class PdfRouter:
         table_extractor: TableExtractor,
         object_store: ObjectStore,
         thumbnail_service: ThumbnailService,
+        table_extractors: Mapping[TableExtractorBackend, TableExtractor] | None = None,
     ) -> None:
         self.table_extractor = table_extractor
         self.object_store = object_store
         self.thumbnail_service = thumbnail_service
+        self.table_extractors = table_extractors or {}
 
     def get_router(self):
         router = APIRouter(prefix="/pdf")
 
         @router.post("/extract-tables")
         def extract_tables(req: ExtractTablesRequest):
+            table_extractor = self.table_extractor
+            if req.extractor is not None:
+                if req.extractor not in self.table_extractors:
+                    raise HTTPException(
+                        status_code=422,
+                        detail=f"The {req.extractor.value} extractor is not available",
+                    )
+                table_extractor = self.table_extractors[req.extractor]
+
             with tempfile.NamedTemporaryFile("wb+") as tmp:
                 self.object_store.download_to_filename(
                     req.bucket,
@@ -58,7 +75,7 @@ class PdfRouter:
                     tmp.name,
                 )
 
-                resp = self.table_extractor.extract(
+                resp = table_extractor.extract(
                     ExtractionArguments(
                         file_name=tmp.name,
                         title=req.title,
@@ -69,6 +86,7 @@ class PdfRouter:
                 return ExtractTableResponse(
                     number_of_sheets=resp.number_of_sheets,
                     object_path=resp.path,
+                    tables_object_path=resp.tables_path,
                 )
 
         @router.post("/get-thumbnail")
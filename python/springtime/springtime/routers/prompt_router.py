@@ -22,7 +22,7 @@ class PromptRouter:
         router = APIRouter(prefix="/prompt")
 
         @router.post("/run")
-        def run_route(req: RunRequest):
-            return self.prompt_service.run(req)
+        async def run_route(req: RunRequest):
+            return await self.prompt_service.run_async(req)
 
         return router
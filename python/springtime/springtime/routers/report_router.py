@@ -49,17 +49,22 @@ class ReportRouter:
 
         # GPT
         @router.post("/generate-questions")
-        def questions_route(req: LLMOutputRequest) -> GenerateQuestionsResponse:
-            questions = self.gpt_report_service.generate_questions(req.text)
+        async def questions_route(req: LLMOutputRequest) -> GenerateQuestionsResponse:
+            questions = await self.gpt_report_service.generate_questions_async(
+                req.text,
+            )
             return GenerateQuestionsResponse(questions=questions)
 
         @router.post("/generate-terms")
-        def terms_route(req: LLMOutputRequest) -> GenerateTermsResponse:
-            terms = self.gpt_report_service.generate_terms(req.text)
+        async def terms_route(req: LLMOutputRequest) -> GenerateTermsResponse:
+            terms = await self.gpt_report_service.generate_terms_async(req.text)
             return GenerateTermsResponse(terms=terms)
 
         @router.post("/scan")
-        def scan_route(req: ScanRequest):
-            return self.scan_service.scan(file_name=req.file_name, text=req.text)
+        async def scan_route(req: ScanRequest):
+            return await self.scan_service.scan_async(
+                file_name=req.file_name,
+                text=req.text,
+            )
 
         return router
@@ -1,10 +1,18 @@
 import tempfile
+from collections.abc import Iterator
+from contextlib import contextmanager
 
-import pandas as pd
 from fastapi import APIRouter
 from loguru import logger
 from pydantic import BaseModel
+from starlette.responses import StreamingResponse
 
+from springtime.excel.tables_archive import (
+    TABLES_ARCHIVE_SUFFIX,
+    Workbook,
+    open_workbook,
+    tables_archive_path,
+)
 from springtime.object_store.object_store import ObjectStore
 from springtime.services.table_analyzer import (
     AnalyzeResponseChunk,
@@ -15,6 +23,8 @@ from springtime.services.table_analyzer import (
 class AnalyzeTableRequest(BaseModel):
     bucket: str
     object_path: str
+    # the TablesArchive of the workbook, looked for next to it when None
+    tables_object_path: str | None = None
 
 
 class AnalyzeTableResponse(BaseModel):
@@ -39,6 +49,11 @@ class TableRouter:
         ) -> AnalyzeTableResponse:
             return self.analyze_table(self.claude_table_analyzer, req)
 
+        @router.post("/analyze-claude-streaming")
+        def analyze_tables_claude_streaming(req: AnalyzeTableRequest):
+            stream = self.analyze_table_streaming(self.claude_table_analyzer, req)
+            return StreamingResponse(content=stream, media_type="application/x-ndjson")
+
         return router
 
     def analyze_table(
@@ -46,17 +61,47 @@ class TableRouter:
         table_analyzer: TableAnalyzer,
         req: AnalyzeTableRequest,
     ) -> AnalyzeTableResponse:
-        logger.info(f"Analyzing {req.bucket}/{req.object_path}")
+        with self.download_excel_file(req) as excel_file:
+            resp = table_analyzer.analyze(excel_file=excel_file)
+
+            return AnalyzeTableResponse(chunks=resp.chunks)
+
+    def analyze_table_streaming(
+        self,
+        table_analyzer: TableAnalyzer,
+        req: AnalyzeTableRequest,
+    ) -> Iterator[str]:
+        """Writes one AnalyzeResponseChunk per line as soon as it is analyzed."""
+        with self.download_excel_file(req) as excel_file:
+            for chunk in table_analyzer.analyze_streaming(excel_file=excel_file):
+                yield f"{chunk.json()}\n"
+
+    @contextmanager
+    def download_excel_file(self, req: AnalyzeTableRequest) -> Iterator[Workbook]:
+        """The tables archive of the workbook when there is one, else the workbook.
+
+        Extracted tables come with an archive, which loads without parsing
+        the XLSX, uploaded workbooks do not.
+        """
+        tables_object_path = req.tables_object_path
+        if tables_object_path is None:
+            candidate = tables_archive_path(req.object_path)
+            if self.object_store.exists(req.bucket, candidate):
+                tables_object_path = candidate
+        object_path = tables_object_path or req.object_path
+
+        logger.info(f"Analyzing {req.bucket}/{object_path}")
         with tempfile.TemporaryDirectory() as tmpdirname:
-            file_name = f"{tmpdirname}/file.xlsx"
+            file_name = (
+                f"{tmpdirname}/file{TABLES_ARCHIVE_SUFFIX}"
+                if tables_object_path
+                else f"{tmpdirname}/file.xlsx"
+            )
             self.object_store.download_to_filename(
                 req.bucket,
-                req.object_path,
+                object_path,
                 file_name,
             )
 
-            excel_file = pd.ExcelFile(file_name)
-
-            resp = table_analyzer.analyze(excel_file=excel_file)
-
-            return AnalyzeTableResponse(chunks=resp.chunks)
+            with open_workbook(file_name) as workbook:
+                yield workbook
@@ -13,15 +13,33 @@ class TokenLengthResponse(BaseModel):
     claude100k: NonNegativeInt
 
 
+class TokenLengthsRequest(BaseModel):
+    texts: list[str]
+
+
+class TokenLengthsResponse(BaseModel):
+    lengths: list[TokenLengthResponse]
+
+
 class TextRouter:
     def get_router(self):
         router = APIRouter(prefix="/text")
 
         @router.post("/token-length")
         def token_length_route(req: TokenLengthRequest):
-            return TokenLengthResponse(
-                gpt4=TokenLength.gpt4(req.text),
-                claude100k=TokenLength.claude100k(req.text),
+            [gpt4] = TokenLength.gpt4_many([req.text])
+            [claude100k] = TokenLength.claude100k_many([req.text])
+            return TokenLengthResponse(gpt4=gpt4, claude100k=claude100k)
+
+        @router.post("/token-lengths")
+        def token_lengths_route(req: TokenLengthsRequest):
+            gpt4 = TokenLength.gpt4_many(req.texts)
+            claude100k = TokenLength.claude100k_many(req.texts)
+            return TokenLengthsResponse(
+                lengths=[
+                    TokenLengthResponse(gpt4=gpt4_length, claude100k=claude_length)
+                    for gpt4_length, claude_length in zip(gpt4, claude100k, strict=True)
+                ],
             )
 
         return router
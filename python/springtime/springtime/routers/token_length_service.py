@@ -1,17 +1,123 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Sequence
+from functools import cache
+
 import anthropic
 import tiktoken
 
-ENC_GPT4 = tiktoken.encoding_for_model("gpt-4")
+anthropic_client = anthropic.Anthropic()
+
+EncodeBatch = Callable[[list[str]], list[int]]
 
+DEFAULT_CACHE_SIZE = 4096
 
-anthropic_client = anthropic.Anthropic()
+
+@cache
+def gpt4_encoding() -> tiktoken.Encoding:
+    return tiktoken.encoding_for_model("gpt-4")
+
+
+@cache
+def claude_tokenizer():
+    return anthropic_client.get_tokenizer()
+
+
+def gpt4_encode_batch(texts: list[str]) -> list[int]:
+    return [len(tokens) for tokens in gpt4_encoding().encode_batch(texts)]
+
+
+def claude_encode_batch(texts: list[str]) -> list[int]:
+    return [len(encoding.ids) for encoding in claude_tokenizer().encode_batch(texts)]
+
+
+def content_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+class TokenCounter:
+    """Counts tokens with a bounded LRU of recent results keyed on a content hash.
+
+    Misses are encoded together in a single batch call so the tokenizer can
+    parallelize across texts.
+    """
+
+    def __init__(
+        self,
+        encode_batch: EncodeBatch,
+        maxsize: int = DEFAULT_CACHE_SIZE,
+    ) -> None:
+        self.encode_batch = encode_batch
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[bytes, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def count(self, text: str) -> int:
+        return self.count_many([text])[0]
+
+    def count_many(self, texts: Sequence[str]) -> list[int]:
+        keys = [content_key(text) for text in texts]
+        counts: list[int | None] = [None] * len(texts)
+        missing: dict[bytes, list[int]] = {}
+
+        with self._lock:
+            for idx, key in enumerate(keys):
+                if (value := self._cache.get(key)) is not None:
+                    self._cache.move_to_end(key)
+                    counts[idx] = value
+                    self.hits += 1
+                else:
+                    missing.setdefault(key, []).append(idx)
+                    self.misses += 1
+
+        if missing:
+            to_encode = [texts[indices[0]] for indices in missing.values()]
+            encoded = self.encode_batch(to_encode)
+            with self._lock:
+                for (key, indices), value in zip(
+                    missing.items(),
+                    encoded,
+                    strict=True,
+                ):
+                    for idx in indices:
+                        counts[idx] = value
+                    self._put(key, value)
+
+        return counts
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def _put(self, key: bytes, value: int) -> None:
+        self._cache[key] = value
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+
+GPT4_COUNTER = TokenCounter(gpt4_encode_batch)
+CLAUDE_COUNTER = TokenCounter(claude_encode_batch)
 
 
 class TokenLength:
     @staticmethod
     def gpt4(text: str):
-        return len(ENC_GPT4.encode(text))
+        return GPT4_COUNTER.count(text)
 
     @staticmethod
     def claude100k(text: str):
-        return anthropic_client.count_tokens(text)
+        return CLAUDE_COUNTER.count(text)
+
+    @staticmethod
+    def gpt4_many(texts: Sequence[str]) -> list[int]:
+        return GPT4_COUNTER.count_many(texts)
+
+    @staticmethod
+    def claude100k_many(texts: Sequence[str]) -> list[int]:
+        return CLAUDE_COUNTER.count_many(texts)
@@ -1,18 +1,57 @@
 from typing import Any
 
-from fastapi import APIRouter
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, ValidationError, root_validator
 
-from springtime.services.vector_service import UpsertVector, VectorService
+from springtime.services.vector_codec import (
+    VECTORS_JSON_MEDIA_TYPE,
+    EncodedVectors,
+    decode_vectors,
+)
+from springtime.services.vector_service import (
+    MAX_TOP_K,
+    TOP_K,
+    SimilarityQuery,
+    UpsertVector,
+    VectorService,
+)
 
 
 class UpsertVectorRequest(BaseModel):
     vectors: list[UpsertVector]
 
 
+class EncodedUpsertVectorRequest(BaseModel):
+    ids: list[str]
+    vectors: EncodedVectors
+    metadata: list[dict[str, str]] | None = None
+
+    @root_validator(skip_on_failure=True)
+    @classmethod
+    def check_lengths(
+        cls: type["EncodedUpsertVectorRequest"],
+        values: dict[str, Any],
+    ) -> dict[str, Any]:
+        count = len(values["ids"])
+        if values["vectors"].shape[0] != count:
+            msg = "vectors must have one row per id"
+            raise ValueError(msg)
+        if values["metadata"] is not None and len(values["metadata"]) != count:
+            msg = "metadata must have one entry per id"
+            raise ValueError(msg)
+        return values
+
+
 class SimilarVectorRequest(BaseModel):
     vector: list[float]
     metadata: dict[str, Any]
+    top_k: int = Field(default=TOP_K, ge=1, le=MAX_TOP_K)
+    n_probe: int | None = Field(default=None, ge=1)
+
+
+class SimilarVectorsBatchRequest(BaseModel):
+    queries: list[SimilarityQuery]
 
 
 class VectorRouter:
@@ -22,15 +61,60 @@ class VectorRouter:
     def get_router(self):
         router = APIRouter(prefix="/vector")
 
-        @router.put("/upsert-vectors")
-        def upsert_vectors_route(req: UpsertVectorRequest):
-            if req.vectors:
-                self.vector_service.upsert(req.vectors)
-            return {"upsert_count": len(req.vectors)}
+        @router.put(
+            "/upsert-vectors",
+            openapi_extra={
+                "requestBody": {
+                    "content": {
+                        "application/json": {
+                            "schema": UpsertVectorRequest.schema(),
+                        },
+                        VECTORS_JSON_MEDIA_TYPE: {
+                            "schema": EncodedUpsertVectorRequest.schema(),
+                        },
+                    },
+                },
+            },
+        )
+        async def upsert_vectors_route(request: Request):
+            body = await request.body()
+            content_type = request.headers.get("content-type", "")
+            try:
+                if content_type.startswith(VECTORS_JSON_MEDIA_TYPE):
+                    encoded = EncodedUpsertVectorRequest.parse_raw(body)
+                    count = len(encoded.ids)
+                    if count:
+                        await run_in_threadpool(
+                            self.vector_service.upsert_arrays,
+                            encoded.ids,
+                            decode_vectors(encoded.vectors),
+                            encoded.metadata or [{} for _ in encoded.ids],
+                        )
+                else:
+                    req = UpsertVectorRequest.parse_raw(body)
+                    count = len(req.vectors)
+                    if count:
+                        await run_in_threadpool(self.vector_service.upsert, req.vectors)
+            except ValidationError as e:
+                raise HTTPException(status_code=422, detail=e.errors()) from e
+            except ValueError as e:
+                raise HTTPException(status_code=422, detail=str(e)) from e
+            return {"upsert_count": count}
 
         @router.post("/similar-vectors")
         def similar_vectors_route(req: SimilarVectorRequest):
-            results = self.vector_service.get_similar(req.vector, req.metadata)
+            results = self.vector_service.get_similar(
+                req.vector,
+                req.metadata,
+                req.top_k,
+                req.n_probe,
+            )
+            return {"results": results}
+
+        @router.post("/similar-vectors-batch")
+        def similar_vectors_batch_route(req: SimilarVectorsBatchRequest):
+            """Results for every query, grouped in the order of the queries."""
+            results = self.vector_service.get_similar_many(req.queries)
             return {"results": results}
 
         return router
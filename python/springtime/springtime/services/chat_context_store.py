@@ -0,0 +1,222 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+from pydantic import BaseModel, NonNegativeInt, parse_raw_as
+
+from springtime.models.chat import ChatChunkContext, ChatFileContext
+
+
+def chunk_id(file_name: str, chunk: ChatChunkContext) -> str:
+    encoded = json.dumps([file_name, chunk.dict()], sort_keys=True)
+    return hashlib.blake2b(encoded.encode("utf-8"), digest_size=12).hexdigest()
+
+
+class ChatContextStats(BaseModel):
+    hits: NonNegativeInt
+    disk_hits: NonNegativeInt
+    misses: NonNegativeInt
+    size: NonNegativeInt
+    bytes: NonNegativeInt
+
+
+class StoredChunk(NamedTuple):
+    file_name: str
+    chunk: ChatChunkContext
+
+
+class StoredContext(NamedTuple):
+    files: list[ChatFileContext]
+    # chunk id to its file and chunk, in registration order
+    chunks: dict[str, StoredChunk]
+    size: int
+
+    @staticmethod
+    def of(files: list[ChatFileContext]) -> "StoredContext":
+        chunks = {
+            chunk_id(file.file_name, chunk): StoredChunk(file.file_name, chunk)
+            for file in files
+            for chunk in file.chunks
+        }
+        size = sum(
+            len(file.file_name) + sum(len(chunk.content) for chunk in file.chunks)
+            for file in files
+        )
+        return StoredContext(files, chunks, size)
+
+
+class SqliteChatContextStore:
+    def __init__(self, path: str, *, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """
+CREATE TABLE IF NOT EXISTS chat_context (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    accessed_at INTEGER NOT NULL
+)
+""",
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS chat_context_accessed_at ON chat_context(accessed_at)",
+            )
+            [self._clock] = self._connection.execute(
+                "SELECT COALESCE(MAX(accessed_at), 0) FROM chat_context",
+            ).fetchone()
+
+    def get(self, key: str) -> list[ChatFileContext] | None:
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT value FROM chat_context WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._clock += 1
+            self._connection.execute(
+                "UPDATE chat_context SET accessed_at = ? WHERE key = ?",
+                (self._clock, key),
+            )
+        return parse_raw_as(list[ChatFileContext], row[0])
+
+    def set(self, key: str, files: list[ChatFileContext]) -> None:
+        value = json.dumps([file.dict() for file in files])
+        with self._lock, self._connection:
+            self._clock += 1
+            self._connection.execute(
+                "INSERT OR REPLACE INTO chat_context VALUES (?, ?, ?)",
+                (key, value, self._clock),
+            )
+            self._connection.execute(
+                """
+DELETE FROM chat_context WHERE key IN (
+    SELECT key FROM chat_context ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+)
+""",
+                (self.max_entries,),
+            )
+
+
+class ChatContextStore:
+    """Keeps the file chunks of chat contexts so questions can refer to them.
+
+    A context is registered once and gets back a handle, the hash of its
+    chunks, with an id per chunk. Contexts are held in memory in an LRU
+    bounded by the size of their content. With a path, contexts evicted
+    from memory spill to sqlite and are read back on their next use.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_bytes: int = 256 * 1024 * 1024,
+        path: str | None = None,
+        max_disk_entries: int = 100_000,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.disk = (
+            SqliteChatContextStore(path, max_entries=max_disk_entries) if path else None
+        )
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, StoredContext] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def register(self, files: list[ChatFileContext]) -> tuple[str, StoredContext]:
+        """Stores the files, returns their handle and the stored context."""
+        stored = StoredContext.of(files)
+        context_id = hashlib.blake2b(
+            json.dumps([[file.file_name for file in files], *stored.chunks]).encode(),
+            digest_size=16,
+        ).hexdigest()
+        with self._lock:
+            spilled = self._set_memory(context_id, stored)
+        self._spill(spilled)
+        return context_id, stored
+
+    def get(self, context_id: str) -> StoredContext | None:
+        with self._lock:
+            if (stored := self._memory.get(context_id)) is not None:
+                self._memory.move_to_end(context_id)
+                self.hits += 1
+                return stored
+
+        files = self.disk.get(context_id) if self.disk else None
+        if files is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        stored = StoredContext.of(files)
+        with self._lock:
+            self.disk_hits += 1
+            spilled = self._set_memory(context_id, stored)
+        self._spill(spilled)
+        return stored
+
+    def resolve(
+        self,
+        context_id: str,
+        chunk_ids: list[str] | None = None,
+    ) -> list[ChatFileContext] | None:
+        """The files of a context with the given chunks, all when None.
+
+        Chunks keep the order of chunk_ids, files the order their first
+        chunk appears in. None when the context is not stored, raises
+        KeyError on an unknown chunk id.
+        """
+        stored = self.get(context_id)
+        if stored is None:
+            return None
+        if chunk_ids is None:
+            return stored.files
+
+        files: dict[str, ChatFileContext] = {}
+        for chunk_id_ in chunk_ids:
+            file_name, chunk = stored.chunks[chunk_id_]
+            if file_name not in files:
+                files[file_name] = ChatFileContext.construct(
+                    file_name=file_name,
+                    chunks=[],
+                )
+            files[file_name].chunks.append(chunk)
+        return list(files.values())
+
+    def stats(self) -> ChatContextStats:
+        with self._lock:
+            return ChatContextStats(
+                hits=self.hits,
+                disk_hits=self.disk_hits,
+                misses=self.misses,
+                size=len(self._memory),
+                bytes=self._bytes,
+            )
+
+    def _set_memory(
+        self,
+        context_id: str,
+        stored: StoredContext,
+    ) -> list[tuple[str, StoredContext]]:
+        """Adds a context, returns the contexts evicted to make room."""
+        if (previous := self._memory.pop(context_id, None)) is not None:
+            self._bytes -= previous.size
+        self._memory[context_id] = stored
+        self._bytes += stored.size
+        evicted = []
+        while self._bytes > self.max_bytes and len(self._memory) > 1:
+            evicted_id, evicted_context = self._memory.popitem(last=False)
+            self._bytes -= evicted_context.size
+            evicted.append((evicted_id, evicted_context))
+        return evicted
+
+    def _spill(self, evicted: list[tuple[str, StoredContext]]) -> None:
+        if self.disk:
+            for context_id, stored in evicted:
+                self.disk.set(context_id, stored.files)
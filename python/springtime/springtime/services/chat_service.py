@@ -1,13 +1,16 @@
 import abc
-from collections.abc import Generator
+import asyncio
+from collections.abc import AsyncGenerator, Generator
+from functools import cached_property
 from typing import Any
 
 import openai
 from loguru import logger
 
 from springtime.models.chat import ChatFileContext, ChatHistory
-from springtime.models.open_ai import OpenAIModel
-from springtime.services.prompt import create_prompt
+from springtime.models.open_ai import CONTEXT_WINDOW, OpenAIModel
+from springtime.routers.token_length_service import GPT4_COUNTER, TokenCounter
+from springtime.services.prompt import BudgetedPrompt, create_budgeted_prompt
 
 
 class ChatService(abc.ABC):
@@ -20,19 +23,32 @@ class ChatService(abc.ABC):
     ) -> Generator[Any, Any, None]:
         pass
 
+    @abc.abstractmethod
+    def ask_streaming_async(
+        self,
+        context: list[ChatFileContext],
+        question: str,
+        history: list[ChatHistory],
+    ) -> AsyncGenerator[str, None]:
+        pass
+
     @abc.abstractmethod
     def get_prompt(
         self,
         context: list[ChatFileContext],
         question: str,
         history: list[ChatHistory],
-    ) -> str:
+    ) -> BudgetedPrompt:
         pass
 
     @abc.abstractmethod
     def get_title(self, question: str, answer: str) -> str:
         pass
 
+    @abc.abstractmethod
+    async def get_title_async(self, question: str, answer: str) -> str:
+        pass
+
 
 SYSTEM_1 = """You are an AI assistant that is an expert financial analyst.
 Do not use language or provide opinions or judgment on an investment or financials, but provide objective and factual analysis.
@@ -54,22 +70,71 @@ For example:
 * use br tags for line breaks
 """
 
+# room left in the context window for the answer
+COMPLETION_TOKENS = 2048
+# tokens the chat format adds around every message, and to prime the reply
+MESSAGE_TOKENS = 4
+REPLY_TOKENS = 3
+
 
 class OpenAIChatService(ChatService):
-    def __init__(self, model: OpenAIModel) -> None:
+    def __init__(
+        self,
+        model: OpenAIModel,
+        *,
+        completion_tokens: int = COMPLETION_TOKENS,
+        counter: TokenCounter = GPT4_COUNTER,
+    ) -> None:
         self.model = model
+        self.completion_tokens = completion_tokens
+        self.counter = counter
+
+    @cached_property
+    def prompt_budget(self) -> int:
+        """Tokens left for the user message once the system messages are in."""
+        system_tokens = sum(self.counter.count_many([SYSTEM_1, SYSTEM_2]))
+        return (
+            CONTEXT_WINDOW[self.model]
+            - self.completion_tokens
+            - system_tokens
+            - 3 * MESSAGE_TOKENS
+            - REPLY_TOKENS
+        )
+
+    def budgeted_prompt(
+        self,
+        context: list[ChatFileContext],
+        question: str,
+        history: list[ChatHistory],
+    ) -> BudgetedPrompt:
+        budgeted = create_budgeted_prompt(
+            context,
+            question,
+            history,
+            self.prompt_budget,
+            self.counter,
+        )
+        if budgeted.dropped_chunks or budgeted.dropped_history:
+            logger.info(
+                f"Prompt cut to {budgeted.tokens} tokens, dropped"
+                f" {len(budgeted.dropped_chunks)} chunks and"
+                f" {budgeted.dropped_history} exchanges",
+            )
+        return budgeted
 
     def get_prompt(
         self,
         context: list[ChatFileContext],
         question: str,
         history: list[ChatHistory],
-    ) -> str:
-        return f"""
+    ) -> BudgetedPrompt:
+        budgeted = self.budgeted_prompt(context, question, history)
+        prompt = f"""
 System: {SYSTEM_1}
 System: {SYSTEM_2}
-User: {create_prompt(context, question, history)}
+User: {budgeted.prompt}
         """
+        return budgeted.copy(update={"prompt": prompt})
 
     def ask_streaming(
         self,
@@ -77,54 +142,104 @@ User: {create_prompt(context, question, history)}
         question: str,
         history: list[ChatHistory],
     ) -> Generator[Any, Any, None]:
-        prompt = create_prompt(context, question, history)
         response = openai.ChatCompletion.create(
             model=self.model,
-            messages=[
-                {"role": "system", "content": SYSTEM_1},
-                {
-                    "role": "system",
-                    "content": SYSTEM_2,
-                },
-                {"role": "user", "content": prompt},
-            ],
+            messages=messages_for_prompt(
+                self.budgeted_prompt(context, question, history).prompt,
+            ),
             temperature=0,
             stream=True,
         )
         for resp in response:
-            choices = resp["choices"]
-            delta = choices[0].get("delta")
-            if not delta:
-                continue
-            content = delta.get("content")
-            if content:
+            if content := content_from_delta(resp):
                 yield content
 
-    def get_title(self, question: str, answer: str) -> Generator[Any, Any, None]:
-        prompt = f"""
-        Based on the question and answer please respond with a concise, accurate title for the exchange.
-        Do not output anything except the title itself. Try to limit your response to at most five words.
-
-        Question: {question}
-        Answer: {answer}
-        """.format(
-            question=question,
-            answer=answer,
+    async def ask_streaming_async(
+        self,
+        context: list[ChatFileContext],
+        question: str,
+        history: list[ChatHistory],
+    ) -> AsyncGenerator[str, None]:
+        # tiktoken counts every context chunk, which blocks the event loop
+        budgeted = await asyncio.to_thread(
+            self.budgeted_prompt,
+            context,
+            question,
+            history,
         )
+        response = await openai.ChatCompletion.acreate(
+            model=self.model,
+            messages=messages_for_prompt(budgeted.prompt),
+            temperature=0,
+            stream=True,
+        )
+        try:
+            async for resp in response:
+                if content := content_from_delta(resp):
+                    yield content
+        finally:
+            # closes the connection when the client went away mid stream
+            await response.aclose()
+
+    def get_title(self, question: str, answer: str) -> str:
         response = openai.ChatCompletion.create(
             model=self.model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert financial analyst chat bot. The user asked you the following question and you responded with the following answer.",
-                },
-                {"role": "user", "content": prompt},
-            ],
+            messages=messages_for_title(question, answer),
             temperature=0,
         )
+        return content_from_response(response)
 
-        choices = response["choices"]
-        if len(choices) == 0:
-            logger.warning("No choices returned from OpenAI")
-        first_choice = choices[0]
-        return first_choice["message"]["content"]
+    async def get_title_async(self, question: str, answer: str) -> str:
+        response = await openai.ChatCompletion.acreate(
+            model=self.model,
+            messages=messages_for_title(question, answer),
+            temperature=0,
+        )
+        return content_from_response(response)
+
+
+def messages_for_prompt(prompt: str) -> list[dict[str, str]]:
+    return [
+        {"role": "system", "content": SYSTEM_1},
+        {
+            "role": "system",
+            "content": SYSTEM_2,
+        },
+        {"role": "user", "content": prompt},
+    ]
+
+
+def messages_for_title(question: str, answer: str) -> list[dict[str, str]]:
+    prompt = f"""
+        Based on the question and answer please respond with a concise, accurate title for the exchange.
+        Do not output anything except the title itself. Try to limit your response to at most five words.
+
+        Question: {question}
+        Answer: {answer}
+        """.format(
+        question=question,
+        answer=answer,
+    )
+    return [
+        {
+            "role": "system",
+            "content": "You are an expert financial analyst chat bot. The user asked you the following question and you responded with the following answer.",
+        },
+        {"role": "user", "content": prompt},
+    ]
+
+
+def content_from_delta(resp: Any) -> str | None:
+    choices = resp["choices"]
+    delta = choices[0].get("delta")
+    if not delta:
+        return None
+    return delta.get("content")
+
+
+def content_from_response(response: Any) -> str:
+    choices = response["choices"]
+    if len(choices) == 0:
+        logger.warning("No choices returned from OpenAI")
+    first_choice = choices[0]
+    return first_choice["message"]["content"]
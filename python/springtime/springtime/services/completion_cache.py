@@ -0,0 +1,260 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import Any, NamedTuple
+
+from pydantic import BaseModel, NonNegativeInt
+
+
+class CompletionKey(NamedTuple):
+    model: str
+    # chat models pass their json encoded messages
+    prompt: str
+    # None means the provider's default, which is not deterministic
+    temperature: float | None
+    params: dict[str, Any] | None = None
+
+    @property
+    def is_deterministic(self) -> bool:
+        return self.temperature == 0
+
+    def digest(self) -> str:
+        encoded = json.dumps(
+            [self.model, self.prompt, self.temperature, self.params],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def temperature_params(temperature: float | None) -> dict[str, float]:
+    """Request keyword arguments for the temperature, none for the default."""
+    return {} if temperature is None else {"temperature": temperature}
+
+
+def messages_prompt(messages: list[dict[str, str]]) -> str:
+    return json.dumps(messages, sort_keys=True)
+
+
+class CompletionCacheStats(BaseModel):
+    hits: NonNegativeInt
+    disk_hits: NonNegativeInt
+    misses: NonNegativeInt
+    bypassed: NonNegativeInt
+    size: NonNegativeInt
+
+
+class SqliteCompletionStore:
+    def __init__(self, path: str, *, max_entries: int, ttl: float | None) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """
+CREATE TABLE IF NOT EXISTS completion (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+)
+""",
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS completion_accessed_at ON completion(accessed_at)",
+            )
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT value, created_at FROM completion WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl is not None and created_at + self.ttl < now:
+                self._connection.execute("DELETE FROM completion WHERE key = ?", (key,))
+                return None
+            self._connection.execute(
+                "UPDATE completion SET accessed_at = ? WHERE key = ?",
+                (now, key),
+            )
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO completion VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            if self.ttl is not None:
+                self._connection.execute(
+                    "DELETE FROM completion WHERE created_at < ?",
+                    (now - self.ttl,),
+                )
+            self._connection.execute(
+                """
+DELETE FROM completion WHERE key IN (
+    SELECT key FROM completion ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+)
+""",
+                (self.max_entries,),
+            )
+
+
+class CompletionCache:
+    """Caches deterministic completions in memory and optionally on disk.
+
+    Entries are keyed on a hash of the model, prompt, temperature and any
+    other request parameters. Only temperature 0 requests are cached, every
+    other request goes straight to the provider.
+    """
+
+    def __init__(
+        self,
+        *,
+        maxsize: int = 1024,
+        ttl: float | None = None,
+        path: str | None = None,
+        max_disk_entries: int = 100_000,
+    ) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.disk = (
+            SqliteCompletionStore(path, max_entries=max_disk_entries, ttl=ttl)
+            if path
+            else None
+        )
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key: CompletionKey, create: Callable[[], str]) -> str:
+        if not key.is_deterministic:
+            with self._lock:
+                self.bypassed += 1
+            return create()
+
+        digest = key.digest()
+        if (value := self._get(digest)) is not None:
+            return value
+
+        with self._lock:
+            self.misses += 1
+        value = create()
+        self._set(digest, value)
+        return value
+
+    async def aget_or_create(
+        self,
+        key: CompletionKey,
+        create: Callable[[], Awaitable[str]],
+    ) -> str:
+        if not key.is_deterministic:
+            with self._lock:
+                self.bypassed += 1
+            return await create()
+
+        digest = key.digest()
+        if (value := await self._aget(digest)) is not None:
+            return value
+
+        with self._lock:
+            self.misses += 1
+        value = await create()
+        await self._aset(digest, value)
+        return value
+
+    def stats(self) -> CompletionCacheStats:
+        with self._lock:
+            return CompletionCacheStats(
+                hits=self.hits,
+                disk_hits=self.disk_hits,
+                misses=self.misses,
+                bypassed=self.bypassed,
+                size=len(self._memory),
+            )
+
+    def _get(self, digest: str) -> str | None:
+        if (value := self._get_memory(digest)) is not None:
+            return value
+        return self._get_disk(digest)
+
+    async def _aget(self, digest: str) -> str | None:
+        if (value := self._get_memory(digest)) is not None:
+            return value
+        if self.disk is None:
+            return None
+        # sqlite blocks, so the disk tier is read off the event loop
+        return await asyncio.to_thread(self._get_disk, digest)
+
+    def _get_disk(self, digest: str) -> str | None:
+        if self.disk and (value := self.disk.get(digest)) is not None:
+            with self._lock:
+                self.disk_hits += 1
+                self._set_memory(digest, value)
+            return value
+        return None
+
+    def _set(self, digest: str, value: str) -> None:
+        with self._lock:
+            self._set_memory(digest, value)
+        if self.disk:
+            self.disk.set(digest, value)
+
+    async def _aset(self, digest: str, value: str) -> None:
+        with self._lock:
+            self._set_memory(digest, value)
+        if self.disk:
+            await asyncio.to_thread(self.disk.set, digest, value)
+
+    def _get_memory(self, digest: str) -> str | None:
+        with self._lock:
+            entry = self._memory.get(digest)
+            if entry is None:
+                return None
+            created_at, value = entry
+            if self.ttl is not None and created_at + self.ttl < time.monotonic():
+                del self._memory[digest]
+                return None
+            self._memory.move_to_end(digest)
+            self.hits += 1
+            return value
+
+    def _set_memory(self, digest: str, value: str) -> None:
+        self._memory[digest] = (time.monotonic(), value)
+        self._memory.move_to_end(digest)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+
+def cached_completion(
+    cache: CompletionCache | None,
+    key: CompletionKey,
+    create: Callable[[], str],
+) -> str:
+    if cache is None:
+        return create()
+    return cache.get_or_create(key, create)
+
+
+async def acached_completion(
+    cache: CompletionCache | None,
+    key: CompletionKey,
+    create: Callable[[], Awaitable[str]],
+) -> str:
+    if cache is None:
+        return await create()
+    return await cache.aget_or_create(key, create)
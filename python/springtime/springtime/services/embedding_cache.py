@@ -0,0 +1,158 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import Sequence
+
+import numpy as np
+from pydantic import BaseModel, NonNegativeInt
+
+Embedding = list[float]
+
+
+def embedding_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{text}".encode()).hexdigest()
+
+
+class EmbeddingCacheStats(BaseModel):
+    hits: NonNegativeInt
+    disk_hits: NonNegativeInt
+    misses: NonNegativeInt
+    size: NonNegativeInt
+
+
+class SqliteEmbeddingStore:
+    def __init__(self, path: str, *, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                """
+CREATE TABLE IF NOT EXISTS embedding (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    accessed_at INTEGER NOT NULL
+)
+""",
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS embedding_accessed_at ON embedding(accessed_at)",
+            )
+            [self._clock, self._size] = self._connection.execute(
+                "SELECT COALESCE(MAX(accessed_at), 0), COUNT(*) FROM embedding",
+            ).fetchone()
+
+    def get_many(self, keys: Sequence[str]) -> dict[str, Embedding]:
+        acc: dict[str, Embedding] = {}
+        with self._lock, self._connection:
+            # the keys are bound as one json array, whatever their number
+            rows = self._connection.execute(
+                "SELECT key, value FROM embedding WHERE key IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(keys)),),
+            ).fetchall()
+            for key, value in rows:
+                acc[key] = np.frombuffer(value, dtype=np.float64).tolist()
+            if acc:
+                self._clock += 1
+                self._connection.executemany(
+                    "UPDATE embedding SET accessed_at = ? WHERE key = ?",
+                    [(self._clock, key) for key in acc],
+                )
+        return acc
+
+    def set_many(self, values: dict[str, Embedding]) -> None:
+        with self._lock, self._connection:
+            [existing] = self._connection.execute(
+                "SELECT COUNT(*) FROM embedding WHERE key IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(values)),),
+            ).fetchone()
+            self._clock += 1
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embedding VALUES (?, ?, ?)",
+                [
+                    (key, np.asarray(value, dtype=np.float64).tobytes(), self._clock)
+                    for key, value in values.items()
+                ],
+            )
+            self._size += len(values) - existing
+            if self._size > self.max_entries:
+                self._connection.execute(
+                    """
+DELETE FROM embedding WHERE key IN (
+    SELECT key FROM embedding ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+)
+""",
+                    (self.max_entries,),
+                )
+                self._size = self.max_entries
+
+
+class EmbeddingCache:
+    """Caches embeddings by a hash of the model and text.
+
+    Recent embeddings are kept in memory, every embedding is optionally
+    written through to sqlite so repeats survive restarts.
+    """
+
+    def __init__(
+        self,
+        *,
+        maxsize: int = 10_000,
+        path: str | None = None,
+        max_disk_entries: int = 1_000_000,
+    ) -> None:
+        self.maxsize = maxsize
+        self.disk = (
+            SqliteEmbeddingStore(path, max_entries=max_disk_entries) if path else None
+        )
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, Embedding] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Sequence[str]) -> dict[str, Embedding]:
+        acc: dict[str, Embedding] = {}
+        with self._lock:
+            for key in keys:
+                if (value := self._memory.get(key)) is not None:
+                    self._memory.move_to_end(key)
+                    acc[key] = value
+            self.hits += len(acc)
+
+        missing = [key for key in keys if key not in acc]
+        if self.disk and missing:
+            from_disk = self.disk.get_many(missing)
+            with self._lock:
+                self.disk_hits += len(from_disk)
+                for key, value in from_disk.items():
+                    self._set_memory(key, value)
+            acc.update(from_disk)
+
+        with self._lock:
+            self.misses += len(keys) - len(acc)
+        return acc
+
+    def set_many(self, values: dict[str, Embedding]) -> None:
+        with self._lock:
+            for key, value in values.items():
+                self._set_memory(key, value)
+        if self.disk and values:
+            self.disk.set_many(values)
+
+    def stats(self) -> EmbeddingCacheStats:
+        with self._lock:
+            return EmbeddingCacheStats(
+                hits=self.hits,
+                disk_hits=self.disk_hits,
+                misses=self.misses,
+                size=len(self._memory),
+            )
+
+    def _set_memory(self, key: str, value: Embedding) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
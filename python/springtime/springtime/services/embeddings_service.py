@@ -1,9 +1,19 @@
 import abc
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
 
 import openai
 
+from springtime.routers.token_length_service import EncodeBatch, gpt4_encode_batch
+from springtime.services.embedding_cache import Embedding, EmbeddingCache, embedding_key
+from springtime.services.rate_limit import RateLimitBackoff
+
 MODEL = "text-embedding-ada-002"
 
+# the embeddings endpoint accepts at most 2048 inputs per request
+MAX_BATCH_SIZE = 2048
+MAX_BATCH_TOKENS = 100_000
+
 
 class EmbeddingsService(abc.ABC):
     @abc.abstractmethod
@@ -12,6 +22,86 @@ class EmbeddingsService(abc.ABC):
 
 
 class OpenAIEmbeddingsService(EmbeddingsService):
+    """Embeds documents, only sending each distinct uncached text to OpenAI once.
+
+    Misses are split into batches bounded by count and tokens which are sent
+    concurrently, the results are scattered back into input order.
+    """
+
+    def __init__(
+        self,
+        cache: EmbeddingCache | None = None,
+        *,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_batch_tokens: int = MAX_BATCH_TOKENS,
+        max_concurrency: int = 4,
+        count_tokens: EncodeBatch = gpt4_encode_batch,
+        backoff: RateLimitBackoff | None = None,
+    ) -> None:
+        self.cache = cache
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_concurrency = max_concurrency
+        # ada-002 shares the cl100k_base encoding with gpt-4
+        self.count_tokens = count_tokens
+        self.backoff = backoff or RateLimitBackoff()
+
     def embed_documents(self, documents: list[str]) -> list[list[float]]:
-        response = openai.Embedding.create(input=documents, model=MODEL)
-        return [data.embedding for data in response["data"]]
+        keys = [embedding_key(MODEL, document) for document in documents]
+        # first occurrence of every distinct text
+        unique = dict(zip(keys, documents, strict=True))
+
+        embeddings = self.cache.get_many(list(unique)) if self.cache else {}
+        missing = {key: text for key, text in unique.items() if key not in embeddings}
+
+        if missing:
+            batches = list(self.batches(list(missing.items())))
+            with ThreadPoolExecutor(
+                max_workers=max(1, min(self.max_concurrency, len(batches))),
+            ) as executor:
+                results = executor.map(self.embed_batch, batches)
+                created = {
+                    key: embedding
+                    for batch, batch_embeddings in zip(batches, results, strict=True)
+                    for (key, _), embedding in zip(
+                        batch,
+                        batch_embeddings,
+                        strict=True,
+                    )
+                }
+            if self.cache:
+                self.cache.set_many(created)
+            embeddings.update(created)
+
+        return [embeddings[key] for key in keys]
+
+    def batches(
+        self,
+        items: list[tuple[str, str]],
+    ) -> Iterator[list[tuple[str, str]]]:
+        lengths = self.count_tokens([text for _, text in items])
+        batch: list[tuple[str, str]] = []
+        batch_tokens = 0
+        for item, length in zip(items, lengths, strict=True):
+            if batch and (
+                len(batch) >= self.max_batch_size
+                or batch_tokens + length > self.max_batch_tokens
+            ):
+                yield batch
+                batch = []
+                batch_tokens = 0
+            batch.append(item)
+            batch_tokens += length
+        if batch:
+            yield batch
+
+    def embed_batch(self, batch: list[tuple[str, str]]) -> list[Embedding]:
+        response = self.backoff.call(
+            lambda: openai.Embedding.create(
+                input=[text for _, text in batch],
+                model=MODEL,
+            ),
+        )
+        # the api documents the order of data but index is authoritative
+        data = sorted(response["data"], key=lambda datum: datum["index"])
+        return [datum["embedding"] for datum in data]
@@ -3,6 +3,12 @@ import abc
 from anthropic import Anthropic
 from pydantic import BaseModel
 
+from springtime.services.completion_cache import (
+    CompletionCache,
+    CompletionKey,
+    cached_completion,
+    temperature_params,
+)
 from springtime.services.format_sheet import format_sheet
 from springtime.services.html import html_from_text
 from springtime.services.prompts import CLAUDE_PROMPT
@@ -22,8 +28,17 @@ class ExcelAnalyzer(abc.ABC):
 
 
 class ClaudeExcelAnalyzer(ExcelAnalyzer):
-    def __init__(self, anthropic_client: Anthropic) -> None:
+    def __init__(
+        self,
+        anthropic_client: Anthropic,
+        completion_cache: CompletionCache | None = None,
+        *,
+        temperature: float | None = None,
+    ) -> None:
         self.anthropic = anthropic_client
+        self.completion_cache = completion_cache
+        # None is Claude's default, only temperature 0 completions are cached
+        self.temperature = temperature
 
     def analyze(self, *, sheets: list[PreprocessedSheet]) -> ResponseWithPrompt:
         table_content = "\n---\n".join([format_sheet(sheet) for sheet in sheets])
@@ -39,11 +54,21 @@ __END_DATA__
 
 Assistant:
 """
-        content = self.anthropic.completions.create(
-            model="claude-2",
-            max_tokens_to_sample=1_000_000,
-            prompt=prompt,
-        ).completion.strip()
+        content = cached_completion(
+            self.completion_cache,
+            CompletionKey(
+                model="claude-2",
+                prompt=prompt,
+                temperature=self.temperature,
+                params={"max_tokens_to_sample": 1_000_000},
+            ),
+            lambda: self.anthropic.completions.create(
+                model="claude-2",
+                max_tokens_to_sample=1_000_000,
+                prompt=prompt,
+                **temperature_params(self.temperature),
+            ).completion.strip(),
+        )
 
         return ResponseWithPrompt(
             prompt=prompt,
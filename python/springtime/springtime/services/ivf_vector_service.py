@@ -0,0 +1,277 @@
+import itertools
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+from springtime.services.local_vector_service import (
+    DIMENSION,
+    LocalVectorService,
+    normalize,
+)
+from springtime.services.metadata_filter import MetadataFilter
+from springtime.services.vector_service import SimilarityQuery, VectorResult
+
+CENTROIDS_FILE = "centroids.npy"
+
+# rows scored per matrix product when assigning vectors to lists
+ASSIGN_BATCH = 16_384
+
+
+def spherical_kmeans(
+    vectors: np.ndarray,
+    n_clusters: int,
+    *,
+    iterations: int = 10,
+    seed: int = 0,
+) -> np.ndarray:
+    """Clusters normalized vectors by cosine similarity, returns the centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        # reseed empty clusters from random vectors
+        empty = np.flatnonzero(counts == 0)
+        sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+        centroids = normalize(sums)
+    return centroids
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    return np.concatenate(
+        [
+            np.argmax(vectors[offset : offset + ASSIGN_BATCH] @ centroids.T, axis=1)
+            for offset in range(0, len(vectors), ASSIGN_BATCH)
+        ]
+        or [np.zeros(0, dtype=np.intp)],
+    )
+
+
+class IVFVectorService(LocalVectorService):
+    """Approximate search over an inverted file index.
+
+    Vectors are clustered with spherical k-means and each query only scores
+    the vectors in the `n_probe` lists whose centroids are closest to it.
+    Until `train_size` vectors have been upserted every query is exact. New
+    vectors are appended to their nearest list, and the centroids are
+    retrained once the index has grown by `retrain_factor` since they were
+    last trained.
+
+    Training runs in the upsert that made it due, after the upsert releases
+    the lock, so searches and other upserts go on meanwhile. Rows written
+    while it runs are assigned again when the new centroids are swapped in.
+
+    Raising `n_probe` trades latency for recall, it can be set per query on
+    top of the index wide default.
+    """
+
+    def __init__(
+        self,
+        *,
+        dimension: int = DIMENSION,
+        path: str | None = None,
+        n_lists: int | None = None,
+        n_probe: int = 8,
+        train_size: int = 10_000,
+        retrain_factor: float = 4.0,
+        kmeans_iterations: int = 10,
+    ) -> None:
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.train_size = train_size
+        self.retrain_factor = retrain_factor
+        self.kmeans_iterations = kmeans_iterations
+        self.centroids: np.ndarray | None = None
+        self.trained_on = 0
+        self._lists: list[list[int]] = []
+        self._list_arrays: dict[int, np.ndarray] = {}
+        self._assignments = np.zeros(0, dtype=np.intp)
+        # rows below this have been assigned to a list
+        self._assigned = 0
+        # rows upserted while training, None when not training
+        self._written: list[int] | None = None
+        super().__init__(dimension=dimension, path=path)
+
+    def upsert_arrays(
+        self,
+        ids: list[str],
+        vectors: np.ndarray,
+        metadata: list[dict[str, str]],
+    ) -> None:
+        super().upsert_arrays(ids, vectors, metadata)
+        self._maybe_train()
+
+    def search(
+        self,
+        vector: np.ndarray,
+        metadata: MetadataFilter,
+        top_k: int,
+        n_probe: int | None = None,
+    ) -> list[VectorResult]:
+        query = normalize(vector.astype(np.float32, copy=False))
+        with self._lock:
+            if self.centroids is None:
+                return self._rank(
+                    query,
+                    self._filter_rows(metadata, np.arange(self._size)),
+                    top_k,
+                )
+
+            n_probe = min(n_probe or self.n_probe, len(self.centroids))
+            order = np.argsort(-(self.centroids @ query))
+            # a selective filter can leave fewer than top_k candidates in the
+            # probed lists, keep probing further lists until there are enough
+            candidates: list[np.ndarray] = []
+            found = 0
+            probed = 0
+            step = n_probe
+            while probed < len(order):
+                lists = order[probed : probed + step]
+                rows = self._filter_rows(
+                    metadata,
+                    np.concatenate([self._list_rows(list_) for list_ in lists]),
+                )
+                candidates.append(rows)
+                found += len(rows)
+                probed += len(lists)
+                if found >= top_k:
+                    break
+                step = probed
+            return self._rank(query, np.concatenate(candidates), top_k)
+
+    def get_similar_many(
+        self,
+        queries: list[SimilarityQuery],
+    ) -> list[list[VectorResult]]:
+        # every query probes its own lists, there is no shared matrix product
+        return [
+            self.get_similar(query.vector, query.metadata, query.top_k, query.n_probe)
+            for query in queries
+        ]
+
+    def train(self) -> None:
+        """Clusters a sample of the vectors and swaps in the new centroids.
+
+        Only sampling and the swap hold the lock. Does nothing when another
+        thread is already training.
+        """
+        with self._lock:
+            if self._written is not None or self._size == 0:
+                return
+            self._written = []
+            size = self._size
+            matrix = self._matrix
+            n_lists = min(self.n_lists or max(1, int(4 * np.sqrt(size))), size)
+            # k-means on a sample is as good as on everything and far cheaper
+            rng = np.random.default_rng(0)
+            sample = matrix[rng.choice(size, min(size, 64 * n_lists), replace=False)]
+        try:
+            centroids = spherical_kmeans(
+                sample,
+                n_lists,
+                iterations=self.kmeans_iterations,
+            )
+            # an upsert growing the index copies the matrix, the rows read
+            # here are the ones it had
+            assignments = assign(matrix[:size], centroids)
+        except BaseException:
+            with self._lock:
+                self._written = None
+            raise
+        with self._lock:
+            written = np.asarray(self._written, dtype=np.intp)
+            self._written = None
+            self.centroids = centroids
+            self.trained_on = size
+            self._build_lists(assignments)
+            # rows replaced or added since the snapshot
+            self._assign_rows(np.union1d(written, np.arange(size, self._size)))
+            if self.path:
+                self._save_centroids()
+        logger.info(f"Trained {n_lists} lists on {size} vectors")
+
+    def load(self) -> None:
+        super().load()
+        assert self.path
+        centroids_path = Path(self.path, CENTROIDS_FILE)
+        if centroids_path.exists():
+            with self._lock:
+                self.centroids = np.load(centroids_path)
+                self.trained_on = self._size
+                self._build_lists(assign(self._matrix[: self._size], self.centroids))
+        else:
+            self._maybe_train()
+
+    def _save_centroids(self) -> None:
+        assert self.path
+        assert self.centroids is not None
+        directory = Path(self.path)
+        directory.mkdir(parents=True, exist_ok=True)
+        tmp = directory / f"{CENTROIDS_FILE}.tmp"
+        with tmp.open("wb") as f:
+            np.save(f, self.centroids)
+        tmp.replace(directory / CENTROIDS_FILE)
+
+    def _index_rows(self, rows: np.ndarray) -> None:
+        if self._written is not None:
+            self._written.extend(rows.tolist())
+        if self.centroids is not None:
+            self._assign_rows(rows)
+
+    def _assign_rows(self, rows: np.ndarray) -> None:
+        """Moves the rows to the lists of their nearest centroids."""
+        assert self.centroids is not None
+        if len(rows) == 0:
+            return
+        self._reserve_assignments()
+        assignments = assign(self._matrix[rows], self.centroids)
+        for row, list_ in zip(rows, assignments, strict=True):
+            previous = self._assignments[row]
+            if previous == list_ and row < self._assigned:
+                continue
+            if row < self._assigned:
+                self._lists[previous].remove(row)
+                self._list_arrays.pop(previous, None)
+            self._lists[list_].append(row)
+            self._list_arrays.pop(list_, None)
+            self._assignments[row] = list_
+        self._assigned = max(self._assigned, int(rows.max()) + 1)
+
+    def _maybe_train(self) -> None:
+        with self._lock:
+            due = self._size >= self.train_size and (
+                self.centroids is None
+                or self._size >= self.retrain_factor * self.trained_on
+            )
+        if due:
+            self.train()
+
+    def _build_lists(self, assignments: np.ndarray) -> None:
+        """Lists the rows by centroid, from the assignments of the first rows."""
+        assert self.centroids is not None
+        self._assignments = assignments
+        self._assigned = len(assignments)
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.searchsorted(
+            assignments[order],
+            np.arange(len(self.centroids) + 1),
+        )
+        self._lists = [
+            order[start:end].tolist() for start, end in itertools.pairwise(bounds)
+        ]
+        self._list_arrays = {}
+
+    def _reserve_assignments(self) -> None:
+        if len(self._assignments) < self._size:
+            assignments = np.zeros(max(self._size, 2 * len(self._assignments)), np.intp)
+            assignments[: len(self._assignments)] = self._assignments
+            self._assignments = assignments
+
+    def _list_rows(self, list_: int) -> np.ndarray:
+        if (rows := self._list_arrays.get(list_)) is None:
+            rows = np.asarray(self._lists[list_], dtype=np.intp)
+            self._list_arrays[list_] = rows
+        return rows
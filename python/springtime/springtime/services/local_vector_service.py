@@ -0,0 +1,357 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+from loguru import logger
+
+from springtime.services.metadata_filter import (
+    MISSING,
+    MetadataFilter,
+    canonical_filter,
+    filter_mask,
+)
+from springtime.services.vector_service import (
+    TOP_K,
+    SimilarityQuery,
+    UpsertVector,
+    VectorResult,
+    VectorService,
+)
+
+# text-embedding-ada-002
+DIMENSION = 1536
+
+# the rows appended by every upsert, raw float32 vectors and one JSON
+# [id, metadata] record a line, an id's last row replacing its earlier ones
+VECTORS_FILE = "vectors.f32"
+RECORDS_FILE = "records.jsonl"
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Indices of the top_k highest scores, best first."""
+    k = min(top_k, len(scores))
+    if k == 0:
+        return np.zeros(0, dtype=np.intp)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best], kind="stable")]
+
+
+class LocalVectorService(VectorService):
+    """Exact cosine similarity search over an in-process float32 matrix.
+
+    Vectors are normalized on insert so a query is one matrix-vector product
+    over the rows its metadata filter selects. When given a directory every
+    upsert appends its rows to the files there, which are read back on
+    startup and compacted by `save`.
+    """
+
+    def __init__(
+        self,
+        *,
+        dimension: int = DIMENSION,
+        path: str | None = None,
+    ) -> None:
+        self.dimension = dimension
+        self.path = path
+        self._matrix = np.zeros((0, dimension), dtype=np.float32)
+        self._size = 0
+        self._ids: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._metadata: list[dict[str, str]] = []
+        self._columns: dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+        if path and Path(path, RECORDS_FILE).exists():
+            self.load()
+
+    def __len__(self) -> int:
+        """The number of vectors stored."""
+        return self._size
+
+    def upsert(self, vectors: list[UpsertVector]) -> None:
+        self.upsert_arrays(
+            [vector.id for vector in vectors],
+            np.asarray([vector.vector for vector in vectors], dtype=np.float32),
+            [vector.metadata for vector in vectors],
+        )
+
+    def upsert_arrays(
+        self,
+        ids: list[str],
+        vectors: np.ndarray,
+        metadata: list[dict[str, str]],
+    ) -> None:
+        if not ids:
+            return
+        matrix = normalize(vectors.astype(np.float32, copy=False))
+        if matrix.shape[1] != self.dimension:
+            msg = (
+                f"Expected vectors of dimension {self.dimension}, got {matrix.shape[1]}"
+            )
+            raise ValueError(msg)
+
+        with self._lock:
+            self._reserve(self._size + len(ids))
+            rows = np.empty(len(ids), dtype=np.intp)
+            for idx, (vector_id, row_metadata) in enumerate(
+                zip(ids, metadata, strict=True),
+            ):
+                row = self._rows.get(vector_id)
+                if row is None:
+                    row = self._size
+                    self._size += 1
+                    self._rows[vector_id] = row
+                    self._ids.append(vector_id)
+                    self._metadata.append(row_metadata)
+                else:
+                    self._metadata[row] = row_metadata
+                rows[idx] = row
+            self._matrix[rows] = matrix
+            self._update_columns(rows)
+            self._index_rows(rows)
+            if self.path:
+                self._append(ids, matrix, metadata)
+
+    def _index_rows(self, rows: np.ndarray) -> None:
+        """Called with the rows an upsert wrote, for subclasses keeping an index."""
+
+    def get_similar(
+        self,
+        vector: list[float],
+        metadata: MetadataFilter,
+        top_k: int = TOP_K,
+        n_probe: int | None = None,
+    ) -> list[VectorResult]:
+        return self.search(
+            np.asarray(vector, dtype=np.float32),
+            metadata,
+            top_k,
+            n_probe,
+        )
+
+    def get_similar_many(
+        self,
+        queries: list[SimilarityQuery],
+    ) -> list[list[VectorResult]]:
+        """Scores every query sharing a filter with one matrix product."""
+        by_filter: dict[str, list[int]] = {}
+        for idx, query in enumerate(queries):
+            by_filter.setdefault(canonical_filter(query.metadata), []).append(idx)
+
+        acc: list[list[VectorResult]] = [[] for _ in queries]
+        with self._lock:
+            for indices in by_filter.values():
+                metadata = queries[indices[0]].metadata
+                rows = self._matching_rows(metadata)
+                matrix = self._matrix[: self._size]
+                vectors = normalize(
+                    np.asarray([queries[idx].vector for idx in indices], np.float32),
+                )
+                scores = (matrix if rows is None else matrix[rows]) @ vectors.T
+                for column, idx in enumerate(indices):
+                    acc[idx] = self._results(
+                        rows,
+                        scores[:, column],
+                        queries[idx].top_k,
+                    )
+        return acc
+
+    def search(
+        self,
+        vector: np.ndarray,
+        metadata: MetadataFilter,
+        top_k: int,
+        n_probe: int | None = None,  # noqa: ARG002 exact search probes every row
+    ) -> list[VectorResult]:
+        query = normalize(vector.astype(np.float32, copy=False))
+        with self._lock:
+            return self._rank(query, self._matching_rows(metadata), top_k)
+
+    def _matching_rows(self, metadata: MetadataFilter) -> np.ndarray | None:
+        """Rows passing the filter, None when there is no filter."""
+        if not metadata:
+            return None
+        return np.flatnonzero(filter_mask(metadata, self._column, self._size))
+
+    def _rank(
+        self,
+        query: np.ndarray,
+        rows: np.ndarray | None,
+        top_k: int,
+    ) -> list[VectorResult]:
+        """Scores the rows, all of them when None, and returns the best top_k."""
+        matrix = self._matrix[: self._size]
+        scores = matrix @ query if rows is None else matrix[rows] @ query
+        return self._results(rows, scores, top_k)
+
+    def _results(
+        self,
+        rows: np.ndarray | None,
+        scores: np.ndarray,
+        top_k: int,
+    ) -> list[VectorResult]:
+        best = top_k_indices(scores, top_k)
+        return [
+            VectorResult(
+                id=self._ids[row],
+                metadata=self._metadata[row],
+                score=float(scores[idx]),
+            )
+            for idx, row in zip(
+                best,
+                best if rows is None else rows[best],
+                strict=True,
+            )
+        ]
+
+    def _filter_rows(self, metadata: MetadataFilter, rows: np.ndarray) -> np.ndarray:
+        if not metadata:
+            return rows
+        mask = filter_mask(metadata, lambda key: self._column(key)[rows], len(rows))
+        return rows[mask]
+
+    def save(self) -> None:
+        """Rewrites the files with one row an id, dropping replaced rows."""
+        with self._lock:
+            self._save()
+
+    def load(self) -> None:
+        assert self.path
+        with self._lock:
+            ids, metadata = self._read_records()
+            # memory mapped until the first upsert copies it
+            matrix = self._read_vectors(len(ids))
+            rows = {vector_id: row for row, vector_id in enumerate(ids)}
+            if len(rows) < len(ids):
+                # only the last row of an id upserted again is kept
+                live = np.array(sorted(rows.values()), dtype=np.intp)
+                matrix = np.asarray(matrix[live])
+                ids = [ids[row] for row in live]
+                metadata = [metadata[row] for row in live]
+                rows = {vector_id: row for row, vector_id in enumerate(ids)}
+            self._matrix = matrix
+            self._size = len(ids)
+            self._ids = ids
+            self._metadata = metadata
+            self._rows = rows
+            self._columns = {}
+        logger.info(f"Loaded {self._size} vectors from {self.path}")
+
+    def _read_records(self) -> tuple[list[str], list[dict[str, str]]]:
+        """The records with a vector, dropping what an append cut short."""
+        assert self.path
+        records_path = Path(self.path, RECORDS_FILE)
+        vectors_path = Path(self.path, VECTORS_FILE)
+        row_bytes = self.dimension * np.dtype(np.float32).itemsize
+        vector_rows = vectors_path.stat().st_size // row_bytes
+        ids: list[str] = []
+        metadata: list[dict[str, str]] = []
+        end = 0
+        with records_path.open("rb") as f:
+            for line in f:
+                if len(ids) == vector_rows or not line.endswith(b"\n"):
+                    break
+                vector_id, row_metadata = json.loads(line)
+                ids.append(vector_id)
+                metadata.append(row_metadata)
+                end += len(line)
+        # later appends go after the last whole row of both files
+        os.truncate(records_path, end)
+        os.truncate(vectors_path, len(ids) * row_bytes)
+        return ids, metadata
+
+    def _read_vectors(self, count: int) -> np.ndarray:
+        assert self.path
+        if count == 0:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.memmap(
+            Path(self.path, VECTORS_FILE),
+            dtype=np.float32,
+            mode="r",
+            shape=(count, self.dimension),
+        )
+
+    def _append(
+        self,
+        ids: list[str],
+        matrix: np.ndarray,
+        metadata: list[dict[str, str]],
+    ) -> None:
+        assert self.path
+        Path(self.path).mkdir(parents=True, exist_ok=True)
+        # vectors first, a record without its vector is dropped on load
+        with Path(self.path, VECTORS_FILE).open("ab") as f:
+            f.write(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+        with Path(self.path, RECORDS_FILE).open("a") as f:
+            f.writelines(
+                json.dumps([vector_id, row_metadata]) + "\n"
+                for vector_id, row_metadata in zip(ids, metadata, strict=True)
+            )
+
+    def _save(self) -> None:
+        assert self.path
+        directory = Path(self.path)
+        directory.mkdir(parents=True, exist_ok=True)
+        # written next to the index and renamed so a crash never leaves a
+        # partial file behind
+        vectors_tmp = directory / f"{VECTORS_FILE}.tmp"
+        with vectors_tmp.open("wb") as f:
+            f.write(np.ascontiguousarray(self._matrix[: self._size]).tobytes())
+        records_tmp = directory / f"{RECORDS_FILE}.tmp"
+        with records_tmp.open("w") as f:
+            f.writelines(
+                json.dumps([vector_id, row_metadata]) + "\n"
+                for vector_id, row_metadata in zip(
+                    self._ids,
+                    self._metadata,
+                    strict=True,
+                )
+            )
+        vectors_tmp.replace(directory / VECTORS_FILE)
+        records_tmp.replace(directory / RECORDS_FILE)
+
+    def _reserve(self, size: int) -> None:
+        if size <= self._matrix.shape[0] and self._matrix.flags.writeable:
+            return
+        capacity = max(size, 2 * self._matrix.shape[0], 1024)
+        matrix = np.zeros((capacity, self.dimension), dtype=np.float32)
+        matrix[: self._size] = self._matrix[: self._size]
+        self._matrix = matrix
+
+    def _column(self, key: str) -> np.ndarray:
+        if (column := self._columns.get(key)) is None:
+            values: list[Any] = [
+                metadata.get(key, MISSING) for metadata in self._metadata
+            ]
+            if all(isinstance(value, str) for value in values):
+                column = np.array(values, dtype=str)
+            else:
+                column = np.empty(len(values), dtype=object)
+                column[:] = values
+            self._columns[key] = column
+        return column[: self._size]
+
+    def _update_columns(self, rows: np.ndarray) -> None:
+        """Writes the metadata of the rows to the cached columns."""
+        for key, cached in self._columns.items():
+            values = [self._metadata[row].get(key, MISSING) for row in rows]
+            column = cached
+            if column.dtype.kind == "U":
+                if not all(isinstance(value, str) for value in values):
+                    column = column.astype(object)
+                elif (width := max(map(len, values))) > column.itemsize // 4:
+                    column = column.astype(f"<U{width}")
+            if len(column) < self._size:
+                grown = np.empty(max(self._size, 2 * len(column)), dtype=column.dtype)
+                grown[: len(column)] = column
+                column = grown
+            for row, value in zip(rows, values, strict=True):
+                column[row] = value
+            self._columns[key] = column
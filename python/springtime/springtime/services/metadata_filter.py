@@ -0,0 +1,133 @@
+"""Evaluates Pinecone style metadata filters outside of Pinecone.
+
+Supports bare equality (`{"projectId": "p1"}`), the field operators
+$eq, $ne, $in, $nin, $gt, $gte, $lt, $lte and $exists, and the logical
+operators $and and $or. List valued metadata matches when any element does,
+like Pinecone.
+"""
+import json
+import operator
+from collections.abc import Callable, Mapping
+from typing import Any
+
+import numpy as np
+
+
+class Missing:
+    """The value of a key a row's metadata does not have."""
+
+
+MISSING = Missing()
+
+Scalar = str | int | float | bool
+# a metadata value, or the operand of a field operator
+FilterValue = Scalar | list[Scalar]
+# the condition on one field, a bare value to equal or operators to operands
+Condition = FilterValue | dict[str, FilterValue]
+
+MetadataFilter = Mapping[str, Any]
+
+COMPARISONS: dict[str, Callable[[Any, Any], bool]] = {
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+}
+
+# how the values of a field, more than one when it is a list, match an operand
+MEMBERSHIPS: dict[str, Callable[[list[Any], Any], bool]] = {
+    "$eq": lambda values, operand: operand in values,
+    "$ne": lambda values, operand: operand not in values,
+    "$in": lambda values, operand: any(value in operand for value in values),
+    "$nin": lambda values, operand: not any(value in operand for value in values),
+}
+
+
+def field_matches(op: str, value: FilterValue | Missing, operand: FilterValue) -> bool:
+    if op == "$exists":
+        return (value is not MISSING) == bool(operand)
+    if value is MISSING:
+        return op in ("$ne", "$nin")
+
+    if op in MEMBERSHIPS:
+        return MEMBERSHIPS[op](value if isinstance(value, list) else [value], operand)
+    if op in COMPARISONS:
+        try:
+            return COMPARISONS[op](value, operand)
+        except TypeError:
+            return False
+    msg = f"Unsupported metadata filter operator {op}"
+    raise ValueError(msg)
+
+
+def canonical_filter(metadata_filter: MetadataFilter) -> str:
+    """A string equal for filters that select the same rows by the same rules."""
+    return json.dumps(metadata_filter, sort_keys=True, separators=(",", ":"))
+
+
+def field_conditions(condition: Condition) -> list[tuple[str, FilterValue]]:
+    if isinstance(condition, Mapping):
+        return list(condition.items())
+    return [("$eq", condition)]
+
+
+def matches(metadata_filter: MetadataFilter, metadata: Mapping[str, Any]) -> bool:
+    for key, condition in metadata_filter.items():
+        if key == "$and":
+            if not all(matches(clause, metadata) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches(clause, metadata) for clause in condition):
+                return False
+        elif not all(
+            field_matches(op, metadata.get(key, MISSING), operand)
+            for op, operand in field_conditions(condition)
+        ):
+            return False
+    return True
+
+
+def filter_mask(
+    metadata_filter: MetadataFilter,
+    column: Callable[[str], np.ndarray],
+    size: int,
+) -> np.ndarray:
+    """Evaluates the filter against metadata stored column by column.
+
+    `column(key)` returns an array of length `size` holding each row's value
+    for the key, or MISSING, as a string array when every value is a string.
+    """
+    mask = np.ones(size, dtype=bool)
+    for key, condition in metadata_filter.items():
+        if key == "$and":
+            for clause in condition:
+                mask &= filter_mask(clause, column, size)
+        elif key == "$or":
+            any_mask = np.zeros(size, dtype=bool)
+            for clause in condition:
+                any_mask |= filter_mask(clause, column, size)
+            mask &= any_mask
+        else:
+            values = column(key)
+            for op, operand in field_conditions(condition):
+                mask &= field_mask(op, values, operand)
+    return mask
+
+
+def field_mask(op: str, values: np.ndarray, operand: FilterValue) -> np.ndarray:
+    # columns where every row has a string are compared by numpy, anything
+    # else falls back to the general rules
+    if values.dtype.kind == "U":
+        if op == "$eq" and isinstance(operand, str):
+            return values == operand
+        if op == "$in" and all(isinstance(item, str) for item in operand):
+            return np.isin(values, list(operand))
+    if len(values) == 0:
+        return np.zeros(0, dtype=bool)
+    return np.frompyfunc(
+        lambda value: field_matches(op, value, operand),
+        1,
+        1,
+    )(
+        values,
+    ).astype(bool)
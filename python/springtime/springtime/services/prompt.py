@@ -1,4 +1,6 @@
-import re
+from functools import lru_cache
+
+from pydantic import BaseModel
 
 from springtime.models.chat import (
     ChatChunkContext,
@@ -7,6 +9,7 @@ from springtime.models.chat import (
     RangeLocation,
     SingleLocation,
 )
+from springtime.routers.token_length_service import GPT4_COUNTER, TokenCounter
 
 CONTEXT_PROMPT = (
     "Potentially relevant information to the user's question is provided in chunks from files below.\n"
@@ -21,26 +24,272 @@ use end footnote citations containing the file name and page number of the sourc
 )
 
 
+NORMALIZED_CACHE_SIZE = 4096
+
+
 def create_prompt(
     context: list[ChatFileContext],
     question: str,
     history: list[ChatHistory],
+    history_start: int = 0,
 ):
-    history_prompt = create_prompt_for_histories(history)
-    context_prompt = create_prompt_for_context(context)
-
-    non_empty_prompts = [
-        prompt
-        for prompt in [
-            context_prompt,
-            history_prompt,
+    """The context, the transcript and the question, joined by newlines.
+
+    Written in one pass into a single list of parts, the same text as
+    joining the create_prompt_for_* sections.
+    """
+    parts: list[str] = []
+    if context:
+        parts.append(CONTEXT_PROMPT)
+        parts.append("\n---\n")
+        for idx, file in enumerate(context):
+            if idx:
+                parts.append("\n\n")
+            write_file_context(parts, file)
+        parts.append("\n---\n\n")
+
+    if history_start < len(history):
+        parts.append(" ")
+        parts.append(HISTORY_PROMPT)
+        for idx in range(history_start, len(history)):
+            parts.append("\n")
+            parts.append(create_prompt_for_history(history[idx], len(history), idx))
+        parts.append("\n")
+
+    parts.append("Human: ")
+    parts.append(question)
+    parts.append("\nAI:")
+    return "".join(parts)
+
+
+def write_file_context(parts: list[str], context: ChatFileContext) -> None:
+    """Appends create_prompt_for_file_context(context) to parts."""
+    if not context.chunks:
+        parts.append(f"file name: {context.file_name}".strip())
+        return
+    parts.append("file name: ")
+    parts.append(context.file_name)
+    last = len(context.chunks) - 1
+    for idx, chunk in enumerate(context.chunks):
+        if idx:
+            parts.append("\n")
+        parts.append(format_chunk_location(chunk.location))
+        content = normalized_content(chunk.content)
+        if idx < last:
+            parts.append("content: ")
+            parts.append(content)
+            parts.append("\n")
+        else:
+            # the file context is stripped, which only reaches the last chunk
+            parts.append(f"content: {content}" if content else "content:")
+
+
+@lru_cache(maxsize=NORMALIZED_CACHE_SIZE)
+def normalized_content(content: str) -> str:
+    r"""Chunk content with runs of newlines collapsed, cached on the content.
+
+    Splitting on newlines and dropping the empty lines matches
+    re.sub(r"\\n+", "\\n", content).strip() at a third of the cost.
+    """
+    return "\n".join(filter(None, content.split("\n"))).strip()
+
+
+class DroppedChunk(BaseModel):
+    file_name: str
+    order: int
+    tokens: int
+
+
+class BudgetedPrompt(BaseModel):
+    prompt: str
+    tokens: int
+    dropped_chunks: list[DroppedChunk]
+    # the oldest exchanges of the history left out of the prompt
+    dropped_history: int
+
+
+# allowance for the newlines joining two counted parts
+SEPARATOR_TOKENS = 1
+
+
+def create_budgeted_prompt(
+    context: list[ChatFileContext],
+    question: str,
+    history: list[ChatHistory],
+    max_tokens: int,
+    counter: TokenCounter = GPT4_COUNTER,
+) -> BudgetedPrompt:
+    """The prompt of create_prompt cut down to at most max_tokens.
+
+    The question and the last WINDOW_LIMIT exchanges always go in. Chunks
+    are then packed most relevant first, lowest order, skipping any that no
+    longer fit, and the budget left goes to the older exchanges, whose
+    answers are already elided, newest first. Parts are counted one by one
+    with the cached counter, then the assembled prompt is counted and the
+    least relevant chunks dropped until it fits, then the oldest exchanges.
+    When nothing is dropped the prompt is identical to create_prompt's.
+
+    Raises ValueError when even the question alone does not fit.
+    """
+    chunks = [
+        (file_idx, chunk)
+        for file_idx, file in enumerate(context)
+        for chunk in file.chunks
+    ]
+    counts = counter.count_many(
+        [
             f"Human: {question}",
-            "AI:",
-        ]
-        if len(prompt.strip()) > 0
+            CONTEXT_PROMPT,
+            HISTORY_PROMPT,
+            *(
+                create_prompt_for_history(entry, len(history), idx)
+                for idx, entry in enumerate(history)
+            ),
+            *(f"file name: {file.file_name}" for file in context),
+            *(create_prompt_for_file_chunk(chunk) for _, chunk in chunks),
+        ],
+    )
+    question_tokens, context_tokens, history_tokens, *rest = counts
+    entry_tokens = rest[: len(history)]
+    header_tokens = rest[len(history) : len(history) + len(context)]
+    chunk_tokens = rest[len(history) + len(context) :]
+
+    # "AI:" is a token of its own
+    remaining = max_tokens - cost(question_tokens) - cost(1)
+    if remaining < 0:
+        raise question_too_long(max_tokens)
+
+    window_start = max(0, len(history) - WINDOW_LIMIT)
+    window_costs = [
+        cost(entry_tokens[idx]) for idx in reversed(range(window_start, len(history)))
     ]
+    if window_costs:
+        window_costs[0] += cost(history_tokens)
+    taken, remaining = fit_history(window_costs, remaining)
+    first_history = len(history) - taken
+
+    packed: list[int] = []
+    if first_history == window_start:
+        packed, remaining = pack_chunks(
+            chunks,
+            [cost(tokens) for tokens in chunk_tokens],
+            [cost(tokens) for tokens in header_tokens],
+            cost(context_tokens),
+            remaining,
+        )
+        taken, remaining = fit_history(
+            [cost(entry_tokens[idx]) for idx in reversed(range(window_start))],
+            remaining,
+        )
+        first_history -= taken
+
+    while True:
+        included = set(packed)
+        prompt = create_prompt(
+            packed_context(context, included),
+            question,
+            history,
+            first_history,
+        )
+        tokens = counter.count(prompt)
+        if tokens <= max_tokens:
+            break
+        # the parts counted one by one can come short of the whole
+        if packed:
+            packed.pop()
+        elif first_history < len(history):
+            first_history += 1
+        else:
+            raise question_too_long(max_tokens)
+
+    return BudgetedPrompt(
+        prompt=prompt,
+        tokens=tokens,
+        dropped_chunks=[
+            DroppedChunk(
+                file_name=context[file_idx].file_name,
+                order=chunk.order,
+                tokens=chunk_tokens[idx],
+            )
+            for idx, (file_idx, chunk) in enumerate(chunks)
+            if idx not in included
+        ],
+        dropped_history=first_history,
+    )
+
+
+def cost(tokens: int) -> int:
+    """The tokens of a part and of the newline joining it to the next."""
+    return tokens + SEPARATOR_TOKENS
+
 
-    return "\n".join(non_empty_prompts)
+def question_too_long(max_tokens: int) -> ValueError:
+    return ValueError(f"The question alone is longer than {max_tokens} tokens")
+
+
+def fit_history(costs: list[int], remaining: int) -> tuple[int, int]:
+    """How many exchanges fit and the budget they leave.
+
+    costs are of the newest exchange first, which are taken while they fit.
+    """
+    taken = 0
+    for needed in costs:
+        if needed > remaining:
+            break
+        remaining -= needed
+        taken += 1
+    return taken, remaining
+
+
+def pack_chunks(
+    chunks: list[tuple[int, ChatChunkContext]],
+    costs: list[int],
+    header_costs: list[int],
+    context_cost: int,
+    remaining: int,
+) -> tuple[list[int], int]:
+    """The chunks that fit, lowest order first, and the budget they leave.
+
+    chunks are of the file at their index in the context. A chunk also pays
+    for the header of its file when it is the first of it, and the first
+    chunk for the context prompt.
+    """
+    packed: list[int] = []
+    packed_files: set[int] = set()
+    for idx in sorted(range(len(chunks)), key=lambda idx: chunks[idx][1].order):
+        file_idx = chunks[idx][0]
+        needed = costs[idx]
+        if file_idx not in packed_files:
+            needed += header_costs[file_idx]
+        if not packed:
+            needed += context_cost
+        if needed > remaining:
+            continue
+        remaining -= needed
+        packed.append(idx)
+        packed_files.add(file_idx)
+    return packed, remaining
+
+
+def packed_context(
+    context: list[ChatFileContext],
+    included: set[int],
+) -> list[ChatFileContext]:
+    """The files with only the included chunks, numbered across all files."""
+    acc = []
+    offset = 0
+    for file in context:
+        chunks = [
+            chunk
+            for idx, chunk in enumerate(file.chunks, start=offset)
+            if idx in included
+        ]
+        if chunks or not file.chunks:
+            acc.append(
+                ChatFileContext.construct(file_name=file.file_name, chunks=chunks),
+            )
+        offset += len(file.chunks)
+    return acc
 
 
 def create_prompt_for_context(context: list[ChatFileContext]):
@@ -65,7 +314,7 @@ file name: {context.file_name}{for_chunks}
 
 
 def create_prompt_for_file_chunk(chunk: ChatChunkContext):
-    stripped = re.sub(r"\n+", "\n", chunk.content).strip()
+    stripped = normalized_content(chunk.content)
     # TODO  order: {chunk.order}
     return f"""{format_chunk_location(chunk.location)}content: {stripped}
 """
@@ -81,17 +330,21 @@ def format_chunk_location(location: SingleLocation | RangeLocation | None):
             return ""
 
 
-def create_prompt_for_histories(history: list[ChatHistory]):
-    if not history:
+HISTORY_PROMPT = "This is transcript of your conversation with the user so far. Please respond to the remaining question:\n"
+
+
+def create_prompt_for_histories(history: list[ChatHistory], start: int = 0):
+    """The transcript of the history, leaving out the exchanges before start."""
+    if start >= len(history):
         return ""
 
     total_len = len(history)
     prompt = "\n".join(
         [
-            "This is transcript of your conversation with the user so far. Please respond to the remaining question:\n",
+            HISTORY_PROMPT,
             *[
-                create_prompt_for_history(h, total_len, idx)
-                for idx, h in enumerate(history)
+                create_prompt_for_history(history[idx], total_len, idx)
+                for idx in range(start, total_len)
             ],
         ],
     )
@@ -1,11 +1,20 @@
 import abc
+import asyncio
 import time
 
 import anthropic
 import pydantic
-from anthropic import Anthropic
+from anthropic import Anthropic, AsyncAnthropic
 from loguru import logger
 
+from springtime.routers.token_length_service import TokenLength
+from springtime.services.completion_cache import (
+    CompletionCache,
+    CompletionKey,
+    acached_completion,
+    cached_completion,
+    temperature_params,
+)
 from springtime.services.html import html_from_text
 
 
@@ -30,30 +39,36 @@ class PromptService(abc.ABC):
     ) -> PromptResponse:
         pass
 
+    @abc.abstractmethod
+    async def run_async(
+        self,
+        req: PromptRequest,
+    ) -> PromptResponse:
+        pass
+
 
 class PromptServiceImpl(
     PromptService,
 ):
-    def __init__(self, anthropic: Anthropic) -> None:
+    def __init__(
+        self,
+        anthropic: Anthropic,
+        completion_cache: CompletionCache | None = None,
+        async_anthropic: AsyncAnthropic | None = None,
+        *,
+        temperature: float | None = None,
+    ) -> None:
         self.anthropic = anthropic
+        self.completion_cache = completion_cache
+        self.async_anthropic = async_anthropic or AsyncAnthropic()
+        # None is Claude's default, only temperature 0 completions are cached
+        self.temperature = temperature
 
     def run(
         self,
         req: PromptRequest,
     ) -> PromptResponse:
-        prompt = """
-Human: {template}
-
-
-
-Assistant:
-""".format(
-            template=req.template,
-        )
-
-        prompt = prompt.format(**req.args)
-
-        input_tokens = self.anthropic.count_tokens(prompt)
+        prompt = prompt_for_request(req)
 
         def get_response() -> str:
             for attempt in range(9):
@@ -62,6 +77,7 @@ Assistant:
                         model="claude-2",
                         max_tokens_to_sample=1_000_000,
                         prompt=prompt,
+                        **temperature_params(self.temperature),
                     ).completion.strip()
                 except anthropic.RateLimitError:
                     seconds = 2 ** (attempt + 2)
@@ -71,15 +87,77 @@ Assistant:
             msg = "Rate limit exceeded"
             raise Exception(msg)
 
-        response = get_response()
+        response = cached_completion(
+            self.completion_cache,
+            completion_key(prompt, self.temperature),
+            get_response,
+        )
+        return response_for_prompt(prompt, response)
+
+    async def run_async(
+        self,
+        req: PromptRequest,
+    ) -> PromptResponse:
+        prompt = prompt_for_request(req)
+
+        async def get_response() -> str:
+            for attempt in range(9):
+                try:
+                    completion = await self.async_anthropic.completions.create(
+                        model="claude-2",
+                        max_tokens_to_sample=1_000_000,
+                        prompt=prompt,
+                        **temperature_params(self.temperature),
+                    )
+                    return completion.completion.strip()
+                except anthropic.RateLimitError:
+                    seconds = 2 ** (attempt + 2)
+                    logger.info(f"Rate limit exceeded sleeping {seconds}")
 
-        output_tokens = self.anthropic.count_tokens(response)
-        html = html_from_text(response)
+                    await asyncio.sleep(seconds)
+            msg = "Rate limit exceeded"
+            raise Exception(msg)
 
-        return PromptResponse(
-            raw=response,
-            html=html,
-            input_tokens=input_tokens,
-            output_tokens=output_tokens,
-            prompt=prompt,
+        response = await acached_completion(
+            self.completion_cache,
+            completion_key(prompt, self.temperature),
+            get_response,
         )
+        # tokenizes the prompt and response, off the event loop
+        return await asyncio.to_thread(response_for_prompt, prompt, response)
+
+
+def prompt_for_request(req: PromptRequest) -> str:
+    prompt = """
+Human: {template}
+
+
+
+Assistant:
+""".format(
+        template=req.template,
+    )
+
+    return prompt.format(**req.args)
+
+
+def completion_key(prompt: str, temperature: float | None) -> CompletionKey:
+    return CompletionKey(
+        model="claude-2",
+        prompt=prompt,
+        temperature=temperature,
+        params={"max_tokens_to_sample": 1_000_000},
+    )
+
+
+def response_for_prompt(prompt: str, response: str) -> PromptResponse:
+    input_tokens, output_tokens = TokenLength.claude100k_many([prompt, response])
+    html = html_from_text(response)
+
+    return PromptResponse(
+        raw=response,
+        html=html,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        prompt=prompt,
+    )
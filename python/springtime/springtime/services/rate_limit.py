@@ -0,0 +1,89 @@
+import asyncio
+import random
+import threading
+import time
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+import openai
+from loguru import logger
+
+T = TypeVar("T")
+
+
+class RateLimitExceededError(Exception):
+    """Every attempt of a call was rate limited."""
+
+    def __init__(self, attempts: int) -> None:
+        super().__init__(f"Rate limit exceeded after {attempts} attempts")
+        self.attempts = attempts
+
+
+class RateLimitBackoff:
+    """Exponential backoff shared by every request made through it.
+
+    When one request is rate limited every other request waits out the same
+    pause instead of each hammering the provider on its own schedule.
+    """
+
+    def __init__(
+        self,
+        *,
+        attempts: int = 6,
+        initial: float = 2.0,
+        maximum: float = 60.0,
+    ) -> None:
+        self.attempts = attempts
+        self.initial = initial
+        self.maximum = maximum
+        self.consecutive_failures = 0
+        self.resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        with self._lock:
+            return max(0.0, self.resume_at - time.monotonic())
+
+    def record_rate_limit(self) -> float:
+        with self._lock:
+            self.consecutive_failures += 1
+            seconds = min(
+                self.maximum,
+                self.initial * 2 ** (self.consecutive_failures - 1),
+            )
+            # jitter so waiting requests do not all retry at the same instant
+            seconds *= random.uniform(0.8, 1.2)  # noqa: S311 timing, not security
+            self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+            return self.resume_at - time.monotonic()
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.consecutive_failures = 0
+
+    def call(self, fn: Callable[[], T]) -> T:
+        for _attempt in range(self.attempts):
+            time.sleep(self.delay())
+            try:
+                result = fn()
+            except openai.error.RateLimitError as e:
+                seconds = self.record_rate_limit()
+                logger.warning(e)
+                logger.warning(f"Rate limited, backing off {seconds:.1f}s")
+                continue
+            self.record_success()
+            return result
+        raise RateLimitExceededError(self.attempts)
+
+    async def call_async(self, fn: Callable[[], Awaitable[T]]) -> T:
+        for _attempt in range(self.attempts):
+            await asyncio.sleep(self.delay())
+            try:
+                result = await fn()
+            except openai.error.RateLimitError as e:
+                seconds = self.record_rate_limit()
+                logger.warning(e)
+                logger.warning(f"Rate limited, backing off {seconds:.1f}s")
+                continue
+            self.record_success()
+            return result
+        raise RateLimitExceededError(self.attempts)
@@ -1,11 +1,23 @@
 import abc
-import time
+import asyncio
+from collections import deque
+from collections.abc import Iterable
+from collections.abc import Set as AbstractSet
+from concurrent.futures import Future, ThreadPoolExecutor
 
 import openai
 from loguru import logger
 from pydantic import BaseModel
 
 from springtime.models.open_ai import OpenAIModel
+from springtime.services.completion_cache import (
+    CompletionCache,
+    CompletionKey,
+    acached_completion,
+    cached_completion,
+    messages_prompt,
+)
+from springtime.services.rate_limit import RateLimitBackoff
 from springtime.services.scan_service import get_chunks
 
 
@@ -33,6 +45,14 @@ class ReportService(abc.ABC):
     def generate_terms(self, text: str) -> list[PageOfTerms]:
         pass
 
+    @abc.abstractmethod
+    async def generate_questions_async(self, text: str) -> list[PageOfQuestions]:
+        pass
+
+    @abc.abstractmethod
+    async def generate_terms_async(self, text: str) -> list[PageOfTerms]:
+        pass
+
 
 MODEL = OpenAIModel.gpt3_16k
 
@@ -50,83 +70,248 @@ ALL_TERMS = frozenset(
 
 
 class OpenAIReportService(ReportService):
+    def __init__(
+        self,
+        completion_cache: CompletionCache | None = None,
+        *,
+        max_concurrency: int = 4,
+        terms_window: int = 1,
+        backoff: RateLimitBackoff | None = None,
+    ) -> None:
+        self.completion_cache = completion_cache
+        self.max_concurrency = max_concurrency
+        # 1 scans chunks one at a time and stops as soon as every term is
+        # found, larger windows trade extra calls for lower latency
+        self.terms_window = terms_window
+        self.backoff = backoff or RateLimitBackoff()
+
     def generate_questions(self, text: str) -> list[PageOfQuestions]:
-        acc: list[PageOfQuestions] = []
-        for idx, chunk in enumerate(get_chunks(text, 30_000)):
-            if questions := self.generate_questions_for_text(chunk):
-                acc.append(PageOfQuestions(order=idx, value=questions))
-        return acc
+        chunks = list(get_chunks(text, 30_000))
+        if self.max_concurrency <= 1 or len(chunks) <= 1:
+            pages = map(self.generate_questions_for_text, chunks)
+        else:
+            with ThreadPoolExecutor(
+                max_workers=min(self.max_concurrency, len(chunks)),
+            ) as executor:
+                # map yields in submission order, keeping pages in document order
+                pages = list(executor.map(self.generate_questions_for_text, chunks))
+        return pages_of_questions(pages)
+
+    async def generate_questions_async(self, text: str) -> list[PageOfQuestions]:
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrency))
+
+        async def generate(chunk: str) -> list[str]:
+            async with semaphore:
+                return await self.generate_questions_for_text_async(chunk)
+
+        pages = await asyncio.gather(
+            *(generate(chunk) for chunk in get_chunks(text, 30_000)),
+        )
+        return pages_of_questions(pages)
 
     def generate_terms(self, text: str) -> list[PageOfTerms]:
         acc: list[PageOfTerms] = []
         terms_needed = set(ALL_TERMS)
+        chunks = enumerate(get_chunks(text, 30_000))
 
-        for idx, chunk in enumerate(get_chunks(text, 30_000)):
-            if terms := self.generate_terms_for_text(terms_needed, chunk):
-                for term in terms:
-                    terms_needed.remove(term.term_name)
-                acc.append(PageOfTerms(order=idx, value=terms))
+        # chunks after the current one are requested speculatively with the
+        # terms still needed when they are submitted
+        window_size = max(1, self.terms_window)
+        executor = ThreadPoolExecutor(max_workers=window_size)
+        window: deque[tuple[int, Future[list[Term]]]] = deque()
+        try:
+            while True:
+                while len(window) < window_size and (item := next(chunks, None)):
+                    idx, chunk = item
+                    future = executor.submit(
+                        self.generate_terms_for_text,
+                        frozenset(terms_needed),
+                        chunk,
+                    )
+                    window.append((idx, future))
+                if not window:
+                    return acc
+
+                idx, future = window.popleft()
+                if terms := merge_terms(terms_needed, future.result()):
+                    acc.append(PageOfTerms(order=idx, value=terms))
+                if not terms_needed:
+                    return acc
+        finally:
+            # calls already in flight finish in the background and are ignored
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def generate_terms_async(self, text: str) -> list[PageOfTerms]:
+        acc: list[PageOfTerms] = []
+        terms_needed = set(ALL_TERMS)
+        chunks = enumerate(get_chunks(text, 30_000))
 
-            if not terms_needed:
-                return acc
-        return acc
+        window_size = max(1, self.terms_window)
+        window: deque[tuple[int, asyncio.Task[list[Term]]]] = deque()
+        try:
+            while True:
+                while len(window) < window_size and (item := next(chunks, None)):
+                    idx, chunk = item
+                    task = asyncio.create_task(
+                        self.generate_terms_for_text_async(
+                            frozenset(terms_needed),
+                            chunk,
+                        ),
+                    )
+                    window.append((idx, task))
+                if not window:
+                    return acc
+
+                idx, task = window.popleft()
+                if terms := merge_terms(terms_needed, await task):
+                    acc.append(PageOfTerms(order=idx, value=terms))
+                if not terms_needed:
+                    return acc
+        finally:
+            for _, task in window:
+                task.cancel()
 
     def generate_questions_for_text(self, text: str) -> list[str]:
-        for _attempt in range(3):
-            try:
-                return self._generate_questions_for_text(text)
-            except openai.error.RateLimitError as e:
-                logger.error(e)
-                logger.error("OpenAI response for questions failed")
-                logger.error("Sleeping for 10 seconds")
-                time.sleep(10)
-        msg = "OpenAI response for questions failed"
-        raise Exception(msg)
-
-    def _generate_questions_for_text(self, text: str) -> list[str]:
-        completion = openai.ChatCompletion.create(
-            model=MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert financial analyst AI assistant.",
-                },
-                {
-                    "role": "user",
-                    "content": "You will be given a document. Read the document and generate the top 5 most relevant/interesting questions you would want to ask about the data to better understand it for evaluating a potential investment.",
-                },
-                {
-                    "role": "user",
-                    "content": """
+        value = self.backoff.call(
+            lambda: self._complete(messages_for_questions(text), temperature=0.5),
+        )
+        return parse_questions(value)
+
+    async def generate_questions_for_text_async(self, text: str) -> list[str]:
+        value = await self.backoff.call_async(
+            lambda: self._complete_async(
+                messages_for_questions(text),
+                temperature=0.5,
+            ),
+        )
+        return parse_questions(value)
+
+    def generate_terms_for_text(
+        self,
+        terms_needed: AbstractSet[str],
+        text: str,
+    ) -> list[Term]:
+        response = self.backoff.call(
+            lambda: self._complete(
+                messages_for_terms(terms_needed, text),
+                temperature=0,
+            ),
+        )
+        return parse_terms(response)
+
+    async def generate_terms_for_text_async(
+        self,
+        terms_needed: AbstractSet[str],
+        text: str,
+    ) -> list[Term]:
+        response = await self.backoff.call_async(
+            lambda: self._complete_async(
+                messages_for_terms(terms_needed, text),
+                temperature=0,
+            ),
+        )
+        return parse_terms(response)
+
+    def _complete(self, messages: list[dict[str, str]], temperature: float) -> str:
+        return cached_completion(
+            self.completion_cache,
+            completion_key(messages, temperature),
+            lambda: openai.ChatCompletion.create(
+                model=MODEL,
+                messages=messages,
+                temperature=temperature,
+            )
+            .choices[0]
+            .message.content,
+        )
+
+    async def _complete_async(
+        self,
+        messages: list[dict[str, str]],
+        temperature: float,
+    ) -> str:
+        async def create() -> str:
+            completion = await openai.ChatCompletion.acreate(
+                model=MODEL,
+                messages=messages,
+                temperature=temperature,
+            )
+            return completion.choices[0].message.content
+
+        return await acached_completion(
+            self.completion_cache,
+            completion_key(messages, temperature),
+            create,
+        )
+
+
+def pages_of_questions(pages: Iterable[list[str]]) -> list[PageOfQuestions]:
+    return [
+        PageOfQuestions(order=idx, value=questions)
+        for idx, questions in enumerate(pages)
+        if questions
+    ]
+
+
+def merge_terms(terms_needed: set[str], terms: list[Term]) -> list[Term]:
+    """Keeps the terms that are still needed and marks them as found.
+
+    Earlier chunks are merged first, so the first chunk to find a term wins.
+    """
+    acc: list[Term] = []
+    for term in terms:
+        if term.term_name in terms_needed:
+            terms_needed.remove(term.term_name)
+            acc.append(term)
+    return acc
+
+
+def completion_key(
+    messages: list[dict[str, str]],
+    temperature: float,
+) -> CompletionKey:
+    return CompletionKey(
+        model=MODEL,
+        prompt=messages_prompt(messages),
+        temperature=temperature,
+    )
+
+
+def messages_for_questions(text: str) -> list[dict[str, str]]:
+    return [
+        {
+            "role": "system",
+            "content": "You are an expert financial analyst AI assistant.",
+        },
+        {
+            "role": "user",
+            "content": "You will be given a document. Read the document and generate the top 5 most relevant/interesting questions you would want to ask about the data to better understand it for evaluating a potential investment.",
+        },
+        {
+            "role": "user",
+            "content": """
 * Speak in the third person, e.g. do not use "you"
 * Prefer proper, specific nouns to refer to entities
 * Output each question on a new line. Do not output any other text.
 * Use '*' for each question
 """,
-                },
-                {"role": "user", "content": f"Document: {text}"},
-            ],
-            temperature=0.5,
-        )
-        value = completion.choices[0].message.content
-        return [question.lstrip("*-").strip() for question in value.split("\n")]
-
-    def generate_terms_for_text(self, terms_needed: set[str], text: str) -> list[Term]:
-        for _attempt in range(3):
-            try:
-                return self._generate_terms(terms_needed, text)
-            except openai.error.RateLimitError as e:
-                logger.error(e)
-                logger.error("OpenAI response for questions failed")
-                logger.error("Sleeping for 10 seconds")
-                time.sleep(10)
-        msg = "OpenAI response for terms failed"
-        raise Exception(msg)
-
-    def _generate_terms(self, terms_needed: set[str], text: str) -> list[Term]:
-        terms_list = "\n".join(terms_needed)
-
-        terms = f"""
+        },
+        {"role": "user", "content": f"Document: {text}"},
+    ]
+
+
+def parse_questions(value: str) -> list[str]:
+    return [question.lstrip("*-").strip() for question in value.split("\n")]
+
+
+def messages_for_terms(
+    terms_needed: AbstractSet[str],
+    text: str,
+) -> list[dict[str, str]]:
+    # sorted so the prompt, and its cache key, do not depend on set order
+    terms_list = "\n".join(sorted(terms_needed))
+
+    terms = f"""
 Search the document for the following terms and output their value:
 
 {terms_list}
@@ -141,28 +326,24 @@ For Lead Arranger output:
 Lead Arranger | Goldman Sachs
         """
 
-        completion = openai.ChatCompletion.create(
-            model=MODEL,
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert financial analyst AI assistant.",
-                },
-                {"role": "system", "content": terms},
-                {"role": "user", "content": f"Document: {text}"},
-            ],
-            temperature=0,
-        )
-        response = completion.choices[0].message.content
-        try:
-            by_new_line = response.split("\n")
-            terms = [term for line in by_new_line if (term := parse_term(line))]
-            return terms
-
-        except Exception as e:
-            logger.error(e)
-            logger.error("Invalid terms parsed")
-            return []
+    return [
+        {
+            "role": "system",
+            "content": "You are an expert financial analyst AI assistant.",
+        },
+        {"role": "system", "content": terms},
+        {"role": "user", "content": f"Document: {text}"},
+    ]
+
+
+def parse_terms(response: str) -> list[Term]:
+    try:
+        by_new_line = response.split("\n")
+        return [term for line in by_new_line if (term := parse_term(line))]
+    except Exception as e:
+        logger.error(e)
+        logger.error("Invalid terms parsed")
+        return []
 
 
 IGNORE = {
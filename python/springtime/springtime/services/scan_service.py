@@ -1,12 +1,20 @@
 import abc
 import re
 from enum import Enum
+from typing import Any
 
 import openai
 from loguru import logger
 from pydantic import BaseModel
 
 from springtime.models.open_ai import OpenAIModel
+from springtime.services.completion_cache import (
+    CompletionCache,
+    CompletionKey,
+    acached_completion,
+    cached_completion,
+    messages_prompt,
+)
 
 
 class TrafficlightAnswer(str, Enum):
@@ -32,6 +40,15 @@ class ScanService(abc.ABC):
     ) -> ScanResult:
         pass
 
+    @abc.abstractmethod
+    async def scan_async(
+        self,
+        *,
+        file_name: str,
+        text: str,
+    ) -> ScanResult:
+        pass
+
 
 LIMIT = 7000
 
@@ -57,8 +74,13 @@ Is confidential information memorandum: <green/yellow/red>
 
 
 class OpenAIScanService(ScanService):
-    def __init__(self, model: OpenAIModel) -> None:
+    def __init__(
+        self,
+        model: OpenAIModel,
+        completion_cache: CompletionCache | None = None,
+    ) -> None:
         self.model = model
+        self.completion_cache = completion_cache
 
     def scan(
         self,
@@ -66,32 +88,78 @@ class OpenAIScanService(ScanService):
         file_name: str,
         text: str,
     ) -> ScanResult:
-        processed_text = first_chunk(text, LIMIT)
-        with_out_white_space = remove_extra_whitespace(processed_text)
+        messages = messages_for_scan(file_name, text)
+
+        def get_response() -> str:
+            response = openai.ChatCompletion.create(
+                model=self.model,
+                messages=messages,
+                temperature=0,
+            )
+            return content_from_response(response)
+
+        description = cached_completion(
+            self.completion_cache,
+            self.completion_key(messages),
+            get_response,
+        )
+        return parse_response(description)
+
+    async def scan_async(
+        self,
+        *,
+        file_name: str,
+        text: str,
+    ) -> ScanResult:
+        messages = messages_for_scan(file_name, text)
+
+        async def get_response() -> str:
+            response = await openai.ChatCompletion.acreate(
+                model=self.model,
+                messages=messages,
+                temperature=0,
+            )
+            return content_from_response(response)
+
+        description = await acached_completion(
+            self.completion_cache,
+            self.completion_key(messages),
+            get_response,
+        )
+        return parse_response(description)
 
-        response = openai.ChatCompletion.create(
+    def completion_key(self, messages: list[dict[str, str]]) -> CompletionKey:
+        return CompletionKey(
             model=self.model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": PROMPT,
-                },
-                {
-                    "role": "user",
-                    "content": f"""
+            prompt=messages_prompt(messages),
+            temperature=0,
+        )
+
+
+def messages_for_scan(file_name: str, text: str) -> list[dict[str, str]]:
+    processed_text = first_chunk(text, LIMIT)
+    with_out_white_space = remove_extra_whitespace(processed_text)
+    return [
+        {
+            "role": "system",
+            "content": PROMPT,
+        },
+        {
+            "role": "user",
+            "content": f"""
 file name: {file_name}
 file excerpt: {with_out_white_space}
                  """,
-                },
-            ],
-            temperature=0,
-        )
-        choices = response["choices"]
-        if len(choices) == 0:
-            logger.warning("No choices returned from OpenAI")
-        first_choice = choices[0]
-        description = first_choice["message"]["content"]
-        return parse_response(description)
+        },
+    ]
+
+
+def content_from_response(response: Any) -> str:
+    choices = response["choices"]
+    if len(choices) == 0:
+        logger.warning("No choices returned from OpenAI")
+    first_choice = choices[0]
+    return first_choice["message"]["content"]
 
 
 def parse_response(response: str) -> ScanResult:
@@ -1,11 +1,21 @@
 import abc
+import bisect
+import contextlib
+import functools
+import io
+import itertools
+import os
 from collections.abc import Callable
+from concurrent.futures import Executor
 from typing import NamedTuple
 
 import pandas as pd
 from loguru import logger
 
+from springtime.excel.tables_archive import Workbook, open_workbook
+from springtime.excel.xlsx_workbook import Row, XlsxWorkbook, as_frame
 from springtime.routers.token_length_service import TokenLength
+from springtime.utils.process_pool import process_pool
 
 
 class StringifiedSheet(NamedTuple):
@@ -14,11 +24,27 @@ class StringifiedSheet(NamedTuple):
     was_truncated: bool
 
 
+class SheetStats(NamedTuple):
+    # of the parsed sheet, for a lazily read sheet only the rows read
+    rows: int
+    columns: int
+
+
 class PreprocessedSheet(NamedTuple):
+    """A sheet as analyzed, without the DataFrame it was parsed to.
+
+    Only the stringified sheet is kept so the sheets of a request hold no
+    more than the text sent to the model.
+    """
+
     sheet_name: str
     index: int
-    parsed_sheet: dict[str, pd.DataFrame]
     stringified_sheet: StringifiedSheet
+    stats: SheetStats
+
+    def parsed_sheet(self) -> pd.DataFrame:
+        """The rows of the stringified sheet, parsed again from its csv."""
+        return pd.read_csv(io.StringIO(self.stringified_sheet.content))
 
 
 class ChunkedSheets(NamedTuple):
@@ -27,7 +53,7 @@ class ChunkedSheets(NamedTuple):
 
 class SheetPreprocessor(abc.ABC):
     @abc.abstractmethod
-    def preprocess(self, *, xl: pd.ExcelFile) -> list[PreprocessedSheet]:
+    def preprocess(self, *, xl: Workbook) -> list[PreprocessedSheet]:
         pass
 
     @abc.abstractmethod
@@ -35,23 +61,75 @@ class SheetPreprocessor(abc.ABC):
         pass
 
 
-GetLength = Callable[[str], int]
+GetLengths = Callable[[list[str]], list[int]]
+
+# below this many sheets the cost of shipping results between processes
+# outweighs the parallelism
+PARALLEL_MIN_SHEETS = 8
 
 
 def preprocess(
     *,
     max_length: int,
-    get_length: GetLength,
-    xl: pd.ExcelFile,
+    get_lengths: GetLengths,
+    xl: Workbook,
+    executor: Executor | None = None,
+    max_workers: int = 1,
+) -> list[PreprocessedSheet]:
+    sheets = list(enumerate(xl.sheet_names))
+    if (
+        executor is None
+        or max_workers <= 1
+        or len(sheets) < PARALLEL_MIN_SHEETS
+        or not isinstance(xl.io, str | os.PathLike)
+    ):
+        return preprocess_sheets(
+            xl,
+            sheets,
+            max_length=max_length,
+            get_lengths=get_lengths,
+        )
+
+    # every worker opens the workbook once and handles every nth sheet
+    batches = [sheets[offset::max_workers] for offset in range(max_workers)]
+    results = executor.map(
+        functools.partial(
+            preprocess_sheets,
+            xl.io,
+            max_length=max_length,
+            get_lengths=get_lengths,
+        ),
+        batches,
+    )
+    return sorted(itertools.chain.from_iterable(results), key=lambda sheet: sheet.index)
+
+
+def preprocess_sheets(
+    xl: Workbook | str | os.PathLike,
+    sheets: list[tuple[int, str]],
+    *,
+    max_length: int,
+    get_lengths: GetLengths,
 ) -> list[PreprocessedSheet]:
+    # pd.ExcelFile is path like itself
+    if isinstance(xl, str | os.PathLike) and not isinstance(xl, Workbook):
+        xl = open_workbook(xl)
+
     acc: list[PreprocessedSheet] = []
-    for index, sheet_name in enumerate(xl.sheet_names):
-        parsed_sheet = xl.parse(sheet_name)
+    for index, sheet_name in sheets:
+        parsed_sheet, complete = read_sheet(
+            xl,
+            sheet_name,
+            max_length=max_length,
+            get_lengths=get_lengths,
+        )
         stringfied_sheet = stringify_sheet(
-            get_length=get_length,
+            get_lengths=get_lengths,
             sheet=parsed_sheet,
             max_length=max_length,
         )
+        if stringfied_sheet is not None and not complete:
+            stringfied_sheet = stringfied_sheet._replace(was_truncated=True)
         if stringfied_sheet is None:
             logger.warning(
                 f"Sheet {sheet_name} is too long to be processed. Skipping it.",
@@ -61,35 +139,132 @@ def preprocess(
         acc.append(
             PreprocessedSheet(
                 sheet_name=sheet_name,
-                parsed_sheet=parsed_sheet,
                 stringified_sheet=stringfied_sheet,
                 index=index,
+                stats=SheetStats(*parsed_sheet.shape),
             ),
         )
     return acc
 
 
+# rows first read from a lazily read sheet, later reads are sized by the
+# length of the rows so far to fill what is left of the budget
+FIRST_READ_ROWS = 64
+MAX_READ_ROWS = 4096
+
+
+def read_sheet(
+    xl: Workbook,
+    sheet_name: str,
+    *,
+    max_length: int,
+    get_lengths: GetLengths,
+) -> tuple[pd.DataFrame, bool]:
+    """The sheet and whether it is complete.
+
+    Of a lazily read workbook only the first rows are read, until the csv
+    lines stringify_sheet would measure for them reach max_length, since it
+    would drop the rest. A sheet not read to its end is truncated.
+
+    Columns take their types from the rows read, so a column of integers
+    missing a value only further down is written as integers, where parsing
+    the whole sheet writes them as floats like `1.0`.
+    """
+    if not isinstance(xl, XlsxWorkbook):
+        return xl.parse(sheet_name), True
+
+    acc: list[Row] = []
+    sheet = as_frame(acc)
+    lines: list[str] = []
+    lengths: list[int] = []
+    read_rows = FIRST_READ_ROWS
+    with contextlib.closing(xl.rows(sheet_name)) as rows:
+        while (length := sum(lengths)) < max_length:
+            if length:
+                remaining = (max_length - length) * len(acc) // length
+                read_rows = min(max(remaining + 1, FIRST_READ_ROWS), MAX_READ_ROWS)
+            batch = list(itertools.islice(rows, read_rows))
+            if not batch:
+                return sheet, True
+            acc.extend(batch)
+            sheet = as_frame(acc)
+            lines, lengths = measure_lines(sheet, lines, lengths, get_lengths)
+    return sheet, False
+
+
+def measure_lines(
+    sheet: pd.DataFrame,
+    previous_lines: list[str],
+    previous_lengths: list[int],
+    get_lengths: GetLengths,
+) -> tuple[list[str], list[int]]:
+    """The csv lines of the sheet and their lengths.
+
+    The lengths of the lines unchanged since the previous lines are reused,
+    lines change when rows read later change how a column is written.
+    """
+    lines = serialize_rows(sheet)
+    unchanged = 0
+    for line, previous in zip(lines, previous_lines, strict=False):
+        if line != previous:
+            break
+        unchanged += 1
+    return lines, previous_lengths[:unchanged] + get_lengths(lines[unchanged:])
+
+
+# ends with a newline so cells containing newlines are quoted like the default
+ROW_TERMINATOR = "\x1e\n"
+
+
+def serialize_rows(sheet: pd.DataFrame) -> list[str]:
+    """Serializes the header and every row of the sheet to its own csv line.
+
+    Joining the lines gives the same string as `sheet.to_csv(index=False)`.
+    """
+    content = sheet.to_csv(index=False, lineterminator=ROW_TERMINATOR)
+    if content.count("\x1e") == sheet.shape[0] + 1:
+        return [f"{line}\n" for line in content.split(ROW_TERMINATOR)[:-1]]
+
+    # a cell contains the separator, fall back to serializing row by row
+    return [
+        sheet[:0].to_csv(index=False),
+        *(
+            sheet[idx : idx + 1].to_csv(index=False, header=False)
+            for idx in range(sheet.shape[0])
+        ),
+    ]
+
+
 STRINGIFY_ATTEMPTS = 10
 
 
 def stringify_sheet(
     *,
     max_length: int,
-    get_length: GetLength,
+    get_lengths: GetLengths,
     sheet: pd.DataFrame,
 ) -> StringifiedSheet | None:
-    total_rows = sheet.shape[0]
-    for attempt in range(STRINGIFY_ATTEMPTS):
-        sheet_end = None if attempt == 0 else int(total_rows / 2**attempt)
-
-        sheet_as_string = sheet[:sheet_end].to_csv(index=False)
-        length = get_length(sheet_as_string)
+    lines = serialize_rows(sheet)
+    # cumulative[n] estimates the length of the header and the first n rows
+    cumulative = list(itertools.accumulate(get_lengths(lines)))
+
+    # the estimate can be off by a few tokens at row boundaries, so the
+    # budget is tightened by the overshoot until the exact length fits
+    budget = max_length
+    for _ in range(STRINGIFY_ATTEMPTS):
+        end = bisect.bisect_left(cumulative, budget)
+        if end == 0:
+            return None
+
+        sheet_as_string = "".join(lines[:end])
+        [length] = get_lengths([sheet_as_string])
         if length < max_length:
             return StringifiedSheet(
                 content=sheet_as_string,
                 token_length=length,
-                was_truncated=attempt > 0,
+                was_truncated=end < len(lines),
             )
+        budget -= length - max_length + 1
     return None
 
 
@@ -120,11 +295,17 @@ GPT4_TOKEN_LIMIT = 5000
 
 
 class GPT4SheetProcessor(SheetPreprocessor):
-    def preprocess(self, *, xl: pd.ExcelFile) -> list[PreprocessedSheet]:
+    def __init__(self, max_workers: int = 1) -> None:
+        self.max_workers = min(max_workers, os.cpu_count() or 1)
+        self.executor = process_pool(self.max_workers)
+
+    def preprocess(self, *, xl: Workbook) -> list[PreprocessedSheet]:
         return preprocess(
-            get_length=TokenLength.gpt4,
+            get_lengths=TokenLength.gpt4_many,
             max_length=GPT4_TOKEN_LIMIT,
             xl=xl,
+            executor=self.executor,
+            max_workers=self.max_workers,
         )
 
     def chunk(self, sheets: list[PreprocessedSheet]) -> ChunkedSheets:
@@ -140,11 +321,17 @@ CLAUDE_TOKEN_LIMIT = 100_000
 
 
 class ClaudeSheetProcessor(SheetPreprocessor):
-    def preprocess(self, *, xl: pd.ExcelFile) -> list[PreprocessedSheet]:
+    def __init__(self, max_workers: int = 1) -> None:
+        self.max_workers = min(max_workers, os.cpu_count() or 1)
+        self.executor = process_pool(self.max_workers)
+
+    def preprocess(self, *, xl: Workbook) -> list[PreprocessedSheet]:
         return preprocess(
-            get_length=TokenLength.claude100k,
+            get_lengths=TokenLength.claude100k_many,
             max_length=CLAUDE_TOKEN_LIMIT,
             xl=xl,
+            executor=self.executor,
+            max_workers=self.max_workers,
         )
 
     def chunk(self, sheets: list[PreprocessedSheet]) -> ChunkedSheets:
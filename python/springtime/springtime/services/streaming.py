@@ -0,0 +1,255 @@
+import asyncio
+import contextlib
+import threading
+import time
+from collections import deque
+from collections.abc import AsyncGenerator, AsyncIterator
+
+import numpy as np
+import openai
+from loguru import logger
+from pydantic import BaseModel, NonNegativeInt
+
+# the upstream is read ahead of a slow client by at most this many deltas
+MAX_PENDING_DELTAS = 1024
+# streams the latency percentiles are computed over
+RECENT_STREAMS = 1000
+# what the upstream raises when the completion fails, told to SSE clients by
+# an error event with a fixed message, the details are only logged
+UPSTREAM_ERRORS = (openai.error.OpenAIError, TimeoutError)
+UPSTREAM_ERROR_MESSAGE = "The answer could not be completed"
+
+
+class StreamStats(BaseModel):
+    streams: NonNegativeInt
+    disconnects: NonNegativeInt
+    errors: NonNegativeInt
+    time_to_first_token_p50: float | None
+    time_to_first_token_p95: float | None
+    tokens_per_second: float | None
+
+
+class StreamSample(BaseModel):
+    time_to_first_token: float | None
+    tokens: NonNegativeInt
+    duration: float
+
+
+class StreamMetrics:
+    """Time to first token and throughput of recent streams.
+
+    Every content delta OpenAI streams is counted as a token, which is what
+    the chat models send.
+    """
+
+    def __init__(self, recent: int = RECENT_STREAMS) -> None:
+        self.streams = 0
+        self.disconnects = 0
+        self.errors = 0
+        self._samples: deque[StreamSample] = deque(maxlen=recent)
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        sample: StreamSample,
+        *,
+        disconnected: bool = False,
+        failed: bool = False,
+    ) -> None:
+        with self._lock:
+            self.streams += 1
+            self.disconnects += disconnected
+            self.errors += failed
+            self._samples.append(sample)
+
+    def stats(self) -> StreamStats:
+        with self._lock:
+            samples = list(self._samples)
+            streams, disconnects, errors = self.streams, self.disconnects, self.errors
+        first_token = [
+            sample.time_to_first_token
+            for sample in samples
+            if sample.time_to_first_token is not None
+        ]
+        p50, p95 = np.percentile(first_token, [50, 95]) if first_token else (None, None)
+        streaming = sum(
+            sample.duration - sample.time_to_first_token
+            for sample in samples
+            if sample.time_to_first_token is not None
+        )
+        tokens = sum(sample.tokens for sample in samples)
+        return StreamStats(
+            streams=streams,
+            disconnects=disconnects,
+            errors=errors,
+            time_to_first_token_p50=p50,
+            time_to_first_token_p95=p95,
+            tokens_per_second=tokens / streaming if streaming else None,
+        )
+
+
+async def measured(
+    deltas: AsyncIterator[str],
+    metrics: StreamMetrics,
+) -> AsyncGenerator[str, None]:
+    """Passes the deltas through, recording the stream in metrics."""
+    started_at = time.monotonic()
+    first_at: float | None = None
+    tokens = 0
+    disconnected = False
+    failed = False
+    try:
+        async for delta in deltas:
+            if first_at is None:
+                first_at = time.monotonic()
+            tokens += 1
+            yield delta
+    except (asyncio.CancelledError, GeneratorExit):
+        disconnected = True
+        raise
+    except Exception:
+        failed = True
+        raise
+    finally:
+        metrics.record(
+            StreamSample(
+                time_to_first_token=None if first_at is None else first_at - started_at,
+                tokens=tokens,
+                duration=time.monotonic() - started_at,
+            ),
+            disconnected=disconnected,
+            failed=failed,
+        )
+
+
+# put after the last delta by the reader of the upstream
+DONE = object()
+
+
+class PendingDeltas:
+    """Deltas held back until they are due to be sent.
+
+    They are due once max_delay has passed since the oldest of them or
+    max_chars have gathered.
+    """
+
+    def __init__(self, *, max_delay: float, max_chars: int) -> None:
+        self.max_delay = max_delay
+        self.max_chars = max_chars
+        self._deltas: list[str] = []
+        self._size = 0
+        self._flush_at: float | None = None
+
+    def __bool__(self) -> bool:
+        """Whether any deltas are held."""
+        return bool(self._deltas)
+
+    def add(self, delta: str, now: float) -> None:
+        self._deltas.append(delta)
+        self._size += len(delta)
+        if self._flush_at is None:
+            self._flush_at = now + self.max_delay
+
+    def full(self) -> bool:
+        return self._size >= self.max_chars
+
+    def timeout(self, now: float) -> float | None:
+        """Seconds until the deltas are due, None when there are none."""
+        return None if self._flush_at is None else max(0, self._flush_at - now)
+
+    def take(self) -> str:
+        joined = "".join(self._deltas)
+        self._deltas = []
+        self._size = 0
+        self._flush_at = None
+        return joined
+
+
+async def read_into(deltas: AsyncIterator[str], queue: asyncio.Queue[object]) -> None:
+    """Puts every delta in the queue, then DONE, also when the upstream fails."""
+    try:
+        async for delta in deltas:
+            await queue.put(delta)
+    except Exception:
+        await queue.put(DONE)
+        raise
+    await queue.put(DONE)
+
+
+async def cancel_reading(
+    get: asyncio.Future[object] | None,
+    reader: asyncio.Task[None],
+) -> None:
+    """Cancels a pending get and the reader, which closes the upstream."""
+    if get is not None:
+        get.cancel()
+    if not reader.done():
+        reader.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await reader
+
+
+async def coalesced(
+    deltas: AsyncIterator[str],
+    *,
+    max_delay: float,
+    max_chars: int,
+) -> AsyncGenerator[str, None]:
+    """Joins deltas into fewer, larger chunks.
+
+    The first delta is sent straight away, later ones are held until
+    max_delay has passed since the oldest of them or max_chars have
+    gathered. The upstream is read by a task so a quiet upstream still
+    flushes on time. Closing or cancelling this generator cancels the task,
+    which closes the upstream.
+    """
+    queue: asyncio.Queue[object] = asyncio.Queue(MAX_PENDING_DELTAS)
+    loop = asyncio.get_running_loop()
+    reader = asyncio.create_task(read_into(deltas, queue))
+    pending = PendingDeltas(max_delay=max_delay, max_chars=max_chars)
+    get: asyncio.Future[object] | None = None
+    first = True
+    try:
+        while True:
+            if get is None:
+                get = asyncio.ensure_future(queue.get())
+            finished, _ = await asyncio.wait(
+                {get},
+                timeout=pending.timeout(loop.time()),
+            )
+            if finished:
+                item = get.result()
+                get = None
+                if item is DONE:
+                    break
+                assert isinstance(item, str)
+                pending.add(item, loop.time())
+                if not first and not pending.full():
+                    continue
+            first = False
+            yield pending.take()
+
+        if pending:
+            yield pending.take()
+        # raises what the upstream raised
+        await reader
+    finally:
+        await cancel_reading(get, reader)
+
+
+def sse_event(data: str, event: str | None = None) -> str:
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+async def sse_events(chunks: AsyncIterator[str]) -> AsyncGenerator[str, None]:
+    """Frames every chunk as a message event, ends with a done or error event."""
+    try:
+        async for chunk in chunks:
+            yield sse_event(chunk)
+    except UPSTREAM_ERRORS:
+        logger.exception("Streaming the answer failed")
+        yield sse_event(UPSTREAM_ERROR_MESSAGE, event="error")
+        return
+    yield sse_event("", event="done")
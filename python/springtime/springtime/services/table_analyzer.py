@@ -1,17 +1,23 @@
 import abc
+import math
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 
-import pandas as pd
+import anthropic
 from loguru import logger
 from pydantic import BaseModel
 
+from springtime.excel.tables_archive import Workbook
 from springtime.services.excel_analyzer import ExcelAnalyzer
 from springtime.services.sheet_processor import (
+    PreprocessedSheet,
     SheetPreprocessor,
 )
 
 
 class AnalyzeArguments(BaseModel):
-    excel_file: pd.ExcelFile
+    excel_file: Workbook
 
     class Config:
         arbitrary_types_allowed = True
@@ -22,6 +28,8 @@ class AnalyzeResponseChunk(BaseModel):
     prompt: str
     html: str | None
     sheet_names: list[str]
+    order: int
+    error: str | None = None
 
 
 class InputChunk(BaseModel):
@@ -35,44 +43,165 @@ class AnalyzeResponse(BaseModel):
 
 class TableAnalyzer(abc.ABC):
     @abc.abstractmethod
-    def analyze(self, *, excel_file: pd.ExcelFile) -> AnalyzeResponse:
+    def analyze(self, *, excel_file: Workbook) -> AnalyzeResponse:
         return None
 
+    @abc.abstractmethod
+    def analyze_streaming(
+        self,
+        *,
+        excel_file: Workbook,
+    ) -> Iterator[AnalyzeResponseChunk]:
+        pass
+
 
 GPT4_TOKEN_LIMIT = 5000
 
 
+class ChunkDeadlines:
+    """When the analysis of each chunk, by its order, is given up on."""
+
+    def __init__(self, chunk_timeout: float | None, max_workers: int) -> None:
+        self.chunk_timeout = chunk_timeout
+        self.max_workers = max_workers
+        self.submitted_at = time.monotonic()
+        self._started_at: dict[int, float] = {}
+
+    def start(self, order: int) -> None:
+        self._started_at[order] = time.monotonic()
+
+    def deadline(self, order: int) -> float:
+        if self.chunk_timeout is None:
+            return math.inf
+        if (start := self._started_at.get(order)) is not None:
+            return start + self.chunk_timeout
+        # a chunk still waiting for a worker gives up once every chunk
+        # ahead of it could have used its full timeout
+        return self.submitted_at + self.chunk_timeout * (order // self.max_workers + 1)
+
+    def timeout(self, orders: Iterable[int]) -> float | None:
+        """Seconds until the first of the orders is due, None for never."""
+        next_deadline = min(self.deadline(order) for order in orders)
+        if next_deadline == math.inf:
+            return None
+        return max(next_deadline - time.monotonic(), 0)
+
+
 class TableAnalyzerImpl(TableAnalyzer):
     def __init__(
         self,
         excel_analyzer: ExcelAnalyzer,
         sheet_processor: SheetPreprocessor,
+        *,
+        max_concurrency: int = 4,
+        chunk_timeout: float | None = None,
     ) -> None:
         self.excel_analyzer = excel_analyzer
         self.sheet_preprocessor = sheet_processor
+        self.max_concurrency = max_concurrency
+        self.chunk_timeout = chunk_timeout
 
-    def analyze(self, *, excel_file: pd.ExcelFile) -> AnalyzeResponse:
-        acc: list[AnalyzeResponseChunk] = []
+    def analyze(self, *, excel_file: Workbook) -> AnalyzeResponse:
+        chunks = self.analyze_streaming(excel_file=excel_file)
+        return AnalyzeResponse(chunks=sorted(chunks, key=lambda chunk: chunk.order))
 
-        xl = pd.ExcelFile(excel_file)
-        preprocessed = self.sheet_preprocessor.preprocess(xl=xl)
+    def analyze_streaming(
+        self,
+        *,
+        excel_file: Workbook,
+    ) -> Iterator[AnalyzeResponseChunk]:
+        """Yields every chunk as soon as it is analyzed, in completion order."""
+        preprocessed = self.sheet_preprocessor.preprocess(xl=excel_file)
         chunks = self.sheet_preprocessor.chunk(preprocessed)
-
-        logger.info(f"{len(chunks)} Chunks being analyzed")
-        for sheet_chunk in chunks.sheets:
-            sheet_names = ", ".join(sheet.sheet_name for sheet in sheet_chunk)
-            logger.info(f"Starting to analyze sheet chunks: {sheet_names}")
-            resp = self.excel_analyzer.analyze(sheets=sheet_chunk)
-
-            acc.append(
-                AnalyzeResponseChunk(
-                    sheet_names=[sheet.sheet_name for sheet in sheet_chunk],
-                    content=resp.content,
-                    prompt=resp.prompt,
-                    html=resp.html,
-                ),
-            )
-
-            logger.info(f"Finished analyzing sheet chunk: {sheet_names}")
-
-        return AnalyzeResponse(chunks=acc)
+        logger.info(f"{len(chunks.sheets)} Chunks being analyzed")
+        if not chunks.sheets:
+            return
+
+        max_workers = min(self.max_concurrency, len(chunks.sheets))
+        deadlines = ChunkDeadlines(self.chunk_timeout, max_workers)
+
+        def analyze_chunk(order: int, sheet_chunk: list[PreprocessedSheet]):
+            deadlines.start(order)
+            return self.analyze_chunk(order, sheet_chunk)
+
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            pending = {
+                executor.submit(analyze_chunk, order, sheet_chunk): order
+                for order, sheet_chunk in enumerate(chunks.sheets)
+            }
+            while pending:
+                done, _ = wait(
+                    pending,
+                    timeout=deadlines.timeout(pending.values()),
+                    return_when=FIRST_COMPLETED,
+                )
+                for future in done:
+                    order = pending.pop(future)
+                    yield self.chunk_result(future, order, chunks.sheets[order])
+
+                now = time.monotonic()
+                for future, order in list(pending.items()):
+                    if deadlines.deadline(order) <= now:
+                        del pending[future]
+                        yield self.failed_chunk(
+                            order,
+                            chunks.sheets[order],
+                            TimeoutError(),
+                        )
+        finally:
+            # timed out calls cannot be interrupted, they finish in the background
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def chunk_result(
+        self,
+        future: Future[AnalyzeResponseChunk],
+        order: int,
+        sheet_chunk: list[PreprocessedSheet],
+    ) -> AnalyzeResponseChunk:
+        """The analyzed chunk, or a failed one when Claude could not analyze it.
+
+        Any other exception is a bug and propagates.
+        """
+        try:
+            return future.result()
+        except (TimeoutError, anthropic.APIError) as e:
+            return self.failed_chunk(order, sheet_chunk, e)
+
+    def analyze_chunk(
+        self,
+        order: int,
+        sheet_chunk: list[PreprocessedSheet],
+    ) -> AnalyzeResponseChunk:
+        sheet_names = ", ".join(sheet.sheet_name for sheet in sheet_chunk)
+        logger.info(f"Starting to analyze sheet chunks: {sheet_names}")
+        resp = self.excel_analyzer.analyze(sheets=sheet_chunk)
+        logger.info(f"Finished analyzing sheet chunk: {sheet_names}")
+        return AnalyzeResponseChunk(
+            sheet_names=[sheet.sheet_name for sheet in sheet_chunk],
+            content=resp.content,
+            prompt=resp.prompt,
+            html=resp.html,
+            order=order,
+        )
+
+    def failed_chunk(
+        self,
+        order: int,
+        sheet_chunk: list[PreprocessedSheet],
+        e: Exception,
+    ) -> AnalyzeResponseChunk:
+        if isinstance(e, TimeoutError):
+            error = f"Timed out after {self.chunk_timeout} seconds"
+        else:
+            error = str(e) or type(e).__name__
+        sheet_names = [sheet.sheet_name for sheet in sheet_chunk]
+        logger.error(f"Failed to analyze sheet chunk {sheet_names}: {error}")
+        return AnalyzeResponseChunk(
+            sheet_names=sheet_names,
+            content="",
+            prompt="",
+            html=None,
+            order=order,
+            error=error,
+        )
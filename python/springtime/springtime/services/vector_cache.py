@@ -0,0 +1,229 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+import numpy as np
+from pydantic import BaseModel, NonNegativeInt
+
+from springtime.services.metadata_filter import (
+    MetadataFilter,
+    canonical_filter,
+    matches,
+)
+from springtime.services.vector_service import (
+    TOP_K,
+    SimilarityQuery,
+    UpsertVector,
+    VectorResult,
+    VectorService,
+)
+
+# vectors are normalized and rounded to this many steps per unit, so the
+# float noise between two embeddings of the same text maps to the same key
+QUANTIZATION_STEPS = 4096
+
+
+def quantized_vector_key(vector: list[float]) -> bytes:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(array)
+    if norm:
+        array = array / norm
+    quantized = np.round(array * QUANTIZATION_STEPS).astype(np.int16)
+    return hashlib.blake2b(quantized.tobytes(), digest_size=16).digest()
+
+
+class VectorCacheStats(BaseModel):
+    hits: NonNegativeInt
+    misses: NonNegativeInt
+    invalidations: NonNegativeInt
+    size: NonNegativeInt
+
+
+class CacheEntry(NamedTuple):
+    created_at: float
+    filter_key: str
+    results: list[VectorResult]
+
+
+class CachedVectorService(VectorService):
+    """Caches similarity search results of another VectorService.
+
+    Entries are keyed on the quantized query vector, the canonical metadata
+    filter, top_k and n_probe, and expire after `ttl` seconds or when evicted by the
+    LRU. An upsert drops every entry whose filter matches the metadata of
+    any upserted vector, since its results may have changed, and every entry
+    whose results hold an upserted id, since that vector may have moved or
+    no longer match the filter. The wrapped service searches a single
+    namespace, so every upsert through it is in scope.
+    """
+
+    def __init__(
+        self,
+        vector_service: VectorService,
+        *,
+        maxsize: int = 1024,
+        ttl: float | None = 300,
+    ) -> None:
+        self.vector_service = vector_service
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: OrderedDict[tuple, CacheEntry] = OrderedDict()
+        # canonical filter to the filter and the keys cached under it
+        self._filters: dict[str, tuple[MetadataFilter, set[tuple]]] = {}
+        # result id to the keys whose results hold it
+        self._result_ids: dict[str, set[tuple]] = {}
+        # bumped by every upsert so searches that raced one are not cached
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors: list[UpsertVector]) -> None:
+        try:
+            self.vector_service.upsert(vectors)
+        finally:
+            self.invalidate(
+                [vector.id for vector in vectors],
+                [vector.metadata for vector in vectors],
+            )
+
+    def upsert_arrays(
+        self,
+        ids: list[str],
+        vectors: np.ndarray,
+        metadata: list[dict[str, str]],
+    ) -> None:
+        try:
+            self.vector_service.upsert_arrays(ids, vectors, metadata)
+        finally:
+            self.invalidate(ids, metadata)
+
+    def get_similar(
+        self,
+        vector: list[float],
+        metadata: MetadataFilter,
+        top_k: int = TOP_K,
+        n_probe: int | None = None,
+    ) -> list[VectorResult]:
+        [results] = self.get_similar_many(
+            [
+                SimilarityQuery(
+                    vector=vector,
+                    metadata=metadata,
+                    top_k=top_k,
+                    n_probe=n_probe,
+                ),
+            ],
+        )
+        return results
+
+    def get_similar_many(
+        self,
+        queries: list[SimilarityQuery],
+    ) -> list[list[VectorResult]]:
+        keys = [
+            (
+                quantized_vector_key(query.vector),
+                canonical_filter(query.metadata),
+                query.top_k,
+                query.n_probe,
+            )
+            for query in queries
+        ]
+        acc: list[list[VectorResult] | None] = [self._get(key) for key in keys]
+        missing = [idx for idx, results in enumerate(acc) if results is None]
+        if not missing:
+            return acc
+
+        with self._lock:
+            generation = self._generation
+        found = self.vector_service.get_similar_many(
+            [queries[idx] for idx in missing],
+        )
+        for idx, results in zip(missing, found, strict=True):
+            acc[idx] = results
+            self._set(keys[idx], queries[idx].metadata, results, generation)
+        return acc
+
+    def invalidate(self, ids: list[str], upserted: list[dict[str, str]]) -> None:
+        """Drops the entries an upsert of the ids and metadata may have changed.
+
+        Those whose filter matches any of the metadata, and those whose
+        results hold any of the ids.
+        """
+        with self._lock:
+            self._generation += 1
+            stale: set[tuple] = set()
+            for metadata_filter, keys in self._filters.values():
+                if any(matches(metadata_filter, metadata) for metadata in upserted):
+                    stale |= keys
+            for vector_id in ids:
+                stale |= self._result_ids.get(vector_id, set())
+            self.invalidations += len(stale)
+            for key in stale:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._filters.clear()
+            self._result_ids.clear()
+
+    def stats(self) -> VectorCacheStats:
+        with self._lock:
+            return VectorCacheStats(
+                hits=self.hits,
+                misses=self.misses,
+                invalidations=self.invalidations,
+                size=len(self._entries),
+            )
+
+    def _get(self, key: tuple) -> list[VectorResult] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (
+                self.ttl is None or entry.created_at + self.ttl >= time.monotonic()
+            ):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.results
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def _set(
+        self,
+        key: tuple,
+        metadata_filter: MetadataFilter,
+        results: list[VectorResult],
+        generation: int,
+    ) -> None:
+        with self._lock:
+            if generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            filter_key = key[1]
+            self._entries[key] = CacheEntry(time.monotonic(), filter_key, results)
+            self._filters.setdefault(filter_key, (metadata_filter, set()))[1].add(key)
+            for result in results:
+                self._result_ids.setdefault(result.id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: tuple) -> None:
+        entry = self._entries.pop(key)
+        _, keys = self._filters[entry.filter_key]
+        keys.discard(key)
+        if not keys:
+            del self._filters[entry.filter_key]
+        for result in entry.results:
+            keys = self._result_ids[result.id]
+            keys.discard(key)
+            if not keys:
+                del self._result_ids[result.id]
@@ -0,0 +1,122 @@
+"""Compact encodings for moving many vectors over HTTP.
+
+Vectors travel as one little endian buffer, either base64 encoded inside
+JSON or as the raw body, and decode into a NumPy array without creating a
+Python float per element. int8 stores every vector scaled by its largest
+absolute value, the float32 scales follow the int8 data.
+"""
+import base64
+from enum import Enum
+
+import numpy as np
+from pydantic import BaseModel
+
+# JSON with a base64 buffer, see EncodedVectors
+VECTORS_JSON_MEDIA_TYPE = "application/vnd.springtime.vectors+json"
+# the raw buffer, described by the headers below
+VECTORS_BINARY_MEDIA_TYPE = "application/octet-stream"
+VECTORS_MEDIA_TYPES = (VECTORS_JSON_MEDIA_TYPE, VECTORS_BINARY_MEDIA_TYPE)
+DTYPE_HEADER = "X-Vector-Dtype"
+SHAPE_HEADER = "X-Vector-Shape"
+
+
+class VectorDtype(str, Enum):
+    float32 = "float32"
+    float16 = "float16"
+    int8 = "int8"
+
+
+NUMPY_DTYPES = {
+    VectorDtype.float32: np.dtype("<f4"),
+    VectorDtype.float16: np.dtype("<f2"),
+    VectorDtype.int8: np.dtype("i1"),
+}
+SCALE_DTYPE = np.dtype("<f4")
+
+
+class EncodedVectors(BaseModel):
+    dtype: VectorDtype
+    shape: tuple[int, int]
+    data: str
+
+
+def to_bytes(matrix: np.ndarray, dtype: VectorDtype) -> bytes:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if dtype != VectorDtype.int8:
+        return matrix.astype(NUMPY_DTYPES[dtype]).tobytes()
+    scales = np.abs(matrix).max(axis=1, initial=0) / 127
+    safe_scales = np.where(scales == 0, 1, scales)
+    quantized = np.round(matrix / safe_scales[:, None]).astype(np.int8)
+    return quantized.tobytes() + scales.astype(SCALE_DTYPE).tobytes()
+
+
+def from_bytes(
+    buffer: bytes,
+    dtype: VectorDtype,
+    shape: tuple[int, int],
+) -> np.ndarray:
+    count, dimension = shape
+    numpy_dtype = NUMPY_DTYPES[dtype]
+    data_size = count * dimension * numpy_dtype.itemsize
+    expected = data_size + (count * SCALE_DTYPE.itemsize if dtype == "int8" else 0)
+    if len(buffer) != expected:
+        msg = f"Expected {expected} bytes for {count}x{dimension} {dtype.value}"
+        raise ValueError(msg)
+
+    matrix = np.frombuffer(buffer, dtype=numpy_dtype, count=count * dimension)
+    matrix = matrix.reshape(count, dimension)
+    if dtype == VectorDtype.float32:
+        return matrix
+    if dtype == VectorDtype.float16:
+        return matrix.astype(np.float32)
+    scales = np.frombuffer(buffer, dtype=SCALE_DTYPE, offset=data_size)
+    return matrix * scales[:, None]
+
+
+def as_matrix(vectors: np.ndarray | list[list[float]]) -> np.ndarray:
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim != 2:
+        matrix = matrix.reshape(len(matrix), -1 if len(matrix) else 0)
+    return matrix
+
+
+def encode_vectors(
+    vectors: np.ndarray | list[list[float]],
+    dtype: VectorDtype,
+) -> EncodedVectors:
+    matrix = as_matrix(vectors)
+    return EncodedVectors(
+        dtype=dtype,
+        shape=matrix.shape,
+        data=base64.b64encode(to_bytes(matrix, dtype)).decode("ascii"),
+    )
+
+
+def decode_vectors(encoded: EncodedVectors) -> np.ndarray:
+    return from_bytes(base64.b64decode(encoded.data), encoded.dtype, encoded.shape)
+
+
+def parse_shape(value: str) -> tuple[int, int]:
+    count, dimension = (int(part) for part in value.split(","))
+    return count, dimension
+
+
+def media_type_dtype(media_type: str) -> VectorDtype:
+    """The dtype parameter of one media type, float32 when it has none."""
+    for parameter in media_type.split(";")[1:]:
+        key, _, value = parameter.strip().partition("=")
+        if key == "dtype":
+            return VectorDtype(value.strip())
+    return VectorDtype.float32
+
+
+def accepted_vectors_media_type(accept: str) -> tuple[str, VectorDtype] | None:
+    """The first vectors media type an Accept header lists, with its dtype.
+
+    None when it lists neither, and the vectors are sent as JSON floats.
+    """
+    for media_range in accept.split(","):
+        media_type = media_range.partition(";")[0].strip().lower()
+        if media_type in VECTORS_MEDIA_TYPES:
+            return media_type, media_type_dtype(media_range)
+    return None
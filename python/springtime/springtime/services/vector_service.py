@@ -1,9 +1,18 @@
 import abc
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from http import HTTPStatus
+from typing import Any, NamedTuple
 
+import numpy as np
 import pinecone
-from pydantic import BaseModel
+import urllib3
+from loguru import logger
+from pydantic import BaseModel, Field
 
-from ..settings import SETTINGS
+TOP_K = 10
+MAX_TOP_K = 1000
+MAX_QUERY_CONCURRENCY = 8
 
 
 class UpsertVector(BaseModel):
@@ -18,6 +27,15 @@ class VectorResult(BaseModel):
     score: float
 
 
+class SimilarityQuery(BaseModel):
+    vector: list[float]
+    metadata: dict[str, Any] = {}
+    top_k: int = Field(default=TOP_K, ge=1, le=MAX_TOP_K)
+    # lists an IVF index probes, None for its own default, exact backends
+    # ignore it
+    n_probe: int | None = Field(default=None, ge=1)
+
+
 class VectorService(abc.ABC):
     @abc.abstractmethod
     def upsert(self, vectors: list[UpsertVector]) -> None:
@@ -28,9 +46,143 @@ class VectorService(abc.ABC):
         self,
         vector: list[float],
         metadata: dict[str, str],
+        top_k: int = TOP_K,
+        n_probe: int | None = None,
     ) -> list[VectorResult]:
         pass
 
+    def upsert_arrays(
+        self,
+        ids: list[str],
+        vectors: np.ndarray,
+        metadata: list[dict[str, str]],
+    ) -> None:
+        """Upserts the rows of a matrix without validating every float."""
+        self.upsert(
+            [
+                UpsertVector.construct(id=id, vector=vector, metadata=row_metadata)
+                for id, vector, row_metadata in zip(
+                    ids,
+                    vectors.tolist(),
+                    metadata,
+                    strict=True,
+                )
+            ],
+        )
+
+    def get_similar_many(
+        self,
+        queries: list[SimilarityQuery],
+    ) -> list[list[VectorResult]]:
+        """Runs every query concurrently, results are in query order."""
+        if len(queries) <= 1:
+            return [
+                self.get_similar(
+                    query.vector,
+                    query.metadata,
+                    query.top_k,
+                    query.n_probe,
+                )
+                for query in queries
+            ]
+        with ThreadPoolExecutor(
+            max_workers=min(MAX_QUERY_CONCURRENCY, len(queries)),
+        ) as executor:
+            return list(
+                executor.map(
+                    lambda query: self.get_similar(
+                        query.vector,
+                        query.metadata,
+                        query.top_k,
+                        query.n_probe,
+                    ),
+                    queries,
+                ),
+            )
+
+
+class UpsertBatchReport(NamedTuple):
+    batch: int
+    size: int
+    attempts: int
+    seconds: float
+
+
+class UpsertError(Exception):
+    """Some batches of an upsert still failed after their retries."""
+
+    def __init__(
+        self,
+        failed: list[int],
+        batches: int,
+        reports: list[UpsertBatchReport],
+    ) -> None:
+        super().__init__(f"Failed to upsert batches {failed} of {batches}")
+        # indexes of the failed batches, the others are in the reports
+        self.failed = failed
+        self.reports = reports
+
+
+PineconeVector = tuple[str, list[float], dict[str, str]]
+
+# pinecone rejects requests over 2MB and recommends batches of 100 vectors
+MAX_BATCH_SIZE = 100
+MAX_BATCH_BYTES = 2 * 1024 * 1024
+# conservative size of a float in the json request body
+FLOAT_BYTES = 20
+# what a request to pinecone fails with, is_transient tells which are worth
+# sending again
+REQUEST_ERRORS = (
+    pinecone.ApiException,
+    urllib3.exceptions.HTTPError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+def is_transient(e: Exception) -> bool:
+    """Whether sending the request again may succeed, unlike a bad request."""
+    if isinstance(e, pinecone.ApiException):
+        # status 0 is a connection the client could not make
+        return (
+            e.status in (0, HTTPStatus.TOO_MANY_REQUESTS)
+            or (e.status or 0) >= HTTPStatus.INTERNAL_SERVER_ERROR
+        )
+    return isinstance(e, REQUEST_ERRORS)
+
+
+def estimated_bytes(vector: PineconeVector) -> int:
+    id, values, metadata = vector
+    return (
+        len(id)
+        + FLOAT_BYTES * len(values)
+        + sum(len(key) + len(value) + 8 for key, value in metadata.items())
+    )
+
+
+def batches(
+    vectors: list[PineconeVector],
+    *,
+    max_batch_size: int,
+    max_batch_bytes: int,
+) -> list[list[PineconeVector]]:
+    acc: list[list[PineconeVector]] = []
+    batch: list[PineconeVector] = []
+    batch_bytes = 0
+    for vector in vectors:
+        size = estimated_bytes(vector)
+        if batch and (
+            len(batch) >= max_batch_size or batch_bytes + size > max_batch_bytes
+        ):
+            acc.append(batch)
+            batch = []
+            batch_bytes = 0
+        batch.append(vector)
+        batch_bytes += size
+    if batch:
+        acc.append(batch)
+    return acc
+
 
 class PineconeVectorService(VectorService):
     def __init__(
@@ -40,28 +192,116 @@ class PineconeVectorService(VectorService):
         environment: str,
         index_name: str,
         namespace: str,
+        max_batch_size: int = MAX_BATCH_SIZE,
+        max_batch_bytes: int = MAX_BATCH_BYTES,
+        max_concurrency: int = 8,
+        attempts: int = 3,
+        retry_delay: float = 1.0,
+        index: pinecone.Index | None = None,
     ) -> None:
-        pinecone.init(api_key=api_key, environment=environment)
-        self.index = pinecone.Index(index_name=index_name)
+        if attempts < 1:
+            msg = f"attempts must be at least 1, got {attempts}"
+            raise ValueError(msg)
+        if index is None:
+            pinecone.init(api_key=api_key, environment=environment)
+            # the client shares one pool of keep-alive connections between threads
+            index = pinecone.Index(index_name=index_name)
+        self.index = index
         self.namespace = namespace
+        self.max_batch_size = max_batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.max_concurrency = max_concurrency
+        self.attempts = attempts
+        self.retry_delay = retry_delay
 
     def upsert(self, upsert_vectors: list[UpsertVector]):
-        self.index.upsert(
-            vectors=[
+        reports = self.upsert_batches(upsert_vectors)
+        seconds = [report.seconds for report in reports]
+        logger.info(
+            f"Upserted {len(upsert_vectors)} vectors in {len(reports)} batches,"
+            f" slowest batch {max(seconds, default=0):.2f}s",
+        )
+
+    def upsert_batches(
+        self,
+        upsert_vectors: list[UpsertVector],
+    ) -> list[UpsertBatchReport]:
+        """Upserts in size bounded batches sent concurrently.
+
+        A batch failing with a transient error is retried on its own, the
+        other batches are not resent. Raises UpsertError once every batch has
+        finished if any of them failed.
+        """
+        to_upsert = batches(
+            [
                 (upsert_vector.id, upsert_vector.vector, upsert_vector.metadata)
                 for upsert_vector in upsert_vectors
             ],
-            namespace=SETTINGS.pinecone_namespace,
+            max_batch_size=self.max_batch_size,
+            max_batch_bytes=self.max_batch_bytes,
+        )
+        if not to_upsert:
+            return []
+
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_concurrency, len(to_upsert)),
+        ) as executor:
+            futures = [
+                executor.submit(self.upsert_batch, idx, batch)
+                for idx, batch in enumerate(to_upsert)
+            ]
+            wait(futures)
+
+        reports: list[UpsertBatchReport] = []
+        failed: list[int] = []
+        for idx, future in enumerate(futures):
+            if future.exception() is not None:
+                failed.append(idx)
+            else:
+                reports.append(future.result())
+        if failed:
+            raise UpsertError(
+                failed,
+                len(to_upsert),
+                reports,
+            ) from futures[failed[0]].exception()
+        return reports
+
+    def upsert_batch(
+        self,
+        idx: int,
+        batch: list[PineconeVector],
+    ) -> UpsertBatchReport:
+        start = time.perf_counter()
+        for attempt in range(1, self.attempts + 1):
+            try:
+                self.index.upsert(vectors=batch, namespace=self.namespace)
+                break
+            except REQUEST_ERRORS as e:
+                if attempt == self.attempts or not is_transient(e):
+                    raise
+                logger.warning(f"Upserting batch {idx} failed, retrying: {e}")
+                time.sleep(self.retry_delay * 2 ** (attempt - 1))
+
+        report = UpsertBatchReport(
+            batch=idx,
+            size=len(batch),
+            attempts=attempt,
+            seconds=time.perf_counter() - start,
         )
+        logger.debug(f"Upserted batch {report}")
+        return report
 
     def get_similar(
         self,
         vector: list[float],
         metadata: dict[str, str],
+        top_k: int = TOP_K,
+        n_probe: int | None = None,  # noqa: ARG002 pinecone tunes its own index
     ) -> list[VectorResult]:
         result = self.index.query(
             vector=vector,
-            top_k=10,
+            top_k=top_k,
             include_values=False,
             include_metadata=True,
             filter=metadata,
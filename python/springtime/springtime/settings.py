@@ -1,6 +1,15 @@
+from enum import Enum
+
 from pydantic import BaseSettings, Field
 
 from springtime.models.open_ai import OpenAIModel
+from springtime.models.table_extractor import TableExtractorBackend
+
+
+class VectorBackend(str, Enum):
+    pinecone = "pinecone"
+    local = "local"
+    ivf = "ivf"
 
 
 class Settings(BaseSettings):
@@ -11,6 +20,19 @@ class Settings(BaseSettings):
     pinecone_env: str = Field(env="PINECONE_ENV")
     pinecone_index: str = Field(env="PINECONE_INDEX")
     pinecone_namespace: str = Field(env="PINECONE_NAMESPACE")
+    pinecone_upsert_concurrency: int = Field(
+        env="PINECONE_UPSERT_CONCURRENCY",
+        default=8,
+    )
+    vector_backend: VectorBackend = Field(
+        env="VECTOR_BACKEND",
+        default=VectorBackend.pinecone,
+    )
+    local_vector_path: str | None = Field(env="LOCAL_VECTOR_PATH")
+    ivf_n_lists: int | None = Field(env="IVF_N_LISTS")
+    ivf_n_probe: int = Field(env="IVF_N_PROBE", default=8)
+    vector_cache_size: int = Field(env="VECTOR_CACHE_SIZE", default=1024)
+    vector_cache_ttl: float | None = Field(env="VECTOR_CACHE_TTL", default=300)
     tracing_enabled: bool = Field(env="TRACING_ENABLED", default=False)
     reload: bool = Field(env="RELOAD", default=False)
     service_to_service_secret: str | None = Field(
@@ -18,10 +40,58 @@ class Settings(BaseSettings):
     )
     anthropic_api_key: str = Field(env="ANTHROPIC_API_KEY")
     reports_openai_model: OpenAIModel = Field(env="REPORTS_OPENAI_MODEL")
+    # None is Claude's default, only temperature 0 completions are cached
+    claude_temperature: float | None = Field(env="CLAUDE_TEMPERATURE")
     mock_out_claude: bool = Field(
         env="MOCK_OUT_CLAUDE",
         default=False,
     )
+    sheet_preprocess_workers: int = Field(
+        env="SHEET_PREPROCESS_WORKERS",
+        default=4,
+    )
+    table_extractor: TableExtractorBackend = Field(
+        env="TABLE_EXTRACTOR",
+        default=TableExtractorBackend.tabula,
+    )
+    table_extraction_workers: int = Field(
+        env="TABLE_EXTRACTION_WORKERS",
+        default=2,
+    )
+    table_extraction_pages_per_batch: int = Field(
+        env="TABLE_EXTRACTION_PAGES_PER_BATCH",
+        default=10,
+    )
+    table_analyzer_concurrency: int = Field(
+        env="TABLE_ANALYZER_CONCURRENCY",
+        default=4,
+    )
+    table_analyzer_chunk_timeout: float | None = Field(
+        env="TABLE_ANALYZER_CHUNK_TIMEOUT",
+        default=600,
+    )
+    report_concurrency: int = Field(env="REPORT_CONCURRENCY", default=4)
+    # 1 keeps term extraction sequential, the cheapest mode
+    report_terms_window: int = Field(env="REPORT_TERMS_WINDOW", default=1)
+    completion_cache_size: int = Field(env="COMPLETION_CACHE_SIZE", default=1024)
+    completion_cache_ttl: float | None = Field(
+        env="COMPLETION_CACHE_TTL",
+        default=7 * 24 * 60 * 60,
+    )
+    completion_cache_path: str | None = Field(env="COMPLETION_CACHE_PATH")
+    embedding_cache_size: int = Field(env="EMBEDDING_CACHE_SIZE", default=10_000)
+    embedding_cache_path: str | None = Field(env="EMBEDDING_CACHE_PATH")
+    embedding_concurrency: int = Field(env="EMBEDDING_CONCURRENCY", default=4)
+    chat_context_max_bytes: int = Field(
+        env="CHAT_CONTEXT_MAX_BYTES",
+        default=256 * 1024 * 1024,
+    )
+    chat_context_path: str | None = Field(env="CHAT_CONTEXT_PATH")
+    chat_stream_flush_interval: float = Field(
+        env="CHAT_STREAM_FLUSH_INTERVAL",
+        default=0.05,
+    )
+    chat_stream_flush_chars: int = Field(env="CHAT_STREAM_FLUSH_CHARS", default=256)
 
     class Config:
         env_file = ".env"
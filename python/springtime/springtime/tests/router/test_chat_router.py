@@ -0,0 +1,146 @@
+from collections.abc import AsyncGenerator, Generator
+from typing import Any
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from springtime.models.chat import ChatFileContext, ChatHistory
+from springtime.routers.chat_router import ChatRouter
+from springtime.services.chat_service import ChatService
+from springtime.services.prompt import BudgetedPrompt, create_prompt
+
+
+class PromptOnlyChatService(ChatService):
+    def ask_streaming(
+        self,
+        context: list[ChatFileContext],
+        question: str,
+        history: list[ChatHistory],
+    ) -> Generator[Any, Any, None]:
+        yield create_prompt(context, question, history)
+
+    async def ask_streaming_async(
+        self,
+        context: list[ChatFileContext],
+        question: str,
+        history: list[ChatHistory],
+    ) -> AsyncGenerator[str, None]:
+        yield create_prompt(context, question, history)
+
+    def get_prompt(
+        self,
+        context: list[ChatFileContext],
+        question: str,
+        history: list[ChatHistory],
+    ) -> BudgetedPrompt:
+        prompt = create_prompt(context, question, history)
+        return BudgetedPrompt(
+            prompt=prompt,
+            tokens=len(prompt.split()),
+            dropped_chunks=[],
+            dropped_history=0,
+        )
+
+    def get_title(self, question: str, answer: str) -> str:
+        return question
+
+    async def get_title_async(self, question: str, answer: str) -> str:
+        return question
+
+
+FILES = [
+    {
+        "file_name": "fileA",
+        "chunks": [
+            {"order": 0, "content": "revenue was 10", "location": None},
+            {"order": 1, "content": "margin was 5", "location": None},
+        ],
+    },
+]
+
+
+@pytest.fixture()
+def client() -> TestClient:
+    app = FastAPI()
+    app.include_router(ChatRouter(PromptOnlyChatService()).get_router())
+    return TestClient(app)
+
+
+def test_questions_refer_to_a_registered_context(client: TestClient):
+    registered = client.post("/chat/context", json={"files": FILES}).json()
+    [registered_file] = registered["files"]
+    assert registered_file["file_name"] == "fileA"
+    revenue, margin = registered_file["chunk_ids"]
+
+    inline = client.post(
+        "/chat/prompt",
+        json={"question": "q", "history": [], "for_files": FILES},
+    ).json()
+    by_context = client.post(
+        "/chat/prompt",
+        json={"question": "q", "history": [], "context_id": registered["context_id"]},
+    ).json()
+    assert by_context["prompt"] == inline["prompt"]
+
+    streamed = client.post(
+        "/chat/ask-question-streaming",
+        json={
+            "question": "q",
+            "history": [],
+            "context_id": registered["context_id"],
+            "chunk_ids": [margin],
+        },
+    ).text
+    assert "margin was 5" in streamed
+    assert "revenue was 10" not in streamed
+
+
+def test_unknown_context_or_chunk(client: TestClient):
+    unknown = client.post(
+        "/chat/prompt",
+        json={"question": "q", "history": [], "context_id": "unknown"},
+    )
+    assert unknown.status_code == 404
+
+    context_id = client.post("/chat/context", json={"files": FILES}).json()[
+        "context_id"
+    ]
+    unknown_chunk = client.post(
+        "/chat/prompt",
+        json={
+            "question": "q",
+            "history": [],
+            "context_id": context_id,
+            "chunk_ids": ["unknown"],
+        },
+    )
+    assert unknown_chunk.status_code == 422
+
+
+def test_file_names_must_be_unique(client: TestClient):
+    response = client.post("/chat/context", json={"files": [*FILES, *FILES]})
+
+    assert response.status_code == 422
+
+
+def test_streams_sse_events(client: TestClient):
+    response = client.post(
+        "/chat/ask-question-streaming",
+        json={"question": "q", "history": [], "for_files": FILES},
+        headers={"accept": "text/event-stream"},
+    )
+
+    *messages, done = response.text.split("\n\n")[:-1]
+    assert done == "event: done\ndata: "
+    assert all(
+        line.startswith("data: ")
+        for message in messages
+        for line in message.split("\n")
+    )
+    prompt = "\n".join(
+        line.removeprefix("data: ")
+        for message in messages
+        for line in message.split("\n")
+    )
+    assert prompt.endswith("Human: q\nAI:")
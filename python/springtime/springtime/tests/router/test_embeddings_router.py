@@ -0,0 +1,94 @@
+import base64
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from springtime.routers.embeddings_router import EmbeddingsRouter
+from springtime.services.embeddings_service import EmbeddingsService
+from springtime.services.vector_codec import (
+    DTYPE_HEADER,
+    SHAPE_HEADER,
+    VECTORS_JSON_MEDIA_TYPE,
+    EncodedVectors,
+    decode_vectors,
+    from_bytes,
+    parse_shape,
+    VectorDtype,
+)
+
+EMBEDDINGS = [[0.25, -0.5, 1.0], [0.0, 0.125, -1.0]]
+
+
+class FakeEmbeddingsService(EmbeddingsService):
+    def embed_documents(self, documents: list[str]) -> list[list[float]]:
+        return EMBEDDINGS[: len(documents)]
+
+
+@pytest.fixture()
+def client() -> TestClient:
+    app = FastAPI()
+    app.include_router(EmbeddingsRouter(FakeEmbeddingsService()).get_router())
+    return TestClient(app)
+
+
+BODY = {"documents": ["a", "b"]}
+
+
+def test_json_floats_by_default(client: TestClient):
+    response = client.post("/embeddings/embedding-for-documents", json=BODY)
+
+    assert response.json() == {"response": EMBEDDINGS}
+
+
+def test_base64_json(client: TestClient):
+    response = client.post(
+        "/embeddings/embedding-for-documents",
+        json=BODY,
+        headers={"accept": f"{VECTORS_JSON_MEDIA_TYPE}; dtype=float16"},
+    )
+
+    assert response.headers["content-type"] == VECTORS_JSON_MEDIA_TYPE
+    encoded = EncodedVectors.parse_obj(response.json()["response"])
+    assert encoded.dtype == VectorDtype.float16
+    assert len(base64.b64decode(encoded.data)) == 2 * 3 * 2
+    np.testing.assert_array_equal(decode_vectors(encoded), EMBEDDINGS)
+
+
+def test_raw_buffer(client: TestClient):
+    response = client.post(
+        "/embeddings/embedding-for-documents",
+        json=BODY,
+        headers={"accept": "application/octet-stream"},
+    )
+
+    dtype = VectorDtype(response.headers[DTYPE_HEADER])
+    shape = parse_shape(response.headers[SHAPE_HEADER])
+    np.testing.assert_array_equal(
+        from_bytes(response.content, dtype, shape), EMBEDDINGS
+    )
+
+
+def test_accept_lists_several_media_types(client: TestClient):
+    response = client.post(
+        "/embeddings/embedding-for-documents",
+        json=BODY,
+        headers={
+            "accept": f"application/json;q=0.5, {VECTORS_JSON_MEDIA_TYPE};dtype=int8",
+        },
+    )
+
+    assert response.headers["content-type"] == VECTORS_JSON_MEDIA_TYPE
+    encoded = EncodedVectors.parse_obj(response.json()["response"])
+    assert encoded.dtype == VectorDtype.int8
+
+
+def test_unknown_dtype(client: TestClient):
+    response = client.post(
+        "/embeddings/embedding-for-documents",
+        json=BODY,
+        headers={"accept": "application/octet-stream; dtype=float64"},
+    )
+
+    assert response.status_code == 406
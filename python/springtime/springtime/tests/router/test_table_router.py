@@ -0,0 +1,127 @@
+import json
+import shutil
+from collections.abc import Iterator
+from unittest.mock import MagicMock
+
+import pandas as pd
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from springtime.excel.table_extractor import write_tables
+from springtime.excel.tables_archive import Workbook
+from springtime.routers import table_router
+from springtime.routers.table_router import TableRouter
+from springtime.services.table_analyzer import (
+    AnalyzeResponse,
+    AnalyzeResponseChunk,
+    TableAnalyzer,
+)
+
+CHUNKS = [
+    AnalyzeResponseChunk(
+        content=f"content {order}",
+        prompt="prompt",
+        html=None,
+        sheet_names=[f"Sheet {order}"],
+        order=order,
+    )
+    for order in (1, 0)
+]
+
+
+class FakeTableAnalyzer(TableAnalyzer):
+    def analyze(self, *, excel_file: Workbook) -> AnalyzeResponse:
+        return AnalyzeResponse(chunks=sorted(CHUNKS, key=lambda chunk: chunk.order))
+
+    def analyze_streaming(
+        self,
+        *,
+        excel_file: Workbook,
+    ) -> Iterator[AnalyzeResponseChunk]:
+        yield from CHUNKS
+
+
+class SheetNamesTableAnalyzer(TableAnalyzer):
+    def analyze(self, *, excel_file: Workbook) -> AnalyzeResponse:
+        return AnalyzeResponse(
+            chunks=[
+                AnalyzeResponseChunk(
+                    content=type(excel_file).__name__,
+                    prompt="prompt",
+                    html=None,
+                    sheet_names=excel_file.sheet_names,
+                    order=0,
+                ),
+            ],
+        )
+
+    def analyze_streaming(
+        self,
+        *,
+        excel_file: Workbook,
+    ) -> Iterator[AnalyzeResponseChunk]:
+        yield from self.analyze(excel_file=excel_file).chunks
+
+
+@pytest.fixture()
+def client(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(table_router, "open_workbook", MagicMock())
+    object_store = MagicMock()
+    object_store.exists.return_value = False
+    app = FastAPI()
+    app.include_router(TableRouter(FakeTableAnalyzer(), object_store).get_router())
+    return TestClient(app)
+
+
+REQUEST = {"bucket": "bucket", "object_path": "file.xlsx"}
+
+
+def test_analyze_claude_streaming(client: TestClient):
+    response = client.post("/excel/analyze-claude-streaming", json=REQUEST)
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["order"] for line in lines] == [1, 0]
+
+
+def test_analyze_claude(client: TestClient):
+    response = client.post("/excel/analyze-claude", json=REQUEST)
+
+    assert [chunk["order"] for chunk in response.json()["chunks"]] == [0, 1]
+
+
+def test_analyze_claude_loads_the_tables_archive(tmp_path):
+    file_name = tmp_path / "tables.xlsx"
+    archive_name = tmp_path / "tables.tables.zip"
+    tables = [pd.DataFrame({"value": [index]}) for index in range(3)]
+    write_tables(str(file_name), iter(tables), archive_name=str(archive_name))
+    stored = {"prefix/file.xlsx": file_name, "prefix/file.tables.zip": archive_name}
+
+    object_store = MagicMock()
+    object_store.exists.side_effect = lambda bucket, path: path in stored
+    object_store.download_to_filename.side_effect = (
+        lambda bucket, path, file_name: shutil.copy(stored[path], file_name)
+    )
+    app = FastAPI()
+    app.include_router(
+        TableRouter(SheetNamesTableAnalyzer(), object_store).get_router(),
+    )
+    client = TestClient(app)
+
+    response = client.post(
+        "/excel/analyze-claude",
+        json={"bucket": "bucket", "object_path": "prefix/file.xlsx"},
+    )
+    [chunk] = response.json()["chunks"]
+    assert chunk["content"] == "TablesArchive"
+    assert chunk["sheet_names"] == ["Sheet 0", "Sheet 1", "Sheet 2"]
+
+    del stored["prefix/file.tables.zip"]
+    response = client.post(
+        "/excel/analyze-claude",
+        json={"bucket": "bucket", "object_path": "prefix/file.xlsx"},
+    )
+    [chunk] = response.json()["chunks"]
+    assert chunk["content"] == "XlsxWorkbook"
+    assert chunk["sheet_names"] == ["Sheet 0", "Sheet 1", "Sheet 2"]
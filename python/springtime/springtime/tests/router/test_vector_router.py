@@ -0,0 +1,145 @@
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from springtime.routers.vector_router import VectorRouter
+from springtime.services.vector_codec import (
+    VECTORS_JSON_MEDIA_TYPE,
+    VectorDtype,
+    encode_vectors,
+)
+from springtime.services.local_vector_service import LocalVectorService
+from springtime.services.vector_service import (
+    SimilarityQuery,
+    UpsertVector,
+    VectorResult,
+    VectorService,
+)
+
+DIMENSION = 4
+
+
+@pytest.fixture()
+def vector_service() -> LocalVectorService:
+    service = LocalVectorService(dimension=DIMENSION)
+    service.upsert(
+        [
+            UpsertVector(
+                id=f"chunk-{idx}",
+                vector=[1.0, idx, idx % 3, 1.0],
+                metadata={"fileReferenceId": f"f{idx % 2}"},
+            )
+            for idx in range(20)
+        ],
+    )
+    return service
+
+
+def make_client(vector_service: VectorService) -> TestClient:
+    app = FastAPI()
+    app.include_router(VectorRouter(vector_service).get_router())
+    return TestClient(app)
+
+
+def test_similar_vectors_batch(vector_service: LocalVectorService):
+    queries = [
+        {"vector": [1.0, 3.0, 0.0, 1.0], "metadata": {"fileReferenceId": "f0"}},
+        {"vector": [1.0, 3.0, 0.0, 1.0], "metadata": {}, "top_k": 3},
+        {"vector": [0.0, 1.0, 2.0, 0.0], "metadata": {"fileReferenceId": "f0"}},
+    ]
+
+    response = make_client(vector_service).post(
+        "/vector/similar-vectors-batch",
+        json={"queries": queries},
+    )
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [len(group) for group in results] == [10, 3, 10]
+    for query, group in zip(queries, results, strict=True):
+        expected = vector_service.get_similar(
+            query["vector"],
+            query["metadata"],
+            query.get("top_k", 10),
+        )
+        assert [result["id"] for result in group] == [result.id for result in expected]
+        assert [result["score"] for result in group] == pytest.approx(
+            [result.score for result in expected],
+        )
+
+
+def test_default_get_similar_many_runs_every_query(
+    vector_service: LocalVectorService,
+):
+    queries = [
+        SimilarityQuery(vector=[1.0, idx, 0.0, 1.0], top_k=idx + 1) for idx in range(5)
+    ]
+
+    def ids(groups: list[list[VectorResult]]) -> list[list[str]]:
+        return [[result.id for result in group] for group in groups]
+
+    assert ids(VectorService.get_similar_many(vector_service, queries)) == ids(
+        vector_service.get_similar_many(queries),
+    )
+
+
+def test_similar_vectors_top_k(vector_service: LocalVectorService):
+    client = make_client(vector_service)
+    body = {"vector": [1.0, 3.0, 0.0, 1.0], "metadata": {}}
+
+    assert (
+        len(client.post("/vector/similar-vectors", json=body).json()["results"]) == 10
+    )
+    body["top_k"] = 2
+    assert len(client.post("/vector/similar-vectors", json=body).json()["results"]) == 2
+    body["top_k"] = 0
+    assert client.post("/vector/similar-vectors", json=body).status_code == 422
+
+
+@pytest.mark.parametrize("dtype", list(VectorDtype))
+def test_upsert_encoded_vectors(dtype: VectorDtype):
+    service = LocalVectorService(dimension=DIMENSION)
+    matrix = np.random.default_rng(0).normal(size=(3, DIMENSION))
+    body = {
+        "ids": ["a", "b", "c"],
+        "vectors": encode_vectors(matrix, dtype).dict(),
+        "metadata": [{"projectId": "p1"}] * 3,
+    }
+
+    response = make_client(service).put(
+        "/vector/upsert-vectors",
+        json=body,
+        headers={"content-type": VECTORS_JSON_MEDIA_TYPE},
+    )
+
+    assert response.json() == {"upsert_count": 3}
+    [best, *_] = service.get_similar(matrix[1].tolist(), {"projectId": "p1"})
+    assert best.id == "b"
+
+
+def test_upsert_rejects_mismatched_encoded_vectors():
+    service = LocalVectorService(dimension=DIMENSION)
+    body = {
+        "ids": ["a"],
+        "vectors": encode_vectors(np.ones((2, DIMENSION)), VectorDtype.float16).dict(),
+    }
+
+    response = make_client(service).put(
+        "/vector/upsert-vectors",
+        json=body,
+        headers={"content-type": VECTORS_JSON_MEDIA_TYPE},
+    )
+
+    assert response.status_code == 422
+    assert len(service) == 0
+
+
+def test_upsert_json_vectors():
+    service = LocalVectorService(dimension=DIMENSION)
+    body = {"vectors": [{"id": "a", "vector": [1, 0, 0, 0]}]}
+
+    response = make_client(service).put("/vector/upsert-vectors", json=body)
+
+    assert response.json() == {"upsert_count": 1}
+    assert len(service) == 1
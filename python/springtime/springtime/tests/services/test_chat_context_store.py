@@ -0,0 +1,76 @@
+import os
+import tempfile
+
+import pytest
+
+from springtime.models.chat import ChatChunkContext, ChatFileContext
+from springtime.services.chat_context_store import ChatContextStore
+
+
+def file(name: str, *contents: str) -> ChatFileContext:
+    return ChatFileContext(
+        file_name=name,
+        chunks=[
+            ChatChunkContext(order=order, content=content, location=None)
+            for order, content in enumerate(contents)
+        ],
+    )
+
+
+FILES = [file("fileA", "a0", "a1"), file("fileB", "b0")]
+
+
+def test_resolves_all_chunks_of_a_context():
+    store = ChatContextStore()
+    context_id, _ = store.register(FILES)
+
+    assert store.resolve(context_id) == FILES
+    assert store.register(FILES)[0] == context_id
+
+
+def test_resolves_chunks_in_the_requested_order():
+    store = ChatContextStore()
+    context_id, stored = store.register(FILES)
+    a0, a1, b0 = stored.chunks
+
+    files = store.resolve(context_id, [b0, a1, a0])
+
+    assert [(file.file_name, [c.content for c in file.chunks]) for file in files] == [
+        ("fileB", ["b0"]),
+        ("fileA", ["a1", "a0"]),
+    ]
+    with pytest.raises(KeyError):
+        store.resolve(context_id, ["unknown"])
+
+
+def test_unknown_context():
+    store = ChatContextStore()
+
+    assert store.resolve("unknown") is None
+    assert store.stats().misses == 1
+
+
+def test_evicts_by_size():
+    store = ChatContextStore(max_bytes=20)
+    first, _ = store.register([file("fileA", "x" * 10)])
+    second, _ = store.register([file("fileB", "y" * 10)])
+
+    assert store.resolve(first) is None
+    assert store.resolve(second) is not None
+    assert store.stats().bytes == 15
+
+
+def test_spills_evicted_contexts_to_disk():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "contexts.sqlite")
+        store = ChatContextStore(max_bytes=20, path=path)
+        first, stored = store.register([file("fileA", "x" * 10)])
+        store.register([file("fileB", "y" * 10)])
+
+        assert store.resolve(first, list(stored.chunks)) == [file("fileA", "x" * 10)]
+        assert store.stats().disk_hits == 1
+
+        # the second context was spilled when the first was read back
+        restarted = ChatContextStore(max_bytes=20, path=path)
+        assert restarted.resolve(first) == [file("fileA", "x" * 10)]
+        assert restarted.stats().disk_hits == 1
@@ -0,0 +1,170 @@
+import asyncio
+import os
+import tempfile
+import threading
+from unittest.mock import MagicMock
+
+from springtime.services.completion_cache import CompletionCache, CompletionKey
+from springtime.services.excel_analyzer import ClaudeExcelAnalyzer
+from springtime.services.sheet_processor import (
+    PreprocessedSheet,
+    SheetStats,
+    StringifiedSheet,
+)
+
+
+class Counter:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def __call__(self) -> str:
+        self.calls += 1
+        return f"completion {self.calls}"
+
+
+def key(prompt: str, temperature: float | None = 0) -> CompletionKey:
+    return CompletionKey(model="model", prompt=prompt, temperature=temperature)
+
+
+def test_caches_deterministic_completions():
+    cache = CompletionCache()
+    create = Counter()
+
+    assert cache.get_or_create(key("a"), create) == "completion 1"
+    assert cache.get_or_create(key("a"), create) == "completion 1"
+    assert cache.get_or_create(key("b"), create) == "completion 2"
+
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.bypassed) == (1, 2, 0)
+
+
+def test_bypasses_non_deterministic_completions():
+    cache = CompletionCache()
+    create = Counter()
+
+    cache.get_or_create(key("a", temperature=0.5), create)
+    cache.get_or_create(key("a", temperature=None), create)
+
+    assert create.calls == 2
+    assert cache.stats().bypassed == 2
+
+
+def test_params_are_part_of_the_key():
+    cache = CompletionCache()
+    create = Counter()
+
+    cache.get_or_create(key("a")._replace(params={"max_tokens": 1}), create)
+    cache.get_or_create(key("a")._replace(params={"max_tokens": 2}), create)
+
+    assert create.calls == 2
+
+
+def test_memory_tier_is_bounded_and_expires():
+    cache = CompletionCache(maxsize=1)
+    create = Counter()
+    cache.get_or_create(key("a"), create)
+    cache.get_or_create(key("b"), create)
+    cache.get_or_create(key("a"), create)
+    assert create.calls == 3
+
+    cache = CompletionCache(ttl=0)
+    create = Counter()
+    cache.get_or_create(key("a"), create)
+    cache.get_or_create(key("a"), create)
+    assert create.calls == 2
+
+
+def test_disk_tier_survives_restarts():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "completions.sqlite")
+        create = Counter()
+
+        CompletionCache(path=path).get_or_create(key("a"), create)
+        cache = CompletionCache(path=path)
+
+        assert cache.get_or_create(key("a"), create) == "completion 1"
+        assert create.calls == 1
+        assert cache.stats().disk_hits == 1
+
+
+def test_async_disk_tier_runs_off_the_event_loop():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "completions.sqlite")
+        create = Counter()
+        CompletionCache(path=path).get_or_create(key("a"), create)
+        cache = CompletionCache(path=path)
+        assert cache.disk
+        threads: list[int] = []
+        get = cache.disk.get
+
+        def recording_get(digest: str) -> str | None:
+            threads.append(threading.get_ident())
+            return get(digest)
+
+        cache.disk.get = recording_get
+
+        async def acreate() -> str:
+            return create()
+
+        async def main() -> tuple[str, int]:
+            value = await cache.aget_or_create(key("a"), acreate)
+            return value, threading.get_ident()
+
+        value, loop_thread = asyncio.run(main())
+
+        assert value == "completion 1"
+        assert create.calls == 1
+        assert threads
+        assert loop_thread not in threads
+
+
+def test_disk_tier_is_bounded():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "completions.sqlite")
+        create = Counter()
+
+        CompletionCache(maxsize=0, path=path, max_disk_entries=1).get_or_create(
+            key("a"),
+            create,
+        )
+        cache = CompletionCache(maxsize=0, path=path, max_disk_entries=1)
+        cache.get_or_create(key("b"), create)
+        cache.get_or_create(key("a"), create)
+
+        assert create.calls == 3
+
+
+SHEET = PreprocessedSheet(
+    sheet_name="Sheet 0",
+    index=0,
+    stringified_sheet=StringifiedSheet("a,b\n1,2\n", 8, was_truncated=False),
+    stats=SheetStats(rows=1, columns=2),
+)
+
+
+def test_claude_completions_are_cached_at_temperature_0():
+    anthropic = MagicMock()
+    anthropic.completions.create.return_value.completion = "analysis"
+    analyzer = ClaudeExcelAnalyzer(anthropic, CompletionCache(), temperature=0)
+
+    for _ in range(2):
+        assert analyzer.analyze(sheets=[SHEET]).content == "analysis"
+
+    anthropic.completions.create.assert_called_once()
+    assert anthropic.completions.create.call_args.kwargs["temperature"] == 0
+
+
+def test_claude_completions_at_other_temperatures_skip_the_cache():
+    for temperature in (None, 0.7):
+        anthropic = MagicMock()
+        anthropic.completions.create.return_value.completion = "analysis"
+        cache = CompletionCache()
+        analyzer = ClaudeExcelAnalyzer(anthropic, cache, temperature=temperature)
+
+        for _ in range(2):
+            assert analyzer.analyze(sheets=[SHEET]).content == "analysis"
+
+        assert anthropic.completions.create.call_count == 2
+        assert cache.stats().bypassed == 2
+        kwargs = anthropic.completions.create.call_args.kwargs
+        assert kwargs.get("temperature") == temperature
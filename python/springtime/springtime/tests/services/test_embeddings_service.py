@@ -0,0 +1,108 @@
+import os
+import tempfile
+import threading
+import time
+
+import pytest
+
+from springtime.services.embedding_cache import EmbeddingCache, SqliteEmbeddingStore
+from springtime.services.embeddings_service import OpenAIEmbeddingsService
+
+
+class FakeEmbeddingsService(OpenAIEmbeddingsService):
+    def __init__(self, **kwargs) -> None:
+        super().__init__(count_tokens=self.count_words, **kwargs)
+        self.batches_sent: list[list[str]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def count_words(texts: list[str]) -> list[int]:
+        return [len(text.split()) for text in texts]
+
+    def embed_batch(self, batch: list[tuple[str, str]]) -> list[list[float]]:
+        with self._lock:
+            self.batches_sent.append([text for _, text in batch])
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.05)
+        with self._lock:
+            self.in_flight -= 1
+        return [[float(len(text)), 1.0] for _, text in batch]
+
+
+def test_deduplicates_and_preserves_order():
+    service = FakeEmbeddingsService()
+    documents = ["disclaimer", "a", "disclaimer", "bb", "a"]
+
+    assert service.embed_documents(documents) == [
+        [10.0, 1.0],
+        [1.0, 1.0],
+        [10.0, 1.0],
+        [2.0, 1.0],
+        [1.0, 1.0],
+    ]
+    assert sorted(text for batch in service.batches_sent for text in batch) == [
+        "a",
+        "bb",
+        "disclaimer",
+    ]
+
+
+def test_splits_batches_by_tokens_and_runs_them_concurrently():
+    service = FakeEmbeddingsService(max_batch_tokens=4, max_concurrency=4)
+    documents = [f"word {idx}" for idx in range(8)]
+
+    embeddings = service.embed_documents(documents)
+
+    assert embeddings == [[float(len(document)), 1.0] for document in documents]
+    assert [len(batch) for batch in service.batches_sent] == [2, 2, 2, 2]
+    assert service.max_in_flight > 1
+
+
+def test_splits_batches_by_size():
+    service = FakeEmbeddingsService(max_batch_size=3)
+    service.embed_documents([str(idx) for idx in range(7)])
+
+    assert sorted(len(batch) for batch in service.batches_sent) == [1, 3, 3]
+
+
+@pytest.mark.parametrize("persist", [False, True])
+def test_serves_repeats_from_cache(persist: bool):
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        path = os.path.join(tmpdirname, "embeddings.sqlite") if persist else None
+        service = FakeEmbeddingsService(cache=EmbeddingCache(path=path))
+        service.embed_documents(["a", "b"])
+
+        if persist:
+            # a fresh process only has the disk tier
+            service = FakeEmbeddingsService(cache=EmbeddingCache(path=path))
+        assert service.embed_documents(["b", "c", "a"]) == [
+            [1.0, 1.0],
+            [1.0, 1.0],
+            [1.0, 1.0],
+        ]
+
+        assert service.batches_sent[-1] == ["c"]
+        stats = service.cache.stats()
+        assert stats.hits + stats.disk_hits == 2
+        assert stats.disk_hits == (2 if persist else 0)
+
+
+def test_disk_store_keeps_the_most_recent_entries():
+    with tempfile.TemporaryDirectory() as tmpdirname:
+        path = os.path.join(tmpdirname, "embeddings.sqlite")
+        store = SqliteEmbeddingStore(path, max_entries=3)
+        store.set_many({"a": [1.0], "b": [2.0]})
+        store.set_many({"b": [3.0], "c": [4.0]})
+        assert store.get_many(["a", "c"]) == {"a": [1.0], "c": [4.0]}
+        store.set_many({"d": [5.0]})
+
+        store = SqliteEmbeddingStore(path, max_entries=3)
+        keys = [str(idx) for idx in range(2000)]
+        assert store.get_many([*keys, "a", "b", "c", "d"]) == {
+            "a": [1.0],
+            "c": [4.0],
+            "d": [5.0],
+        }
@@ -0,0 +1,153 @@
+import tempfile
+from unittest.mock import patch
+
+import numpy as np
+
+from springtime.services import ivf_vector_service
+from springtime.services.ivf_vector_service import IVFVectorService, spherical_kmeans
+from springtime.services.local_vector_service import LocalVectorService
+from springtime.services.vector_service import SimilarityQuery, UpsertVector
+
+DIMENSION = 32
+
+
+def make_vectors(count: int, offset: int = 0, seed: int = 0) -> list[UpsertVector]:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(20, DIMENSION))
+    return [
+        UpsertVector(
+            id=f"chunk-{idx}",
+            vector=(centers[idx % 20] + 0.3 * rng.normal(size=DIMENSION)).tolist(),
+            metadata={"projectId": f"p{idx % 5}"},
+        )
+        for idx in range(offset, offset + count)
+    ]
+
+
+def recall(
+    exact: LocalVectorService,
+    approximate: IVFVectorService,
+    metadata: dict,
+    n_probe: int,
+) -> float:
+    queries = np.random.default_rng(1).normal(size=(20, DIMENSION))
+    found = 0
+    for query in queries:
+        expected = {r.id for r in exact.search(query, metadata, 10)}
+        actual = {
+            r.id for r in approximate.get_similar(query.tolist(), metadata, 10, n_probe)
+        }
+        found += len(expected & actual)
+    return found / (10 * len(queries))
+
+
+def test_exact_until_trained_then_approximate():
+    vectors = make_vectors(2000)
+    exact = LocalVectorService(dimension=DIMENSION)
+    exact.upsert(vectors)
+    ivf = IVFVectorService(dimension=DIMENSION, train_size=1000, n_lists=20)
+
+    ivf.upsert(vectors[:500])
+    assert ivf.centroids is None
+    ivf.upsert(vectors[500:])
+    assert ivf.centroids is not None
+
+    assert recall(exact, ivf, {}, n_probe=20) == 1.0
+    assert recall(exact, ivf, {}, n_probe=1) <= recall(exact, ivf, {}, n_probe=4)
+    assert recall(exact, ivf, {}, n_probe=4) > 0.8
+
+
+def test_n_probe_is_set_per_query():
+    vectors = make_vectors(2000)
+    exact = LocalVectorService(dimension=DIMENSION)
+    exact.upsert(vectors)
+    ivf = IVFVectorService(dimension=DIMENSION, train_size=1000, n_lists=40, n_probe=1)
+    ivf.upsert(vectors)
+    queries = np.random.default_rng(1).normal(size=(20, DIMENSION))
+    expected = [{r.id for r in exact.search(query, {}, 10)} for query in queries]
+
+    def batch_recall(n_probe: int | None) -> float:
+        results = ivf.get_similar_many(
+            [
+                SimilarityQuery(vector=query.tolist(), top_k=10, n_probe=n_probe)
+                for query in queries
+            ],
+        )
+        found = sum(
+            len(ids & {r.id for r in found})
+            for ids, found in zip(expected, results, strict=True)
+        )
+        return found / (10 * len(queries))
+
+    recalls = [batch_recall(n_probe) for n_probe in (1, 4, 40)]
+    assert recalls[0] < recalls[1] < recalls[2] == 1.0
+    # None falls back to the index's n_probe
+    assert batch_recall(None) == recalls[0]
+    assert ivf.n_probe == 1
+
+
+def test_incremental_inserts_and_filters():
+    ivf = IVFVectorService(dimension=DIMENSION, train_size=1000, n_lists=20)
+    ivf.upsert(make_vectors(1000))
+    ivf.upsert(make_vectors(500, offset=1000, seed=1))
+    exact = LocalVectorService(dimension=DIMENSION)
+    exact.upsert(make_vectors(1000) + make_vectors(500, offset=1000, seed=1))
+
+    assert ivf.trained_on == 1000
+    assert sum(len(rows) for rows in ivf._lists) == 1500
+    # a selective filter still fills top_k by probing more lists
+    results = ivf.search(np.ones(DIMENSION), {"projectId": "p3"}, 10, n_probe=1)
+    assert len(results) == 10
+    assert all(result.metadata["projectId"] == "p3" for result in results)
+    assert recall(exact, ivf, {"projectId": "p3"}, n_probe=20) == 1.0
+
+
+def test_replacing_a_vector_moves_it_between_lists():
+    ivf = IVFVectorService(dimension=DIMENSION, train_size=100, n_lists=10)
+    ivf.upsert(make_vectors(200))
+    moved = UpsertVector(id="chunk-0", vector=make_vectors(2)[1].vector)
+    ivf.upsert([moved])
+
+    assert sum(len(rows) for rows in ivf._lists) == 200
+    [best] = ivf.search(np.asarray(moved.vector), {}, 1, n_probe=1)
+    assert best.id in {"chunk-0", "chunk-1"}
+
+
+def test_persists_centroids():
+    with tempfile.TemporaryDirectory() as path:
+        ivf = IVFVectorService(
+            dimension=DIMENSION,
+            path=path,
+            train_size=100,
+            n_lists=10,
+        )
+        ivf.upsert(make_vectors(300))
+        query = np.ones(DIMENSION)
+
+        reloaded = IVFVectorService(dimension=DIMENSION, path=path, train_size=100)
+        np.testing.assert_array_equal(reloaded.centroids, ivf.centroids)
+        assert reloaded.search(query, {}, 10) == ivf.search(query, {}, 10)
+
+
+def test_trains_outside_the_lock():
+    ivf = IVFVectorService(dimension=DIMENSION, train_size=1000, n_lists=20)
+    ivf.upsert(make_vectors(999))
+    late = make_vectors(100, offset=1000, seed=1)
+
+    def kmeans(*args: object, **kwargs: object) -> np.ndarray:
+        # searches and upserts go on while the centroids are trained
+        assert not ivf._lock.locked()
+        ivf.upsert(late)
+        ivf.upsert([UpsertVector(id="chunk-0", vector=late[0].vector)])
+        return spherical_kmeans(*args, **kwargs)
+
+    with patch.object(ivf_vector_service, "spherical_kmeans", kmeans):
+        ivf.upsert(make_vectors(1, offset=999))
+
+    assert ivf.trained_on == 1000
+    assert len(ivf) == 1100
+    assert sorted(row for rows in ivf._lists for row in rows) == list(range(1100))
+    assert {r.id for r in ivf.search(np.asarray(late[0].vector), {}, 2, 1)} == {
+        "chunk-0",
+        "chunk-1000",
+    }
@@ -0,0 +1,199 @@
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from springtime.services.local_vector_service import (
+    RECORDS_FILE,
+    VECTORS_FILE,
+    LocalVectorService,
+)
+from springtime.services.metadata_filter import MISSING, filter_mask, matches
+from springtime.services.vector_service import UpsertVector
+
+DIMENSION = 16
+
+
+def make_vectors(count: int, seed: int = 0) -> list[UpsertVector]:
+    rng = np.random.default_rng(seed)
+    return [
+        UpsertVector(
+            id=f"chunk-{idx}",
+            vector=rng.normal(size=DIMENSION).tolist(),
+            metadata={"projectId": f"p{idx % 3}", "fileReferenceId": f"f{idx % 7}"},
+        )
+        for idx in range(count)
+    ]
+
+
+def brute_force(
+    vectors: list[UpsertVector],
+    query: list[float],
+    metadata: dict,
+    top_k: int = 10,
+) -> list[str]:
+    def cosine(vector: list[float]) -> float:
+        return float(
+            np.dot(vector, query) / (np.linalg.norm(vector) * np.linalg.norm(query)),
+        )
+
+    candidates = [v for v in vectors if matches(metadata, v.metadata)]
+    return [v.id for v in sorted(candidates, key=lambda v: -cosine(v.vector))][:top_k]
+
+
+@pytest.mark.parametrize(
+    "metadata",
+    [
+        {},
+        {"projectId": "p1"},
+        {"fileReferenceId": {"$in": ["f1", "f2"]}},
+        {"$or": [{"projectId": "p0"}, {"fileReferenceId": "f3"}]},
+        {"projectId": {"$ne": "p0"}, "fileReferenceId": {"$nin": ["f1"]}},
+    ],
+)
+def test_get_similar_matches_brute_force(metadata: dict):
+    vectors = make_vectors(200)
+    service = LocalVectorService(dimension=DIMENSION)
+    service.upsert(vectors)
+    query = np.random.default_rng(1).normal(size=DIMENSION).tolist()
+
+    results = service.get_similar(query, metadata)
+
+    assert [result.id for result in results] == brute_force(vectors, query, metadata)
+    assert all(matches(metadata, result.metadata) for result in results)
+    assert [r.score for r in results] == sorted(
+        (r.score for r in results),
+        reverse=True,
+    )
+
+
+def test_upsert_replaces_by_id():
+    service = LocalVectorService(dimension=DIMENSION)
+    service.upsert(make_vectors(5))
+    replacement = UpsertVector(
+        id="chunk-0",
+        vector=[1.0] + [0.0] * (DIMENSION - 1),
+        metadata={"projectId": "other"},
+    )
+    service.upsert([replacement])
+
+    [result] = service.get_similar(replacement.vector, {"projectId": "other"})
+    assert len(service) == 5
+    assert result.id == "chunk-0"
+    assert result.score == pytest.approx(1.0)
+
+
+def test_persists_and_reloads():
+    vectors = make_vectors(50)
+    query = vectors[7].vector
+    with tempfile.TemporaryDirectory() as path:
+        service = LocalVectorService(dimension=DIMENSION, path=path)
+        service.upsert(vectors)
+        expected = service.get_similar(query, {"projectId": "p1"})
+
+        reloaded = LocalVectorService(dimension=DIMENSION, path=path)
+        assert reloaded.get_similar(query, {"projectId": "p1"}) == expected
+
+        # the memory mapped matrix is copied before it is written to
+        reloaded.upsert(make_vectors(60, seed=2)[50:])
+        assert len(reloaded) == 60
+
+
+def test_upserts_append_and_reload_the_last_row_of_an_id():
+    vectors = make_vectors(20)
+    with tempfile.TemporaryDirectory() as path:
+        service = LocalVectorService(dimension=DIMENSION, path=path)
+        service.upsert(vectors)
+        vectors_size = os.path.getsize(os.path.join(path, VECTORS_FILE))
+        replacement = UpsertVector(
+            id="chunk-3",
+            vector=vectors[4].vector,
+            metadata={"projectId": "moved"},
+        )
+        service.upsert([replacement])
+
+        # only the upserted row is written
+        assert (
+            os.path.getsize(os.path.join(path, VECTORS_FILE)) == vectors_size * 21 // 20
+        )
+        reloaded = LocalVectorService(dimension=DIMENSION, path=path)
+        assert len(reloaded) == 20
+        [result] = reloaded.get_similar(replacement.vector, {"projectId": "moved"})
+        assert result.id == "chunk-3"
+        assert result.score == pytest.approx(1.0)
+
+        reloaded.save()
+        assert os.path.getsize(os.path.join(path, VECTORS_FILE)) == vectors_size
+        compacted = LocalVectorService(dimension=DIMENSION, path=path)
+        assert compacted.get_similar(vectors[0].vector, {}) == reloaded.get_similar(
+            vectors[0].vector,
+            {},
+        )
+
+
+def test_load_drops_an_append_cut_short():
+    vectors = make_vectors(10)
+    with tempfile.TemporaryDirectory() as path:
+        LocalVectorService(dimension=DIMENSION, path=path).upsert(vectors)
+        with Path(path, VECTORS_FILE).open("ab") as f:
+            f.write(b"\0" * (4 * DIMENSION + 3))
+        with Path(path, RECORDS_FILE).open("a") as f:
+            f.write('["chunk-10", {"projectId": ')
+
+        reloaded = LocalVectorService(dimension=DIMENSION, path=path)
+        assert len(reloaded) == 10
+        reloaded.upsert(make_vectors(11)[10:])
+        assert len(LocalVectorService(dimension=DIMENSION, path=path)) == 11
+
+
+def test_upsert_updates_cached_filter_columns():
+    service = LocalVectorService(dimension=DIMENSION)
+    service.upsert(make_vectors(30))
+    query = np.ones(DIMENSION, dtype=np.float32)
+    assert len(service.search(query, {"projectId": "p0"}, 100)) == 10
+
+    # the longer id no longer fits the cached column
+    service.upsert_arrays(
+        ["chunk-0", "chunk-30", "chunk-31"],
+        np.ones((3, DIMENSION)),
+        [
+            {"projectId": "a much longer project id"},
+            {"projectId": "p0"},
+            {"fileReferenceId": "f1"},
+        ],
+    )
+
+    def ids(metadata: dict) -> set[str]:
+        return {r.id for r in service.search(query, metadata, 100)}
+
+    assert ids({"projectId": "a much longer project id"}) == {"chunk-0"}
+    p0 = {f"chunk-{idx}" for idx in range(3, 30, 3)}
+    assert ids({"projectId": "p0"}) == p0 | {"chunk-30"}
+    assert ids({"projectId": {"$exists": False}}) == {"chunk-31"}
+
+
+def test_filter_mask_matches_row_by_row_filter():
+    rows = [
+        {"projectId": "p1", "tags": ["a", "b"], "pages": 3},
+        {"projectId": "p2", "tags": ["c"]},
+        {"pages": 10},
+    ]
+    filters = [
+        {"tags": "a"},
+        {"tags": {"$nin": ["c"]}},
+        {"pages": {"$gte": 3}},
+        {"projectId": {"$exists": False}},
+        {"$and": [{"projectId": {"$in": ["p1", "p2"]}}, {"pages": {"$lt": 5}}]},
+    ]
+
+    def column(key: str) -> np.ndarray:
+        values = np.empty(len(rows), dtype=object)
+        values[:] = [row.get(key, MISSING) for row in rows]
+        return values
+
+    for metadata_filter in filters:
+        mask = filter_mask(metadata_filter, column, len(rows))
+        assert mask.tolist() == [matches(metadata_filter, row) for row in rows]
+    assert filter_mask({"tags": "a"}, column, 3).tolist() == [True, False, False]
@@ -0,0 +1,204 @@
+import random
+import re
+
+import pytest
+
+from springtime.models.chat import (
+    ChatChunkContext,
+    ChatFileContext,
+    ChatHistory,
+    RangeLocation,
+    SingleLocation,
+)
+from springtime.routers.token_length_service import TokenCounter
+from springtime.services.prompt import (
+    create_budgeted_prompt,
+    create_prompt,
+    create_prompt_for_context,
+    create_prompt_for_histories,
+    normalized_content,
+)
+
+
+def count_words(texts: list[str]) -> list[int]:
+    return [len(text.split()) for text in texts]
+
+
+def chunk(order: int, words: int) -> ChatChunkContext:
+    return ChatChunkContext(
+        order=order,
+        content=" ".join([f"chunk{order}"] * words),
+        location=SingleLocation(type="single", page=order),
+    )
+
+
+CONTEXT = [
+    ChatFileContext(file_name="fileA", chunks=[chunk(2, 100), chunk(0, 100)]),
+    ChatFileContext(file_name="fileB", chunks=[chunk(1, 100), chunk(3, 10)]),
+]
+HISTORY = [
+    ChatHistory(
+        question=" ".join([f"question{idx}"] * 30),
+        answer=" ".join(["answer"] * 50),
+    )
+    for idx in range(5)
+]
+
+
+def budgeted(max_tokens: int, context=CONTEXT, history=HISTORY):
+    return create_budgeted_prompt(
+        context,
+        "what is the revenue?",
+        history,
+        max_tokens,
+        TokenCounter(count_words),
+    )
+
+
+def test_identical_to_create_prompt_when_everything_fits():
+    result = budgeted(10_000)
+
+    assert result.prompt == create_prompt(CONTEXT, "what is the revenue?", HISTORY)
+    assert result.dropped_chunks == []
+    assert result.dropped_history == 0
+    assert result.tokens == len(result.prompt.split())
+
+
+def test_drops_the_least_relevant_chunks_first():
+    everything = budgeted(10_000).tokens
+
+    result = budgeted(everything - 150)
+
+    assert [
+        (dropped.file_name, dropped.order) for dropped in result.dropped_chunks
+    ] == [
+        ("fileA", 2),
+    ]
+    assert result.tokens <= everything - 150
+    assert "chunk0" in result.prompt
+    assert "chunk3" in result.prompt
+    assert "chunk2" not in result.prompt
+
+
+def test_drops_older_history_after_the_chunks():
+    everything = budgeted(10_000).tokens
+
+    result = budgeted(everything - 40)
+
+    assert result.tokens <= everything - 40
+    assert result.dropped_chunks == []
+    assert result.dropped_history > 0
+    assert "question0" not in result.prompt
+    assert "question4" in result.prompt
+
+
+def test_keeps_the_question_when_nothing_else_fits():
+    result = budgeted(30)
+
+    assert len(result.dropped_chunks) == 4
+    assert result.dropped_history == len(HISTORY)
+    assert result.prompt == "Human: what is the revenue?\nAI:"
+
+
+def test_question_longer_than_the_budget():
+    with pytest.raises(ValueError):
+        budgeted(2)
+
+
+def test_drops_history_when_the_whole_prompt_counts_more_than_its_parts():
+    def count_with_overhead(texts: list[str]) -> list[int]:
+        # the assembled prompt costs 40 tokens more than its parts
+        return [
+            count + (40 if text.endswith("\nAI:") else 0)
+            for count, text in zip(count_words(texts), texts, strict=True)
+        ]
+
+    question = "what is the revenue?"
+    budget = len(create_prompt([], question, HISTORY[-1:]).split()) + 20
+    result = create_budgeted_prompt(
+        [],
+        question,
+        HISTORY,
+        budget,
+        TokenCounter(count_with_overhead),
+    )
+
+    assert result.tokens <= budget
+    assert result.dropped_history == len(HISTORY)
+    assert result.prompt == "Human: what is the revenue?\nAI:"
+
+    with pytest.raises(ValueError):
+        create_budgeted_prompt(
+            [],
+            question,
+            HISTORY,
+            30,
+            TokenCounter(count_with_overhead),
+        )
+
+
+def joined_sections(
+    context: list[ChatFileContext],
+    question: str,
+    history: list[ChatHistory],
+) -> str:
+    prompts = [
+        create_prompt_for_context(context),
+        create_prompt_for_histories(history),
+        f"Human: {question}",
+        "AI:",
+    ]
+    return "\n".join(prompt for prompt in prompts if prompt.strip())
+
+
+EDGE_CASES = [
+    ChatFileContext(
+        file_name="fileA ",
+        chunks=[
+            ChatChunkContext(
+                order=0,
+                content="\n\nfirst\n\n\nline  \n",
+                location=RangeLocation(type="range", start=0, end=2),
+            ),
+            ChatChunkContext(order=1, content=" \n ", location=None),
+        ],
+    ),
+    ChatFileContext(file_name="empty ", chunks=[]),
+    ChatFileContext(
+        file_name="fileB",
+        chunks=[
+            ChatChunkContext(order=2, content="no location", location=None),
+            ChatChunkContext(
+                order=3,
+                content="last\n",
+                location=SingleLocation(type="single", page=4),
+            ),
+        ],
+    ),
+]
+
+
+@pytest.mark.parametrize(
+    ("context", "history"),
+    [
+        ([], []),
+        (CONTEXT, []),
+        ([], HISTORY),
+        (CONTEXT, HISTORY),
+        (EDGE_CASES, HISTORY[:1]),
+    ],
+)
+def test_create_prompt_matches_the_joined_sections(context, history):
+    assert create_prompt(context, "q?", history) == joined_sections(
+        context,
+        "q?",
+        history,
+    )
+
+
+def test_normalized_content_collapses_newlines():
+    rng = random.Random(0)
+    for _ in range(1000):
+        content = "".join(rng.choices(["\n", " ", "a", "\t"], k=rng.randrange(12)))
+        expected = re.sub(r"\n+", "\n", content).strip()
+        assert normalized_content(content) == expected
@@ -1,8 +1,13 @@
+import asyncio
 import os
+import time
 
+import openai
 import pytest
 
+from springtime.services.rate_limit import RateLimitBackoff, RateLimitExceededError
 from springtime.services.report_service import (
+    ALL_TERMS,
     OpenAIReportService,
     ReportService,
 )
@@ -45,3 +50,112 @@ def test_generate_terms(text: str, openai_report_service: ReportService):
     terms = pages[0].value
     print(terms)
     breakpoint()
+
+
+class SleepingReportService(OpenAIReportService):
+    def __init__(self, **kwargs: object) -> None:
+        super().__init__(**kwargs)
+        self.rate_limited = 0
+
+    def _complete(self, messages: list[dict[str, str]], temperature: float) -> str:
+        document = messages[-1]["content"].removeprefix("Document: ")
+        if document.startswith("rate-limit-me") and not self.rate_limited:
+            self.rate_limited += 1
+            msg = "slow down"
+            raise openai.error.RateLimitError(msg)
+        time.sleep(0.2)
+        return f"* {document.split(':')[0]}"
+
+    async def _complete_async(
+        self,
+        messages: list[dict[str, str]],
+        temperature: float,
+    ) -> str:
+        return await asyncio.to_thread(self._complete, messages, temperature)
+
+
+def test_generate_questions_concurrently_in_order():
+    service = SleepingReportService(
+        max_concurrency=5,
+        backoff=RateLimitBackoff(initial=0.01),
+    )
+    text = " ".join(f"page-{idx}:" + "x" * 29_980 for idx in range(5))
+
+    start = time.perf_counter()
+    pages = service.generate_questions(text)
+    elapsed = time.perf_counter() - start
+
+    assert [page.order for page in pages] == list(range(5))
+    assert [page.value for page in pages] == [[f"page-{idx}"] for idx in range(5)]
+    assert elapsed < 0.2 * 3
+
+
+def test_generate_questions_shares_backoff():
+    backoff = RateLimitBackoff(initial=0.3)
+    service = SleepingReportService(max_concurrency=4, backoff=backoff)
+    text = " ".join(
+        f"{'rate-limit-me' if idx == 0 else 'page'}-{idx}:" + "x" * 29_980
+        for idx in range(4)
+    )
+
+    pages = asyncio.run(service.generate_questions_async(text))
+
+    assert service.rate_limited == 1
+    assert [page.order for page in pages] == list(range(4))
+    assert backoff.consecutive_failures == 0
+
+
+def test_backoff_gives_up_after_its_attempts():
+    backoff = RateLimitBackoff(attempts=2, initial=0.01)
+    calls = 0
+
+    def rate_limited() -> str:
+        nonlocal calls
+        calls += 1
+        msg = "slow down"
+        raise openai.error.RateLimitError(msg)
+
+    with pytest.raises(RateLimitExceededError):
+        backoff.call(rate_limited)
+
+    assert calls == backoff.attempts
+
+
+TERMS_BY_PAGE = {
+    "page-0": "Document Name | CIM\nLead Arranger | Goldman Sachs",
+    "page-1": "Lead Arranger | Morgan Stanley\nDocument Date | 2023",
+    "page-2": "Company Overview | Pizza\nCompany Industry | Food\nDocument Overview | A CIM",
+}
+
+
+class TermsReportService(OpenAIReportService):
+    def __init__(self, **kwargs: object) -> None:
+        super().__init__(**kwargs)
+        self.calls: list[str] = []
+
+    def _complete(self, messages: list[dict[str, str]], temperature: float) -> str:
+        page = messages[-1]["content"].removeprefix("Document: ").split(":")[0]
+        self.calls.append(page)
+        time.sleep(0.1)
+        return TERMS_BY_PAGE.get(page, "")
+
+
+@pytest.mark.parametrize("terms_window", [1, 3])
+def test_generate_terms_first_seen_wins(terms_window: int):
+    service = TermsReportService(terms_window=terms_window)
+    text = " ".join(f"page-{idx}:" + "x" * 29_980 for idx in range(6))
+
+    pages = service.generate_terms(text)
+
+    assert [page.order for page in pages] == [0, 1, 2]
+    lead_arranger = [
+        term.term_value
+        for page in pages
+        for term in page.value
+        if term.term_name == "Lead Arranger"
+    ]
+    assert lead_arranger == ["Goldman Sachs"]
+    assert {term.term_name for page in pages for term in page.value} == ALL_TERMS
+    # the cheap mode stops at the chunk that completes the terms, the
+    # speculative mode has at most one window of calls in flight past it
+    assert len(service.calls) <= 2 + terms_window
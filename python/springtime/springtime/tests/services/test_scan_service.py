@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 
 from springtime.models.open_ai import OpenAIModel
@@ -48,3 +50,14 @@ def test_scan(scan_service: ScanService):
 
     assert output.description
     breakpoint()
+
+
+def test_scan_async(scan_service: ScanService):
+    output = asyncio.run(
+        scan_service.scan_async(
+            file_name="Pizza-Hut-CIM.pdf",
+            text=DUMMY_TEXT,
+        ),
+    )
+
+    assert output.description
@@ -1,11 +1,23 @@
+import datetime
 import os
+import tracemalloc
 
+import numpy as np
 import pandas as pd
 
+from springtime.excel.table_extractor import write_tables
+from springtime.excel.tables_archive import TablesArchive
+from springtime.excel.xlsx_workbook import XlsxWorkbook
 from springtime.services.sheet_processor import (
     CLAUDE_SHEET_PROCESSOR,
     GPT_SHEET_PROCESSOR,
+    PARALLEL_MIN_SHEETS,
+    preprocess,
+    preprocess_sheets,
+    serialize_rows,
+    stringify_sheet,
 )
+from springtime.utils.process_pool import process_pool
 
 XLSX = os.path.join(os.path.dirname(__file__), "../data/dummy-extracted.xlsx")
 
@@ -16,3 +28,293 @@ def test_preprocessor():
     for sheet_preprocessor in [CLAUDE_SHEET_PROCESSOR, GPT_SHEET_PROCESSOR]:
         res = sheet_preprocessor.preprocess(xl=xl)
         chunked = sheet_preprocessor.chunk(res)
+
+
+def char_lengths(texts: list[str]) -> list[int]:
+    return [len(text) for text in texts]
+
+
+def test_serialize_rows_matches_to_csv():
+    sheet = pd.DataFrame(
+        {"name": ["a", "multi\nline", None], "value": [1.5, 2, None]},
+    )
+    lines = serialize_rows(sheet)
+
+    assert len(lines) == 4
+    assert "".join(lines) == sheet.to_csv(index=False)
+
+
+def test_stringify_sheet_keeps_largest_prefix():
+    sheet = pd.DataFrame({"value": [f"row-{idx:03}" for idx in range(100)]})
+    # header is 6 characters and every row is 8
+    res = stringify_sheet(
+        max_length=6 + 8 * 40 + 1, get_lengths=char_lengths, sheet=sheet
+    )
+
+    assert res
+    assert res.was_truncated
+    assert res.content == sheet[:40].to_csv(index=False)
+    assert res.token_length == 6 + 8 * 40
+
+
+def test_stringify_sheet_untruncated():
+    sheet = pd.DataFrame({"value": [1, 2, 3]})
+    res = stringify_sheet(max_length=1_000, get_lengths=char_lengths, sheet=sheet)
+
+    assert res
+    assert not res.was_truncated
+    assert res.content == sheet.to_csv(index=False)
+
+
+def test_stringify_sheet_refines_underestimate():
+    sheet = pd.DataFrame({"value": [f"row-{idx:03}" for idx in range(100)]})
+
+    def get_lengths(texts: list[str]) -> list[int]:
+        # joined rows count longer than their parts
+        return [len(text) + text.count("\n") for text in texts]
+
+    res = stringify_sheet(max_length=200, get_lengths=get_lengths, sheet=sheet)
+
+    assert res
+    assert res.token_length < 200
+    assert res.content == sheet[: res.content.count("\n") - 1].to_csv(index=False)
+
+
+def test_stringify_sheet_header_too_long():
+    sheet = pd.DataFrame({"a" * 100: [1]})
+    assert stringify_sheet(max_length=10, get_lengths=char_lengths, sheet=sheet) is None
+
+
+def test_preprocess_in_process_pool(tmp_path):
+    file_name = tmp_path / "workbook.xlsx"
+    with pd.ExcelWriter(file_name, engine="xlsxwriter") as writer:
+        for index in range(PARALLEL_MIN_SHEETS + 2):
+            pd.DataFrame({"value": list(range(index * 10))}).to_excel(
+                writer,
+                sheet_name=f"Sheet {index}",
+            )
+    xl = pd.ExcelFile(file_name)
+
+    serial = preprocess(max_length=200, get_lengths=char_lengths, xl=xl)
+    with process_pool(3) as executor:
+        parallel = preprocess(
+            max_length=200,
+            get_lengths=char_lengths,
+            xl=xl,
+            executor=executor,
+            max_workers=3,
+        )
+
+    assert [sheet.index for sheet in parallel] == [sheet.index for sheet in serial]
+    assert [sheet.stringified_sheet for sheet in parallel] == [
+        sheet.stringified_sheet for sheet in serial
+    ]
+
+
+def test_preprocess_from_tables_archive(tmp_path):
+    tables = [
+        pd.DataFrame(
+            {
+                "Item": ["Revenue", "EBITDA", None],
+                "FY2022": [1200, 1.5, np.nan],
+                "FY2023": ["1,500", 3, None],
+            },
+        ),
+        pd.DataFrame([[1, 2, 3]], columns=["a", "a", np.nan]),
+        *(
+            pd.DataFrame({"value": list(range(index * 10))})
+            for index in range(PARALLEL_MIN_SHEETS)
+        ),
+    ]
+    file_name = tmp_path / "tables.xlsx"
+    archive_name = tmp_path / "tables.tables.zip"
+    write_tables(str(file_name), iter(tables), archive_name=str(archive_name))
+
+    from_workbook = preprocess(
+        max_length=200,
+        get_lengths=char_lengths,
+        xl=pd.ExcelFile(file_name),
+    )
+    with process_pool(3) as executor:
+        from_archive = preprocess(
+            max_length=200,
+            get_lengths=char_lengths,
+            xl=TablesArchive(archive_name),
+            executor=executor,
+            max_workers=3,
+        )
+
+    assert [sheet.sheet_name for sheet in from_archive] == [
+        sheet.sheet_name for sheet in from_workbook
+    ]
+    assert [sheet.stringified_sheet for sheet in from_archive] == [
+        sheet.stringified_sheet for sheet in from_workbook
+    ]
+
+
+def test_lazy_preprocess_matches_excel_file(tmp_path):
+    file_name = tmp_path / "workbook.xlsx"
+    with pd.ExcelWriter(file_name, engine="xlsxwriter") as writer:
+        for index, rows in enumerate([0, 1, 5, 40, 1000]):
+            pd.DataFrame(
+                {
+                    "Item": [f"Line item {idx}" for idx in range(rows)],
+                    "Value": [idx * 1.5 if idx % 3 else None for idx in range(rows)],
+                    "Date": [
+                        datetime.datetime(2023, 1, 1 + idx % 28) for idx in range(rows)
+                    ],
+                    None: [idx if idx % 2 else "n/a" for idx in range(rows)],
+                },
+            ).to_excel(writer, sheet_name=f"Sheet {index}")
+        sheet = writer.book.add_worksheet("Gaps")
+        sheet.write(1, 1, "header")
+        sheet.write(4, 3, 12)
+        sheet.write(7, 5, "far")
+
+    workbook = XlsxWorkbook(file_name)
+    eager = preprocess(
+        max_length=500,
+        get_lengths=char_lengths,
+        xl=pd.ExcelFile(file_name),
+    )
+    lazy = preprocess(max_length=500, get_lengths=char_lengths, xl=workbook)
+
+    assert [sheet.sheet_name for sheet in lazy] == [sheet.sheet_name for sheet in eager]
+    assert [sheet.stringified_sheet for sheet in lazy] == [
+        sheet.stringified_sheet for sheet in eager
+    ]
+    for sheet_name in workbook.sheet_names:
+        pd.testing.assert_frame_equal(
+            workbook.parse(sheet_name),
+            pd.read_excel(file_name, sheet_name=sheet_name),
+            check_dtype=False,
+        )
+
+
+def test_lazy_preprocess_reads_rows_within_the_budget(tmp_path):
+    file_name = tmp_path / "workbook.xlsx"
+    pd.DataFrame({"value": range(100_000)}).to_excel(file_name, index=False)
+
+    with XlsxWorkbook(file_name) as workbook:
+        [sheet] = preprocess_sheets(
+            workbook,
+            [(0, "Sheet1")],
+            max_length=1000,
+            get_lengths=char_lengths,
+        )
+
+    assert sheet.stringified_sheet.was_truncated
+    assert sheet.stringified_sheet.token_length < 1000
+    assert sheet.stats.rows < 1000
+
+
+def test_lazy_preprocess_fills_a_large_budget(tmp_path):
+    file_name = tmp_path / "workbook.xlsx"
+    rows = 5000
+    pd.DataFrame(
+        {
+            "Item": [f"Line item {idx}" for idx in range(rows)],
+            # written far shorter to csv than by str()
+            "Date": [
+                datetime.datetime(2023, 1, 1) + datetime.timedelta(days=idx)
+                for idx in range(rows)
+            ],
+            "Reported": [
+                datetime.datetime(2024, 1, 1 + idx % 28) for idx in range(rows)
+            ],
+            "Value": [idx * 1.5 for idx in range(rows)],
+        },
+    ).to_excel(file_name, index=False)
+
+    [eager] = preprocess(
+        max_length=20_000,
+        get_lengths=char_lengths,
+        xl=pd.ExcelFile(file_name),
+    )
+    with XlsxWorkbook(file_name) as workbook:
+        [lazy] = preprocess(max_length=20_000, get_lengths=char_lengths, xl=workbook)
+
+    assert lazy.stringified_sheet == eager.stringified_sheet
+    assert lazy.stringified_sheet.token_length > 19_900
+    assert lazy.stats.rows < rows
+
+
+def test_lazy_preprocess_types_columns_by_the_rows_read(tmp_path):
+    file_name = tmp_path / "workbook.xlsx"
+    rows = 5000
+    pd.DataFrame(
+        {
+            "Item": [f"Line item {idx}" for idx in range(rows)],
+            # missing a value far past the budget
+            "Value": [None if idx == 4000 else idx for idx in range(rows)],
+        },
+    ).to_excel(file_name, index=False)
+
+    [eager] = preprocess(
+        max_length=2000,
+        get_lengths=char_lengths,
+        xl=pd.ExcelFile(file_name),
+    )
+    with XlsxWorkbook(file_name) as workbook:
+        [lazy] = preprocess(max_length=2000, get_lengths=char_lengths, xl=workbook)
+
+    assert "Line item 1,1.0\n" in eager.stringified_sheet.content
+    assert "Line item 1,1\n" in lazy.stringified_sheet.content
+    # the same values, written differently
+    lazy_rows, eager_rows = lazy.parsed_sheet(), eager.parsed_sheet()
+    shared = min(len(lazy_rows), len(eager_rows))
+    pd.testing.assert_frame_equal(
+        lazy_rows[:shared],
+        eager_rows[:shared],
+        check_dtype=False,
+    )
+
+
+def test_preprocessed_sheet_rederives_its_dataframe():
+    sheet = pd.DataFrame({"Item": ["Revenue", "EBITDA"], "FY2023": [1.5, None]})
+    xl = GeneratedWorkbook({"Sheet 0": lambda: sheet})
+
+    [preprocessed] = preprocess(max_length=200, get_lengths=char_lengths, xl=xl)
+
+    assert preprocessed.stats == (2, 2)
+    pd.testing.assert_frame_equal(preprocessed.parsed_sheet(), sheet)
+
+
+class GeneratedWorkbook:
+    """Parses every sheet to a new DataFrame, holding none of them."""
+
+    def __init__(self, sheets) -> None:
+        self.sheets = sheets
+        self.sheet_names = list(sheets)
+        self.io = None
+
+    def parse(self, sheet_name: str) -> pd.DataFrame:
+        return self.sheets[sheet_name]()
+
+
+def traced_preprocess(number_of_sheets: int) -> tuple[int, int]:
+    """The memory held by the preprocessed sheets and the peak allocation."""
+    rng = np.random.default_rng(0)
+    xl = GeneratedWorkbook(
+        {
+            f"Sheet {index}": lambda: pd.DataFrame(rng.normal(size=(20_000, 8)))
+            for index in range(number_of_sheets)
+        },
+    )
+    tracemalloc.start()
+    try:
+        sheets = preprocess(max_length=2000, get_lengths=char_lengths, xl=xl)
+        held, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(sheets) == number_of_sheets
+    return held, peak
+
+
+def test_preprocess_memory_does_not_grow_with_the_sheets():
+    one_held, one_peak = traced_preprocess(1)
+    many_held, many_peak = traced_preprocess(20)
+
+    # a parsed sheet takes more than a megabyte, its text a few kilobytes
+    assert many_held < one_peak
+    assert many_peak < 2 * one_peak
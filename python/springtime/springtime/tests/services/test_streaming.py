@@ -0,0 +1,118 @@
+import asyncio
+from collections.abc import AsyncGenerator, AsyncIterator
+
+import openai
+import pytest
+
+from springtime.services.streaming import (
+    UPSTREAM_ERROR_MESSAGE,
+    StreamMetrics,
+    coalesced,
+    measured,
+    sse_event,
+    sse_events,
+)
+
+
+class Upstream:
+    """Yields its deltas, sleeping where a delta is a number."""
+
+    def __init__(self, *deltas: str | float, error: Exception | None = None) -> None:
+        self.deltas = deltas
+        self.error = error
+        self.closed = False
+
+    async def __call__(self) -> AsyncGenerator[str, None]:
+        try:
+            for delta in self.deltas:
+                if isinstance(delta, str):
+                    yield delta
+                else:
+                    await asyncio.sleep(delta)
+            if self.error:
+                raise self.error
+        finally:
+            self.closed = True
+
+
+async def collect(stream: AsyncIterator[str]) -> list[str]:
+    return [chunk async for chunk in stream]
+
+
+def test_coalesces_deltas_after_the_first():
+    upstream = Upstream("a", "b", "c", 0.2, "d", "e")
+
+    chunks = asyncio.run(
+        collect(coalesced(upstream(), max_delay=0.05, max_chars=100)),
+    )
+
+    assert chunks == ["a", "bc", "de"]
+
+
+def test_flushes_at_max_chars():
+    upstream = Upstream("a", "bb", "cc", "d", 0.2)
+
+    chunks = asyncio.run(collect(coalesced(upstream(), max_delay=10, max_chars=3)))
+
+    assert chunks == ["a", "bbcc", "d"]
+
+
+def test_raises_the_upstream_error_after_flushing():
+    upstream = Upstream("a", "b", error=ValueError("upstream"))
+    acc: list[str] = []
+
+    async def run():
+        async for chunk in coalesced(upstream(), max_delay=10, max_chars=100):
+            acc.append(chunk)
+
+    with pytest.raises(ValueError, match="upstream"):
+        asyncio.run(run())
+    assert acc == ["a", "b"]
+
+
+def test_cancelling_closes_the_upstream():
+    upstream = Upstream("a", 10, "b")
+    metrics = StreamMetrics()
+
+    async def run():
+        stream = coalesced(measured(upstream(), metrics), max_delay=0, max_chars=1)
+        consumer = asyncio.create_task(collect(stream))
+        await asyncio.sleep(0.05)
+        consumer.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await consumer
+
+    asyncio.run(run())
+
+    assert upstream.closed
+    stats = metrics.stats()
+    assert (stats.streams, stats.disconnects) == (1, 1)
+
+
+def test_measures_time_to_first_token():
+    metrics = StreamMetrics()
+    upstream = Upstream(0.05, "a", "b", "c")
+
+    asyncio.run(collect(measured(upstream(), metrics)))
+
+    stats = metrics.stats()
+    assert stats.streams == 1
+    assert stats.time_to_first_token_p50 >= 0.05
+    assert stats.tokens_per_second > 0
+
+
+def test_sse_framing():
+    assert sse_event("a\nb") == "data: a\ndata: b\n\n"
+    assert sse_event("", event="done") == "event: done\ndata: \n\n"
+
+    failing = Upstream("a", error=openai.error.APIError("secret details"))
+    events = asyncio.run(collect(sse_events(failing())))
+
+    assert events == ["data: a\n\n", sse_event(UPSTREAM_ERROR_MESSAGE, "error")]
+
+
+def test_sse_events_raise_unexpected_errors():
+    failing = Upstream("a", error=ValueError("bug"))
+
+    with pytest.raises(ValueError, match="bug"):
+        asyncio.run(collect(sse_events(failing())))
@@ -1,12 +1,25 @@
+import math
 import os
+import time
 
+import anthropic
+import httpx
 import pandas as pd
 import pytest
 from anthropic import Anthropic
 
-from springtime.services.excel_analyzer import ClaudeExcelAnalyzer
+from springtime.services.excel_analyzer import (
+    ClaudeExcelAnalyzer,
+    ExcelAnalyzer,
+    ResponseWithPrompt,
+)
 from springtime.services.sheet_processor import (
     CLAUDE_SHEET_PROCESSOR,
+    ChunkedSheets,
+    PreprocessedSheet,
+    SheetPreprocessor,
+    SheetStats,
+    StringifiedSheet,
 )
 from springtime.services.table_analyzer import TableAnalyzer, TableAnalyzerImpl
 
@@ -32,3 +45,92 @@ def test_analyze(
         )
         chunks = resp.chunks
         assert len(chunks) > 0
+
+
+class OneSheetPerChunkProcessor(SheetPreprocessor):
+    def __init__(self, sheet_names: list[str]) -> None:
+        self.sheet_names = sheet_names
+
+    def preprocess(self, *, xl: pd.ExcelFile) -> list[PreprocessedSheet]:
+        return [
+            PreprocessedSheet(
+                sheet_name=sheet_name,
+                index=index,
+                stringified_sheet=StringifiedSheet(
+                    content=sheet_name,
+                    token_length=1,
+                    was_truncated=False,
+                ),
+                stats=SheetStats(rows=0, columns=1),
+            )
+            for index, sheet_name in enumerate(self.sheet_names)
+        ]
+
+    def chunk(self, sheets: list[PreprocessedSheet]) -> ChunkedSheets:
+        return ChunkedSheets(sheets=[[sheet] for sheet in sheets])
+
+
+class SleepingExcelAnalyzer(ExcelAnalyzer):
+    def __init__(self, delays: dict[str, float]) -> None:
+        self.delays = delays
+
+    def analyze(self, *, sheets: list[PreprocessedSheet]) -> ResponseWithPrompt:
+        [sheet] = sheets
+        delay = self.delays.get(sheet.sheet_name, 0)
+        if delay < 0:
+            msg = f"{sheet.sheet_name} failed"
+            request = httpx.Request("POST", "https://api.anthropic.com")
+            raise anthropic.APIError(msg, request)
+        if delay == math.inf:
+            msg = f"{sheet.sheet_name} is a bug"
+            raise ValueError(msg)
+        time.sleep(delay)
+        return ResponseWithPrompt(
+            prompt=sheet.sheet_name,
+            content=sheet.sheet_name,
+            html=None,
+        )
+
+
+def test_analyze_runs_chunks_concurrently_in_order():
+    sheet_names = ["a", "b", "c", "d"]
+    svc = TableAnalyzerImpl(
+        SleepingExcelAnalyzer({"a": 0.3, "b": 0.2, "c": 0.1, "d": 0.2}),
+        OneSheetPerChunkProcessor(sheet_names),
+        max_concurrency=4,
+    )
+
+    start = time.monotonic()
+    resp = svc.analyze(excel_file=None)
+
+    assert time.monotonic() - start < 0.6
+    assert [chunk.content for chunk in resp.chunks] == sheet_names
+    assert all(chunk.error is None for chunk in resp.chunks)
+
+
+def test_analyze_returns_partial_results():
+    svc = TableAnalyzerImpl(
+        SleepingExcelAnalyzer({"b": -1, "c": 1}),
+        OneSheetPerChunkProcessor(["a", "b", "c", "d"]),
+        max_concurrency=2,
+        chunk_timeout=0.2,
+    )
+
+    resp = svc.analyze(excel_file=None)
+
+    assert [chunk.sheet_names for chunk in resp.chunks] == [["a"], ["b"], ["c"], ["d"]]
+    assert resp.chunks[0].content == "a"
+    assert resp.chunks[1].error == "b failed"
+    assert resp.chunks[2].error
+    assert "Timed out" in resp.chunks[2].error
+    assert resp.chunks[3].content == "d"
+
+
+def test_analyze_raises_unexpected_errors():
+    svc = TableAnalyzerImpl(
+        SleepingExcelAnalyzer({"b": math.inf}),
+        OneSheetPerChunkProcessor(["a", "b"]),
+    )
+
+    with pytest.raises(ValueError, match="b is a bug"):
+        svc.analyze(excel_file=None)
@@ -1,13 +1,21 @@
 import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import MagicMock
 
+import fitz
+import pandas as pd
 import pytest
 
 from springtime.excel.table_extractor import (
     ExtractionArguments,
+    FitzTableExtractor,
     TableExtractor,
     TabulaTableExtractor,
+    page_batches,
 )
+from springtime.excel.tables_archive import TABLES_ARCHIVE_SUFFIX, TablesArchive
 
 
 @pytest.fixture()
@@ -29,5 +37,135 @@ def test_extract(table_extractor: TableExtractor):
 
     res = table_extractor.extract(args)
     assert res.number_of_sheets == 20
-    assert res.xl
     assert res.path
+    assert res.tables_path
+
+
+def blank_pdf(path: str, number_of_pages: int) -> None:
+    pdf = fitz.open()
+    for _ in range(number_of_pages):
+        pdf.new_page()
+    pdf.save(path)
+
+
+def test_page_batches():
+    assert page_batches(25, 10) == ["1-10", "11-20", "21-25"]
+    assert page_batches(0, 10) == []
+
+
+@pytest.mark.parametrize(
+    ("max_workers", "executor"),
+    [(1, None), (3, ThreadPoolExecutor(3))],
+)
+def test_writes_the_tables_of_every_batch_in_page_order(max_workers, executor):
+    def read_tables(file_name: str, pages: str) -> list[pd.DataFrame]:
+        first, last = map(int, pages.split("-"))
+        # later batches finish first
+        time.sleep(0.01 * (30 - first) / 10)
+        return [pd.DataFrame({"page": [page]}) for page in range(first, last + 1)]
+
+    uploaded: list[pd.DataFrame] = []
+    archived: list[pd.DataFrame] = []
+
+    def upload_from_filename(bucket, path, file_name, content_type=None):
+        if path.endswith(TABLES_ARCHIVE_SUFFIX):
+            with TablesArchive(file_name) as archive:
+                archived.extend(map(archive.parse, archive.sheet_names))
+        else:
+            uploaded.extend(pd.read_excel(file_name, sheet_name=None).values())
+
+    object_store = MagicMock()
+    object_store.upload_from_filename.side_effect = upload_from_filename
+    extractor = TabulaTableExtractor(
+        object_store,
+        max_workers=max_workers,
+        pages_per_batch=4,
+        executor=executor,
+        read_tables=read_tables,
+    )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, "doc.pdf")
+        blank_pdf(file_name, 30)
+        res = extractor.extract(
+            ExtractionArguments(
+                file_name=file_name,
+                title="doc",
+                bucket="bucket",
+                output_prefix="output_prefix",
+            ),
+        )
+
+    assert res.number_of_sheets == 30
+    assert res.tables_path == res.path.replace(".xlsx", TABLES_ARCHIVE_SUFFIX)
+    assert [df["page"].item() for df in uploaded] == list(range(1, 31))
+    for df, archived_df in zip(uploaded, archived, strict=True):
+        pd.testing.assert_frame_equal(df, archived_df)
+
+
+def test_uploads_nothing_without_tables():
+    object_store = MagicMock()
+    extractor = TabulaTableExtractor(object_store, read_tables=lambda *_: [])
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, "doc.pdf")
+        blank_pdf(file_name, 3)
+        res = extractor.extract(
+            ExtractionArguments(
+                file_name=file_name,
+                title="doc",
+                bucket="bucket",
+                output_prefix="output_prefix",
+            ),
+        )
+
+    assert res == (0, None, None)
+    object_store.upload_from_filename.assert_not_called()
+
+
+def ruled_table_pdf(path: str, rows: list[list[str]]) -> None:
+    pdf = fitz.open()
+    page = pdf.new_page()
+    left, top, width, height = 50, 80, 100, 20
+    for row in range(len(rows) + 1):
+        y = top + row * height
+        page.draw_line((left, y), (left + len(rows[0]) * width, y))
+    for column in range(len(rows[0]) + 1):
+        x = left + column * width
+        page.draw_line((x, top), (x, top + len(rows) * height))
+    for row, values in enumerate(rows):
+        for column, value in enumerate(values):
+            page.insert_text(
+                (left + column * width + 4, top + row * height + 14),
+                value,
+            )
+    pdf.save(path)
+
+
+def test_fitz_extracts_ruled_tables():
+    rows = [["Item", "FY2022", "FY2023"], ["Revenue", "1,200", "1,500"]]
+    uploaded: list[pd.DataFrame] = []
+
+    def upload_from_filename(bucket, path, file_name, content_type=None):
+        if not path.endswith(TABLES_ARCHIVE_SUFFIX):
+            uploaded.extend(pd.read_excel(file_name, sheet_name=None).values())
+
+    object_store = MagicMock()
+    object_store.upload_from_filename.side_effect = upload_from_filename
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_name = os.path.join(tmp_dir, "doc.pdf")
+        ruled_table_pdf(file_name, rows)
+        res = FitzTableExtractor(object_store).extract(
+            ExtractionArguments(
+                file_name=file_name,
+                title="doc",
+                bucket="bucket",
+                output_prefix="output_prefix",
+            ),
+        )
+
+    assert res.number_of_sheets == 1
+    [df] = uploaded
+    assert df.columns.tolist()[1:] == rows[0]
+    assert df.iloc[0].tolist()[1:] == rows[1]
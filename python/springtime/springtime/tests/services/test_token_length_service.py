@@ -0,0 +1,43 @@
+from springtime.routers.token_length_service import TokenCounter
+
+
+class FakeEncoder:
+    def __init__(self) -> None:
+        self.calls: list[list[str]] = []
+
+    def __call__(self, texts: list[str]) -> list[int]:
+        self.calls.append(texts)
+        return [len(text.split()) for text in texts]
+
+
+def test_count_many_preserves_order_and_dedupes():
+    encoder = FakeEncoder()
+    counter = TokenCounter(encoder)
+
+    counts = counter.count_many(["a b", "c", "a b", "d e f"])
+
+    assert counts == [2, 1, 2, 3]
+    assert encoder.calls == [["a b", "c", "d e f"]]
+
+
+def test_count_uses_cache():
+    encoder = FakeEncoder()
+    counter = TokenCounter(encoder)
+
+    assert counter.count("a b c") == 3
+    assert counter.count("a b c") == 3
+    assert counter.count_many(["a b c", "x"]) == [3, 1]
+
+    assert encoder.calls == [["a b c"], ["x"]]
+    assert counter.hits == 2
+    assert counter.misses == 2
+
+
+def test_cache_is_bounded():
+    encoder = FakeEncoder()
+    counter = TokenCounter(encoder, maxsize=2)
+
+    counter.count_many(["a", "b", "c"])
+    counter.count("a")
+
+    assert encoder.calls == [["a", "b", "c"], ["a"]]
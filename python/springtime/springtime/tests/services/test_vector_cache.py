@@ -0,0 +1,119 @@
+import time
+
+import pytest
+
+from springtime.services.local_vector_service import LocalVectorService
+from springtime.services.vector_cache import CachedVectorService
+from springtime.services.vector_service import (
+    SimilarityQuery,
+    UpsertVector,
+    VectorResult,
+)
+
+DIMENSION = 4
+
+
+class CountingVectorService(LocalVectorService):
+    def __init__(self) -> None:
+        super().__init__(dimension=DIMENSION)
+        self.searches = 0
+
+    def get_similar_many(
+        self,
+        queries: list[SimilarityQuery],
+    ) -> list[list[VectorResult]]:
+        self.searches += len(queries)
+        return super().get_similar_many(queries)
+
+
+def vector(id: str, project: str, values: list[float]) -> UpsertVector:
+    return UpsertVector(id=id, vector=values, metadata={"projectId": project})
+
+
+@pytest.fixture()
+def inner() -> CountingVectorService:
+    service = CountingVectorService()
+    service.upsert(
+        [
+            vector("a", "p1", [1, 0, 0, 0]),
+            vector("b", "p1", [0, 1, 0, 0]),
+            vector("c", "p2", [0, 0, 1, 0]),
+        ],
+    )
+    return service
+
+
+def test_caches_on_quantized_vector_filter_and_top_k(inner: CountingVectorService):
+    cache = CachedVectorService(inner)
+
+    first = cache.get_similar([1, 0.1, 0, 0], {"projectId": "p1"})
+    # float noise and a different scale quantize to the same key
+    assert cache.get_similar([2, 0.2 + 1e-7, 0, 0], {"projectId": "p1"}) == first
+    assert inner.searches == 1
+
+    cache.get_similar([1, 0.1, 0, 0], {"projectId": "p1"}, top_k=1)
+    cache.get_similar([1, 0.1, 0, 0], {"projectId": "p2"})
+    cache.get_similar([1, 0.1, 0, 0], {"projectId": "p1"}, n_probe=4)
+    assert inner.searches == 4
+    stats = cache.stats()
+    assert (stats.hits, stats.misses, stats.size) == (1, 4, 4)
+
+
+def test_upsert_invalidates_matching_filters(inner: CountingVectorService):
+    cache = CachedVectorService(inner)
+    cache.get_similar([1, 0, 0, 0], {"projectId": "p1"})
+    cache.get_similar([1, 0, 0, 0], {"projectId": "p2"})
+    cache.get_similar([1, 0, 0, 0], {})
+
+    cache.upsert([vector("d", "p2", [1, 0, 0, 0])])
+
+    assert cache.stats().invalidations == 2
+    assert cache.stats().size == 1
+    [best, *_] = cache.get_similar([1, 0, 0, 0], {"projectId": "p2"})
+    assert best.id == "d"
+    cache.get_similar([1, 0, 0, 0], {"projectId": "p1"})
+    assert inner.searches == 4
+
+
+def test_upsert_invalidates_results_holding_an_upserted_id(
+    inner: CountingVectorService,
+):
+    cache = CachedVectorService(inner)
+    [best, *_] = cache.get_similar([1, 0, 0, 0], {"projectId": "p1"})
+    assert best.id == "a"
+
+    # the new metadata no longer matches the cached filter
+    cache.upsert([vector("a", "p2", [1, 0, 0, 0])])
+
+    assert cache.stats().invalidations == 1
+    results = cache.get_similar([1, 0, 0, 0], {"projectId": "p1"})
+    assert [result.id for result in results] == ["b"]
+    assert inner.searches == 2
+
+
+def test_expires_and_evicts(inner: CountingVectorService):
+    cache = CachedVectorService(inner, maxsize=2, ttl=0.05)
+    for values in ([1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0]):
+        cache.get_similar(values, {})
+    assert cache.stats().size == 2
+
+    cache.get_similar([0, 0, 1, 0], {})
+    assert inner.searches == 3
+    time.sleep(0.06)
+    cache.get_similar([0, 0, 1, 0], {})
+    assert inner.searches == 4
+
+
+def test_batch_only_searches_misses(inner: CountingVectorService):
+    cache = CachedVectorService(inner)
+    cache.get_similar([1, 0, 0, 0], {})
+
+    results = cache.get_similar_many(
+        [
+            SimilarityQuery(vector=[0, 1, 0, 0]),
+            SimilarityQuery(vector=[1, 0, 0, 0]),
+        ],
+    )
+
+    assert [group[0].id for group in results] == ["b", "a"]
+    assert inner.searches == 2
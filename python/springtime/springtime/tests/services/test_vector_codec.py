@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from springtime.services.vector_codec import (
+    VECTORS_JSON_MEDIA_TYPE,
+    VectorDtype,
+    accepted_vectors_media_type,
+    decode_vectors,
+    encode_vectors,
+    from_bytes,
+    media_type_dtype,
+    to_bytes,
+)
+
+MATRIX = np.random.default_rng(0).normal(size=(5, 1536)).astype(np.float32)
+
+
+@pytest.mark.parametrize(
+    ("dtype", "tolerance"),
+    [
+        (VectorDtype.float32, 0),
+        (VectorDtype.float16, 1e-2),
+        (VectorDtype.int8, 3e-2),
+    ],
+)
+def test_round_trips(dtype: VectorDtype, tolerance: float):
+    decoded = decode_vectors(encode_vectors(MATRIX, dtype))
+
+    assert decoded.dtype == np.float32
+    assert decoded.shape == MATRIX.shape
+    np.testing.assert_allclose(decoded, MATRIX, atol=tolerance)
+
+
+def test_float32_decodes_without_copying():
+    buffer = to_bytes(MATRIX, VectorDtype.float32)
+    decoded = from_bytes(buffer, VectorDtype.float32, MATRIX.shape)
+
+    assert not decoded.flags.owndata
+    assert len(buffer) == MATRIX.size * 4
+
+
+def test_rejects_mismatched_shapes():
+    buffer = to_bytes(MATRIX, VectorDtype.int8)
+    with pytest.raises(ValueError, match="Expected"):
+        from_bytes(buffer, VectorDtype.int8, (4, 1536))
+
+
+def test_media_type_dtype():
+    assert media_type_dtype("application/octet-stream") == VectorDtype.float32
+    assert media_type_dtype("application/octet-stream; dtype=float16") == "float16"
+    with pytest.raises(ValueError):
+        media_type_dtype("application/octet-stream; dtype=float64")
+
+
+def test_accepted_vectors_media_type():
+    assert accepted_vectors_media_type("application/json") is None
+    assert accepted_vectors_media_type("") is None
+    # the first vectors media range wins, whatever precedes it
+    assert accepted_vectors_media_type(
+        "text/html;q=0.9, application/octet-stream;dtype=int8,"
+        f" {VECTORS_JSON_MEDIA_TYPE}; dtype=float16",
+    ) == ("application/octet-stream", VectorDtype.int8)
+    # parameters of other media ranges do not leak into the dtype
+    assert accepted_vectors_media_type(
+        f"application/json;dtype=int8, {VECTORS_JSON_MEDIA_TYPE}",
+    ) == (VECTORS_JSON_MEDIA_TYPE, VectorDtype.float32)
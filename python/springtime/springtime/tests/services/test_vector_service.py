@@ -0,0 +1,137 @@
+import threading
+import time
+
+import pinecone
+import pytest
+
+from springtime.services.vector_service import (
+    PineconeVectorService,
+    UpsertError,
+    UpsertVector,
+    batches,
+)
+
+
+class FakeIndex:
+    def __init__(
+        self,
+        fail_batches: dict[str, int] | None = None,
+        error: Exception | None = None,
+    ) -> None:
+        # first vector id of a batch to the number of times it should fail
+        self.fail_batches = dict(fail_batches or {})
+        self.error = error or TimeoutError("request timed out")
+        self.vectors: dict[str, tuple[list[float], dict[str, str]]] = {}
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors: list[tuple], namespace: str) -> None:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(0.02)
+            first_id = vectors[0][0]
+            with self._lock:
+                if self.fail_batches.get(first_id, 0) > 0:
+                    self.fail_batches[first_id] -= 1
+                    raise self.error
+                for id, values, metadata in vectors:
+                    self.vectors[id] = (values, metadata)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+def make_service(index: FakeIndex, **kwargs) -> PineconeVectorService:
+    return PineconeVectorService(
+        api_key="",
+        environment="",
+        index_name="",
+        namespace="test",
+        index=index,
+        retry_delay=0,
+        **kwargs,
+    )
+
+
+def make_vectors(count: int) -> list[UpsertVector]:
+    return [
+        UpsertVector(id=f"chunk-{idx}", vector=[float(idx)] * 8) for idx in range(count)
+    ]
+
+
+def test_upserts_in_concurrent_batches():
+    index = FakeIndex()
+    service = make_service(index, max_batch_size=10, max_concurrency=4)
+
+    reports = service.upsert_batches(make_vectors(95))
+
+    assert len(index.vectors) == 95
+    assert [report.size for report in reports] == [10] * 9 + [5]
+    assert all(report.attempts == 1 for report in reports)
+    assert index.max_in_flight > 1
+
+
+def test_batches_are_bounded_by_bytes():
+    vectors = [(f"{idx}", [0.0] * 100, {}) for idx in range(10)]
+    # each vector is estimated at a little over 2000 bytes
+    assert [
+        len(batch)
+        for batch in batches(vectors, max_batch_size=100, max_batch_bytes=5000)
+    ] == [2] * 5
+
+
+def test_retries_only_the_failed_batch():
+    index = FakeIndex(fail_batches={"chunk-10": 2})
+    service = make_service(index, max_batch_size=10)
+
+    reports = service.upsert_batches(make_vectors(30))
+
+    assert len(index.vectors) == 30
+    assert [report.attempts for report in reports] == [1, 3, 1]
+    assert index.requests == 5
+
+
+def test_raises_after_other_batches_finish():
+    index = FakeIndex(fail_batches={"chunk-0": 5})
+    service = make_service(index, max_batch_size=10)
+
+    with pytest.raises(UpsertError, match=r"batches \[0\] of 3") as raised:
+        service.upsert(make_vectors(30))
+    assert len(index.vectors) == 20
+    assert raised.value.failed == [0]
+    assert [report.batch for report in raised.value.reports] == [1, 2]
+
+
+def test_retries_rate_limits_and_server_errors():
+    for status in (429, 503):
+        index = FakeIndex(
+            fail_batches={"chunk-0": 1},
+            error=pinecone.ApiException(status=status),
+        )
+        service = make_service(index, max_batch_size=10)
+
+        [report] = service.upsert_batches(make_vectors(10))
+
+        assert report.attempts == 2
+
+
+def test_does_not_retry_bad_requests():
+    index = FakeIndex(
+        fail_batches={"chunk-0": 1},
+        error=pinecone.ApiException(status=400),
+    )
+    service = make_service(index, max_batch_size=10)
+
+    with pytest.raises(UpsertError):
+        service.upsert_batches(make_vectors(10))
+    assert index.requests == 1
+
+
+def test_requires_an_attempt():
+    with pytest.raises(ValueError, match="attempts"):
+        make_service(FakeIndex(), attempts=0)
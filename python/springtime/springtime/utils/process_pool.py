@@ -0,0 +1,13 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+
+def process_pool(max_workers: int) -> ProcessPoolExecutor | None:
+    """A pool of max_workers processes, None when one would do."""
+    if max_workers <= 1:
+        return None
+    # workers start lazily on first use, spawn avoids forking the server's threads
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    )